@@ -1,16 +1,19 @@
 from model import GoalPlanResult, PortfolioInsights
+from snapshot import TickerSnapshot
 import streamlit as st
 import os
 from data.portfolios import simple_portfolio
 import json
-from workflow import create_workflow
+from workflow import create_workflow, FULL_REVIEW_MAX_HOLDINGS
+from streaming import stream_graph
 from langchain_core.messages import HumanMessage
 import matplotlib.pyplot as plt
-from qa_agent_test import get_response
+from qa_agent_test import stream_response
 from cachetools import cached, TTLCache
 import datetime
 import matplotlib.dates as mdates
 import logging
+import uuid
 
 st_logger = logging.getLogger('streamlit')
 st_logger.setLevel(logging.INFO)
@@ -20,34 +23,28 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 
-def plot_price_history(history_data: dict, ticker: str = "Stock", show_volume: bool = False):
+def plot_price_history(snapshot: TickerSnapshot, ticker: str = "Stock", show_volume: bool = False):
     """
     Creates a matplotlib chart from 6-month history data.
     
     Args:
-        history_data: Dictionary containing Date, Close, Volume, etc. from yf_snapshot
+        snapshot: TickerSnapshot holding the daily bars from yf_snapshot
         ticker: Stock ticker symbol for chart title
         show_volume: Whether to show volume subplot
     """
-    # Extract data from the history dictionary
-    dates = history_data.get('Date', [])
-    closes = history_data.get('Close', [])
-    volumes = history_data.get('Volume', [])
-    opens = history_data.get('Open', [])
-    highs = history_data.get('High', [])
-    lows = history_data.get('Low', [])
+    # numpy arrays straight from the snapshot; matplotlib plots datetime64 natively
+    dates = snapshot.dates.astype("datetime64[D]")
+    closes = snapshot.close
+    volumes = snapshot.volume
+    highs = snapshot.high
+    lows = snapshot.low
     
-    if not dates or not closes:
+    if not len(dates) or not len(closes):
         print("Error: No date or close price data found")
         return
-    
-    # Convert dates to datetime objects if they're not already
-    if dates:
-        # dates = [d.date() if hasattr(d, 'date') else d for d in dates]
-        dates = [datetime.datetime.strptime(d, "%Y-%m-%d") if isinstance(d, str) else d for d in dates]
 
     # Create the plot
-    if show_volume and volumes:
+    if show_volume and len(volumes):
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), height_ratios=[3, 1])
         
         # Price chart
@@ -76,7 +73,7 @@ def plot_price_history(history_data: dict, ticker: str = "Stock", show_volume: b
         # Single price chart
         fig, ax1 = plt.subplots(figsize=(12, 6))
         ax1.plot(dates, closes, linewidth=2, color='blue', label='Close Price')
-        if highs and lows:
+        if len(highs) and len(lows):
             ax1.fill_between(dates, lows, highs, alpha=0.3, color='lightblue', label='Daily Range')
         
         ax1.set_title(f'{ticker} - 6 Month Price History', fontsize=16, fontweight='bold')
@@ -313,36 +310,44 @@ def handle_market_trends(app):
 
     if st.button("Get Market Trends"):
         if ticker:
-            with st.spinner(f"Fetching market trends for {ticker}...", show_time=True):
-                # insights = market_trends.get_market_trends_for_ticker(ticker)
-                messages = app.invoke({
+            config = {"configurable": {"thread_id": session_thread_id("workflow")}}
+            status = st.status(f"Fetching market trends for {ticker}...")
+            st.markdown(f"### Market Trends for {ticker}: ")
+
+            def answer_tokens():
+                # the analysis streams in once the model's turn is done; tool-phase
+                # progress updates the status box in the meantime
+                for kind, value in stream_graph(app, {
                                 "context": "market_trends",
                                 "market_trends_ticker": ticker,
-                            }, {"configurable": {"thread_id": "1"}})
-                insights = messages['messages'][-1].content
-                # print(messages['messages'][-1])
-                current_state = app.get_state({"configurable": {"thread_id": "1"}})
-                # print("current_state:", current_state.values['market_trends_agent_tools_out'])
-                if 'market_trends_agent_tools_out' in current_state.values:
-                    tool_outputs = current_state.values['market_trends_agent_tools_out']
-                    print("tool_outputs:", tool_outputs)
-                    print(type(tool_outputs))
-                    # print(current_state['context'])
-                    if "news" in tool_outputs:
-                        st.markdown("### Recent News Articles")
-                        for article in tool_outputs['news']:
-                            title = article.get('title')
-                            link = article.get('url', {}).get('url', '')
-                            st.write(f"- [{title}]({link})")
+                            }, config):
+                    if kind == "progress":
+                        status.update(label=value["message"])
+                        status.write(value["message"])
                     else:
-                        st.write("No recent news articles found.")
-
-                    if "ticker_6mo_price_history" in tool_outputs:
-                        st.markdown("### Price History Chart")
-                        plot_price_history(tool_outputs['ticker_6mo_price_history'], ticker)
-
-                st.markdown(f"### Market Trends for {ticker}: ")
-                st.write(insights)  # Preserve line breaks in Streamlit
+                        yield value
+
+            streamed = st.write_stream(answer_tokens())
+            status.update(label=f"Market trends for {ticker}", state="complete")
+            current_state = app.get_state(config)
+            if not streamed:
+                # served from the result cache, nothing was generated
+                st.write(current_state.values['messages'][-1].content)
+
+            if 'market_trends_agent_tools_out' in current_state.values:
+                tool_outputs = current_state.values['market_trends_agent_tools_out']
+                if "news" in tool_outputs:
+                    st.markdown("### Recent News Articles")
+                    for article in tool_outputs['news']:
+                        title = article.get('title')
+                        link = article.get('url', '')
+                        st.write(f"- [{title}]({link})")
+                else:
+                    st.write("No recent news articles found.")
+
+                if tool_outputs.get("snapshot"):
+                    st.markdown("### Price History Chart")
+                    plot_price_history(TickerSnapshot.from_bytes(tool_outputs['snapshot']), ticker)
         else:
             st.error("Please enter a valid ticker symbol.")
 
@@ -367,17 +372,52 @@ def handle_portfolio_insights(app):
                         "context": "portfolio",
                         "portfolio_json": portfolio,
                         "user_goal": user_goal,
-                    }, {"configurable": {"thread_id": "1"}})
+                    }, {"configurable": {"thread_id": session_thread_id("workflow")}})
                     analysis = messages['messages'][-1]
                     print("portfolio:", messages['portfolio_json'])
                     portfolio_pie_chart(messages['portfolio_json'])
                     st.json(analysis, expanded=False)  # Display raw JSON output
                     # display_analysis(analysis)
                     display_portfolio_insights(analysis)
+
+            goal_plan_inputs = st.session_state.get("goal_plan_inputs")
+            st.caption("Full Review analyzes the portfolio, market trends for its largest holdings"
+                       + (" and your goal plan" if goal_plan_inputs else "") + " in parallel.")
+            if st.button("Full Review"):
+                handle_full_review(app, portfolio, user_goal, goal_plan_inputs)
         except json.JSONDecodeError:
             st.error("Error decoding JSON. Please ensure the file is valid JSON.")
 
 
+def handle_full_review(app, portfolio, user_goal, goal_plan_inputs=None):
+    with st.spinner("Running full review...", show_time=True):
+        result = app.invoke({
+            "context": "full_review",
+            "portfolio_json": portfolio,
+            "user_goal": user_goal,
+            "goal_plan_inputs": goal_plan_inputs,
+        }, {
+            "configurable": {"thread_id": session_thread_id("workflow")},
+            # one worker per branch: portfolio, each holding and the goal plan
+            "max_concurrency": FULL_REVIEW_MAX_HOLDINGS + 2,
+        })
+    review = result["full_review"]
+
+    portfolio_pie_chart(result["portfolio_json"])
+    display_portfolio_insights(review["portfolio_insights"])
+
+    st.markdown("### Market Trends for Holdings")
+    for ticker, trends in review["market_trends"].items():
+        with st.expander(ticker):
+            st.markdown(trends["analysis"])
+            for article in trends["news"]:
+                st.write(f"- [{article.get('title')}]({article.get('url', '')})")
+
+    if review["goal_plan"] is not None:
+        st.markdown("### Your Financial Goal Plan:")
+        handle_goal_planning_output(review["goal_plan"])
+
+
 def handle_goal_planning_output(goalPlanResult: GoalPlanResult):
     """
     Display the contents of a GoalPlanResult object using Streamlit components.
@@ -583,29 +623,44 @@ def handle_goal_planning(app):
         if not success:
             st.error(f"Input validation error: {error_msg}")
         else:
+            goal_plan_inputs = {
+                "goal_type": goal_input,
+                "goal_target_amount": goal_target_amount,
+                "goal_target_horizon": goal_target_year - current_year,
+                "current_net_worth": current_net_worth,
+                "risk_tolerance": risk_tolerance,
+                "current_age": current_age,
+                "annual_income": annual_income,
+                "monthly_expenses": monthly_expenses,
+                "monthly_savings": monthly_savings
+            }
+            # reused by the portfolio tab's Full Review
+            st.session_state.goal_plan_inputs = goal_plan_inputs
             with st.spinner("Planning your financial goal...", show_time=True):
                 messages = app.invoke(
                     {
                         "context": "goals_planning",
-                        "goal_plan_inputs": {
-                            "goal_type": goal_input,
-                            "goal_target_amount": goal_target_amount,
-                            "goal_target_horizon": goal_target_year - current_year,
-                            "current_net_worth": current_net_worth,
-                            "risk_tolerance": risk_tolerance,
-                            "current_age": current_age,
-                            "annual_income": annual_income,
-                            "monthly_expenses": monthly_expenses,
-                            "monthly_savings": monthly_savings
-                        }
-                    }, {"configurable": {"thread_id": "1"}})
+                        "goal_plan_inputs": goal_plan_inputs
+                    }, {"configurable": {"thread_id": session_thread_id("workflow")}})
                 output = messages['goal_planning_output']
                 print(output)
                 st.markdown("### Your Financial Goal Plan:")
                 handle_goal_planning_output(output)
 
+@st.cache_resource
+def get_workflow():
+    # compiled once per server process and shared by every session; state lives
+    # in the bounded SQLite checkpointer, keyed by each session's thread ids
+    return create_workflow()
+
+def session_thread_id(graph: str) -> str:
+    """Checkpointer thread for this browser session; the workflow and chat graphs each get their own."""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return f"{st.session_state.session_id}:{graph}"
+
 def main():
-    app = create_workflow()
+    app = get_workflow()
     st.title("Finance AI Assistant")
     st.write("This is an AI assistant that can give insights on investment portfolios, do market trends analysis, and answer finance-related questions.")
     
@@ -634,11 +689,10 @@ def main():
             # Add user message to chat history
             st.session_state.messages.append({"role": "user", "content": prompt})
 
-            response = None
-            with st.spinner("Getting response...", show_time=True):
-                response = get_response(prompt)
             with st.chat_message("assistant"):
-                st.markdown(response)
+                progress = st.empty()
+                response = st.write_stream(stream_response(prompt, session_thread_id("chat"), on_progress=progress.caption))
+                progress.empty()
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
 
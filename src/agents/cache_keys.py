@@ -0,0 +1,103 @@
+import hashlib
+import json
+import math
+
+# Cache keys for agent results. Inputs are normalized into a canonical JSON
+# document and hashed with SHA-256, so equal inputs map to the same key in
+# every process and across restarts. Each namespace carries a version: bump it
+# whenever that agent's prompt or output schema changes so old entries stop
+# matching.
+
+CACHE_KEY_VERSIONS = {
+    "portfolio": 1,
+    "market_trends": 2,
+    "goal_plan": 1,
+    "portfolio_run": 1,
+}
+
+# Decimal places kept for numeric inputs (cents for money amounts)
+NUMBER_PRECISION = 2
+
+GOAL_PLAN_FIELDS = (
+    "goal_type", "goal_target_amount", "goal_target_horizon", "current_net_worth",
+    "risk_tolerance", "current_age", "annual_income", "monthly_expenses", "monthly_savings",
+)
+
+
+def _number(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    value = round(float(value), NUMBER_PRECISION)
+    # 100, 100.0 and 100.001 all key the same
+    return int(value) if value.is_integer() else value
+
+
+def canonicalize(value):
+    """
+    Returns a normalized copy of value for hashing: numbers rounded to
+    NUMBER_PRECISION, strings stripped with inner whitespace collapsed, and
+    containers rebuilt recursively. The input is never modified.
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return _number(value)
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    return str(value)
+
+
+def stable_key(namespace: str, payload) -> str:
+    """Returns "<namespace>:v<version>:<sha256 of the canonical payload>"."""
+    document = json.dumps(canonicalize(payload), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(document.encode()).hexdigest()
+    return f"{namespace}:v{CACHE_KEY_VERSIONS[namespace]}:{digest}"
+
+
+def _ticker(ticker) -> str:
+    return str(ticker or "").strip().upper()
+
+
+def portfolio_key(portfolio_json: dict, user_goal: str) -> str:
+    """
+    Key for a portfolio analysis. Only the currency, each holding's ticker and
+    value, and the goal matter; holding order and ticker case do not, and
+    fields added by enrichment are ignored.
+    """
+    holdings = [
+        {"ticker": _ticker(item.get("ticker")), "current_value": item.get("current_value", 0)}
+        for item in portfolio_json.get("holdings", [])
+    ]
+    holdings.sort(key=lambda h: (h["ticker"], str(canonicalize(h["current_value"]))))
+    return stable_key("portfolio", {
+        "base_currency": _ticker(portfolio_json.get("base_currency")),
+        "holdings": holdings,
+        "user_goal": user_goal or "",
+    })
+
+
+def portfolio_run_key(portfolio_json: dict, user_goal: str) -> str:
+    """
+    Key for a whole portfolio run (enrichment plus analysis), built from the
+    portfolio exactly as uploaded, so a hit is found before any enrichment.
+    """
+    return stable_key("portfolio_run", {"portfolio": portfolio_json, "user_goal": user_goal or ""})
+
+
+def market_trends_key(ticker: str) -> str:
+    """Key for a market trends analysis of one ticker."""
+    return stable_key("market_trends", {"ticker": _ticker(ticker)})
+
+
+def goal_plan_key(inputs: dict) -> str:
+    """Key for a goal plan, built from the goal planning form fields."""
+    payload = {field: inputs.get(field) for field in GOAL_PLAN_FIELDS}
+    if isinstance(payload["goal_type"], str):
+        payload["goal_type"] = payload["goal_type"].lower()
+    if isinstance(payload["risk_tolerance"], str):
+        payload["risk_tolerance"] = payload["risk_tolerance"].lower()
+    return stable_key("goal_plan", payload)
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from result_cache import RESULT_TYPES
+
+# Durable, bounded graph checkpoints. Both graphs (the workflow and the chat
+# agent) checkpoint into one SQLite file through a single process-wide saver.
+# Each browser session gets its own thread_id, so the storage is bounded in
+# two ways:
+#   - per thread, only the newest CHECKPOINT_MAX_PER_THREAD checkpoints (and
+#     their pending writes) are kept; older ones are deleted as new ones land
+#   - threads idle for longer than CHECKPOINT_THREAD_TTL seconds are deleted
+#     by a sweep that runs at most every CHECKPOINT_SWEEP_INTERVAL seconds
+
+CHECKPOINT_DB_PATH = os.getenv(
+    "CHECKPOINT_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "checkpoints.sqlite3"),
+)
+CHECKPOINT_MAX_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "20"))
+CHECKPOINT_THREAD_TTL = int(os.getenv("CHECKPOINT_THREAD_TTL", str(24 * 3600)))
+CHECKPOINT_SWEEP_INTERVAL = int(os.getenv("CHECKPOINT_SWEEP_INTERVAL", "300"))
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that keeps a bounded number of checkpoints per thread and evicts
+    idle threads. Async methods run the sync ones on a worker thread, so the same
+    saver serves graphs built with create_workflow(async_mode=True).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_per_thread: int = CHECKPOINT_MAX_PER_THREAD,
+                 thread_ttl: int = CHECKPOINT_THREAD_TTL, sweep_interval: int = CHECKPOINT_SWEEP_INTERVAL, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.max_per_thread = max_per_thread
+        self.thread_ttl = thread_ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self.pruned_checkpoints = 0
+        self.evicted_threads = 0
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_last_seen ON thread_activity (last_seen);
+            """
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(saved["configurable"]["thread_id"])
+        checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_seen) VALUES (?, ?)",
+                (thread_id, now),
+            )
+            self._trim(cur, thread_id, checkpoint_ns)
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.sweep(now)
+        return saved
+
+    def _trim(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str):
+        # checkpoint ids are time-ordered (uuid6), newest sorts last
+        cur.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_per_thread),
+        )
+        stale = [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in cur.fetchall()]
+        if not stale:
+            return
+        cur.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", stale
+        )
+        cur.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", stale
+        )
+        self.pruned_checkpoints += len(stale)
+
+    def sweep(self, now: float = None) -> int:
+        """Deletes threads idle for longer than thread_ttl and returns how many were removed."""
+        cutoff = (now or time.time()) - self.thread_ttl
+        with self.cursor() as cur:
+            cur.execute("SELECT thread_id FROM thread_activity WHERE last_seen < ?", (cutoff,))
+            expired = [row[0] for row in cur.fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        self.evicted_threads += len(expired)
+        return len(expired)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def stats(self) -> dict:
+        """Returns the stored thread and checkpoint counts plus pruning counters."""
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+            checkpoints = cur.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "evicted_threads": self.evicted_threads,
+        }
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        ):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(self, *, config, channels):
+        return await asyncio.to_thread(self.get_delta_channel_history, config=config, channels=channels)
+
+
+def create_checkpointer(path: str = CHECKPOINT_DB_PATH) -> BoundedSqliteSaver:
+    """Creates a bounded saver on the SQLite file at path (":memory:" for a throwaway one)."""
+    if path != ":memory:" and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # one connection shared across threads; the saver serializes access with its lock
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # graph state carries the result models (PortfolioInsights, GoalPlanResult),
+    # which msgpack only rebuilds when they are allowed explicitly
+    return BoundedSqliteSaver(conn, serde=JsonPlusSerializer(allowed_msgpack_modules=RESULT_TYPES))
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer() -> BoundedSqliteSaver:
+    """Returns the process-wide checkpointer, creating it on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = create_checkpointer()
+    return _checkpointer
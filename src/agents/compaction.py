@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+from cachetools import LRUCache
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+# Compaction of conversation history before it is sent to a model. The chat
+# graph keeps every message of a thread in state (operator.add), so a long chat
+# would otherwise be resent in full on every call. Compaction only shapes the
+# prompt: the thread's stored history still grows with the session until the
+# checkpointer evicts the idle thread (the checkpointer bounds the number of
+# checkpoints, not the size of one). The workflow graph trims its own messages
+# channel instead (workflow.add_recent_messages). Compaction leaves the newest COMPACTION_KEEP_TURNS
+# turns verbatim and, only while the history is over COMPACTION_TOKEN_BUDGET,
+# applies to the older turns in order:
+#   1. tool outputs are cut to their first COMPACTION_TOOL_OUTPUT_CHARS characters
+#   2. the older turns are replaced by a running summary, when a summarizer is given
+#   3. the oldest turns are dropped
+# Summaries are cached by a hash of the turns they cover, so each turn is
+# summarized once: a later compaction extends the cached summary with only the
+# turns that have aged out since.
+
+COMPACTION_TOKEN_BUDGET = int(os.getenv("COMPACTION_TOKEN_BUDGET", "6000"))
+COMPACTION_KEEP_TURNS = int(os.getenv("COMPACTION_KEEP_TURNS", "4"))
+COMPACTION_TOOL_OUTPUT_CHARS = 300
+SUMMARY_CACHE_SIZE = 256
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and a financial assistant in at most 150 words.
+Keep the user's questions, goals and personal details, tickers and figures discussed, and the conclusions reached.
+{previous}
+Conversation:
+{conversation}"""
+
+
+def estimate_tokens(messages) -> int:
+    """Approximate prompt tokens for messages (about 4 characters per token)."""
+    return count_tokens_approximately(messages)
+
+
+def split_turns(messages) -> list:
+    """
+    Splits messages into turns, each starting at a HumanMessage. Messages before
+    the first HumanMessage form a turn of their own.
+    """
+    turns = []
+    for message in messages:
+        if not turns or isinstance(message, HumanMessage):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def elide_tool_output(message, keep_chars: int = COMPACTION_TOOL_OUTPUT_CHARS):
+    """Returns message with a long tool output cut down; other messages are returned as is."""
+    if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+        return message
+    if len(message.content) <= keep_chars:
+        return message
+    content = message.content[:keep_chars] + f"... [{len(message.content) - keep_chars} characters of tool output elided]"
+    # the copy keeps tool_call_id, so the call/result pairing stays valid
+    return message.model_copy(update={"content": content})
+
+
+def _turn_digests(turns) -> list:
+    """Running digests: entry i identifies turns[:i + 1]."""
+    digest = hashlib.sha256()
+    digests = []
+    for turn in turns:
+        for message in turn:
+            digest.update(json.dumps([message.type, message.content], default=str, sort_keys=True).encode())
+            digest.update(b"\0")
+        digests.append(digest.hexdigest())
+    return digests
+
+
+class SummaryCache:
+    """LRU of running summaries keyed by the digest of the turns they cover."""
+
+    def __init__(self, maxsize: int = SUMMARY_CACHE_SIZE):
+        self._summaries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str):
+        with self._lock:
+            return self._summaries.get(digest)
+
+    def put(self, digest: str, summary: str):
+        with self._lock:
+            self._summaries[digest] = summary
+
+    def summarize(self, turns, summarize) -> str:
+        """
+        Returns the summary of turns, extending the longest cached summary of a
+        prefix of them with the turns after it.
+        """
+        digests = _turn_digests(turns)
+        start, previous = 0, None
+        for i in range(len(digests) - 1, -1, -1):
+            previous = self.get(digests[i])
+            if previous is not None:
+                start = i + 1
+                break
+        if start == len(turns):
+            self.hits += 1
+            return previous
+        self.misses += 1
+        summary = summarize(previous, [m for turn in turns[start:] for m in turn])
+        self.put(digests[-1], summary)
+        return summary
+
+
+def compact_messages(messages, budget: int = COMPACTION_TOKEN_BUDGET, keep_turns: int = COMPACTION_KEEP_TURNS,
+                     summarize=None, cache: SummaryCache = None):
+    """
+    Fits a conversation into a token budget.
+    Args:
+        messages: The conversation, oldest first.
+        budget: Target prompt tokens for the compacted conversation.
+        keep_turns: Newest turns always kept verbatim, even over budget.
+        summarize: Optional callable (previous_summary, messages) -> str used to
+            summarize older turns; see llm_summarizer.
+        cache: SummaryCache for running summaries, defaults to the process-wide one.
+    Returns (compacted messages, report), where report holds tokens_before,
+    tokens_after, elided_tool_outputs, summarized_turns and dropped_turns.
+    """
+    tokens_before = estimate_tokens(messages)
+    report = {"tokens_before": tokens_before, "tokens_after": tokens_before,
+              "elided_tool_outputs": 0, "summarized_turns": 0, "dropped_turns": 0}
+    turns = split_turns(messages)
+    if tokens_before <= budget or len(turns) <= keep_turns:
+        return list(messages), report
+
+    split = len(turns) - keep_turns
+    older, recent = turns[:split], turns[split:]
+    recent_messages = [m for turn in recent for m in turn]
+
+    # 1. cut old tool outputs
+    elided = []
+    for turn in older:
+        compacted_turn = [elide_tool_output(m) for m in turn]
+        report["elided_tool_outputs"] += sum(a is not b for a, b in zip(turn, compacted_turn))
+        elided.append(compacted_turn)
+    compacted = [m for turn in elided for m in turn] + recent_messages
+
+    # 2. summarize the older turns
+    if estimate_tokens(compacted) > budget and summarize is not None:
+        summary = (cache or get_summary_cache()).summarize(older, summarize)
+        report["summarized_turns"] = len(older)
+        compacted = [HumanMessage(content=SUMMARY_PREFIX + summary)] + recent_messages
+        elided = []
+
+    # 3. drop the oldest turns that are still over budget
+    while elided and estimate_tokens(compacted) > budget:
+        dropped = elided.pop(0)
+        report["dropped_turns"] += 1
+        compacted = compacted[len(dropped):]
+
+    report["tokens_after"] = estimate_tokens(compacted)
+    print(f"Compacted history: {report['tokens_before']} -> {report['tokens_after']} prompt tokens "
+          f"({report['elided_tool_outputs']} tool outputs elided, {report['summarized_turns']} turns summarized, "
+          f"{report['dropped_turns']} turns dropped)")
+    return compacted, report
+
+
+def llm_summarizer(llm):
+    """Returns a summarize callable for compact_messages backed by a chat model."""
+    # "nostream" keeps summary tokens out of the graph's message stream
+    llm = llm.with_config(tags=["nostream"])
+
+    def summarize(previous: str, messages) -> str:
+        conversation = "\n".join(
+            f"{m.type}: {m.content if isinstance(m.content, str) else json.dumps(m.content, default=str)}"
+            for m in messages
+        )
+        previous = f"Summary so far, to extend:\n{previous}\n" if previous else ""
+        return llm.invoke(SUMMARY_PROMPT.format(previous=previous, conversation=conversation)).text
+
+    return summarize
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_summary_cache() -> SummaryCache:
+    """Returns the process-wide summary cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SummaryCache()
+    return _cache
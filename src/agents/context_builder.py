@@ -0,0 +1,130 @@
+import datetime
+import math
+
+# Prompt context for ticker data. yfinance info dicts carry well over a hundred
+# fields (business summaries, officer lists, IR links, ...), most of which an
+# agent never uses. Each agent declares the info fields it reads; they are
+# rendered as a compact "field|value" table, and the sections of a prompt are
+# fitted into a hard token budget, trimming the lowest-priority section first.
+
+# Info fields each agent reads, in the order they are rendered
+AGENT_INFO_FIELDS = {
+    "qa": (
+        "symbol", "longName", "quoteType", "sector", "industry", "currency", "exchange",
+        "currentPrice", "previousClose", "marketCap", "trailingPE", "forwardPE", "dividendYield",
+        "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "beta", "website", "longBusinessSummary",
+    ),
+    "market_trends": (
+        "longName", "shortName", "sector", "industry", "currency",
+        "currentPrice", "regularMarketPrice", "previousClose", "dayHigh", "dayLow", "volume", "averageVolume",
+        "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "allTimeHigh", "allTimeLow", "52WeekChange", "SandP52WeekChange",
+        "trailingPE", "forwardPE", "priceToBook", "enterpriseToRevenue", "enterpriseToEbitda", "marketCap",
+        "revenueGrowth", "earningsGrowth", "grossMargins", "operatingMargins", "profitMargins",
+        "totalDebt", "totalCash", "freeCashflow",
+        "dividendYield", "payoutRatio", "lastDividendValue", "lastDividendDate", "beta",
+    ),
+}
+
+# Hard prompt token budget per agent for the ticker context
+CONTEXT_BUDGETS = {
+    "qa": 600,
+    "market_trends": 1200,
+}
+
+CHARS_PER_TOKEN = 4         # same estimate as compaction.estimate_tokens
+MAX_TEXT_CHARS = 300        # long strings such as business summaries are cut here
+
+
+def count_tokens(text: str) -> int:
+    """Approximate tokens in text (about 4 characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def format_value(name: str, value) -> str:
+    """Renders one info value compactly: big numbers abbreviated, epoch dates as ISO dates, long text cut."""
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return "n/a"
+        if name.endswith("Date") and value > 1e8:
+            return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date().isoformat()
+        for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+            if abs(value) >= threshold:
+                return f"{value / threshold:.2f}{suffix}"
+        if isinstance(value, int):
+            return str(value)
+        return f"{value:.2f}" if abs(value) >= 1 else f"{value:.4g}"
+    text = " ".join(str(value).split())
+    return text if len(text) <= MAX_TEXT_CHARS else text[:MAX_TEXT_CHARS] + "..."
+
+
+def project_info(info: dict, agent: str) -> dict:
+    """The agent's declared fields from an info dict, skipping missing ones."""
+    return {name: info[name] for name in AGENT_INFO_FIELDS[agent] if info.get(name) not in (None, "")}
+
+
+def render_table(fields: dict) -> str:
+    """Renders {field: value} as "field|value" lines."""
+    return "\n".join(f"{name}|{format_value(name, value)}" for name, value in fields.items())
+
+
+def info_table(info: dict, agent: str) -> str:
+    """The agent's projection of an info dict as a compact table."""
+    return render_table(project_info(info, agent))
+
+
+class ContextBuilder:
+    """
+    Assembles prompt sections within a token budget. Sections render in the
+    order they are added; when the total is over budget, lines are dropped from
+    the end of the lowest-priority section first (the later one on ties). A
+    table section is dropped whole once only its header lines would be left.
+    """
+
+    def __init__(self, agent: str, budget: int = None):
+        self.agent = agent
+        self.budget = budget or CONTEXT_BUDGETS[agent]
+        self._sections = []     # [name, lines, priority, header lines]
+        self.report = {}
+
+    def add(self, name: str, text: str, priority: int = 0, header: int = 0) -> "ContextBuilder":
+        """
+        Adds a section; higher priority sections are trimmed last. header is the
+        number of leading lines (e.g. a table's column names) that are only
+        kept while at least one line after them is.
+        """
+        if text:
+            self._sections.append([name, text.split("\n"), priority, header])
+        return self
+
+    def _render(self, sections) -> str:
+        return "\n\n".join(f"## {name}\n" + "\n".join(lines) for name, lines, _, _ in sections if lines)
+
+    def build(self) -> str:
+        """Returns the sections as one text within the budget, and fills in report."""
+        sections = [[name, list(lines), priority, header] for name, lines, priority, header in self._sections]
+        before = {name: count_tokens("\n".join(lines)) for name, lines, _, _ in sections}
+        trimmed = {}
+        text = self._render(sections)
+        # sorted() is stable, so reversing first puts later sections first on ties
+        for section in sorted(reversed(sections), key=lambda s: s[2]):
+            name, lines, _, header = section
+            while lines and count_tokens(text) > self.budget:
+                dropped = len(lines) if len(lines) <= header + 1 else 1
+                del lines[-dropped:]
+                trimmed[name] = trimmed.get(name, 0) + dropped
+                text = self._render(sections)
+        self.report = {
+            "agent": self.agent,
+            "budget": self.budget,
+            "sections": {name: count_tokens("\n".join(lines)) for name, lines, _, _ in sections},
+            "sections_before": before,
+            "trimmed_lines": trimmed,
+            "total": count_tokens(text),
+        }
+        print(f"Context for {self.agent}: "
+              + ", ".join(f"{name} {tokens}" for name, tokens in self.report["sections"].items())
+              + f" = {self.report['total']}/{self.budget} tokens"
+              + (f" (trimmed {trimmed})" if trimmed else ""))
+        return text
@@ -1,15 +1,100 @@
 from langchain.tools import tool
-from langchain.agents.middleware import wrap_tool_call
-from langchain_core.messages import ToolMessage
-import yfinance as yf
 import json
-import cachetools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from market_data import get_provider
+from ticker_store import get_metadata_store
+from snapshot_cache import SnapshotCache
+from history_store import get_history_store, PriceHistory
+from snapshot import TickerSnapshot
+from indicators import features_for_histories, feature_rows, format_feature_table
+from news import get_news_cache, match_news
+from context_builder import ContextBuilder, info_table
 
+# Bounded parallelism for portfolio enrichment
+ENRICH_MAX_WORKERS = 8
+# Seconds a single ticker may hold a worker before it is marked as timed out
+ENRICH_TICKER_TIMEOUT = 10
+# Info fields used to enrich portfolio holdings
+ENRICH_FIELDS = ("longName", "sector", "industry")
+# Info fields that give the company names news headlines are matched against
+NEWS_NAME_FIELDS = ("longName", "shortName", "displayName")
 
-@cachetools.cached(cache=cachetools.TTLCache(maxsize=128, ttl=300))
-def get_ticker_info_cached(ticker: str) -> str:
-    """Cached version of get_ticker_info to avoid redundant API calls."""
-    return yf.Ticker(ticker)
+
+snapshot_cache = SnapshotCache()
+
+def get_ticker_info_cached(ticker: str) -> dict:
+    """Cached ticker info dict, read through the metadata store on a miss."""
+    return snapshot_cache.get(ticker, "info", lambda: get_metadata_store().get_info(ticker))
+
+def get_fast_info_cached(ticker: str) -> dict:
+    """Cached fast_info quote fields for a ticker, as a plain dict."""
+    return snapshot_cache.get(ticker, "fast_info", lambda: get_provider().fast_info(ticker))
+
+def get_price_history(ticker: str, period: str = "6mo") -> PriceHistory:
+    """Daily bars for a ticker from the local history store, fetching only missing days."""
+    return get_history_store().window(ticker, period)
+
+def get_price_histories(tickers, period: str = "6mo") -> list:
+    """Daily bars for several tickers, updating them with bulk requests."""
+    return get_history_store().windows(tickers, period)
+
+def _fast_quote(ticker: str) -> dict:
+    fast = get_provider().fast_info(ticker)
+    return {"lastPrice": fast.get("lastPrice"), "previousClose": fast.get("previousClose")}
+
+def get_quotes(tickers, timeout: float = ENRICH_TICKER_TIMEOUT) -> dict:
+    """
+    Latest quotes for many tickers. Cached quotes are served from the snapshot
+    cache and the rest come from one bulk request, cached per ticker. Symbols
+    the bulk request missed are fetched in parallel, waiting at most timeout
+    seconds for them.
+    Returns {ticker: {"lastPrice", "previousClose"}} or {"error": ...} per ticker.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers if t))
+    quotes = {}
+    misses = []
+    for ticker in tickers:
+        quote = snapshot_cache.peek(ticker, "quote")
+        if quote is None:
+            misses.append(ticker)
+        else:
+            quotes[ticker] = quote
+    if not misses:
+        return quotes
+
+    try:
+        fetched = get_provider().quotes(misses)
+    except Exception as e:
+        print(f"Bulk quote fetch failed for {len(misses)} tickers: {e}")
+        fetched = {}
+    for ticker, quote in fetched.items():
+        if ticker in misses and quote is not None:
+            snapshot_cache.put(ticker, "quote", quote)
+            quotes[ticker] = quote
+
+    missed = [t for t in misses if t not in quotes]
+    if not missed:
+        return quotes
+    pool = ThreadPoolExecutor(max_workers=min(ENRICH_MAX_WORKERS, len(missed)), thread_name_prefix="quote")
+    futures = {pool.submit(_fast_quote, ticker): ticker for ticker in missed}
+    try:
+        done, _ = wait(futures, timeout=timeout)
+        for f, ticker in futures.items():
+            if f not in done:
+                quotes[ticker] = {"error": f"Timed out after {timeout}s"}
+                continue
+            try:
+                quote = f.result()
+            except Exception as e:
+                quotes[ticker] = {"error": str(e)}
+                continue
+            snapshot_cache.put(ticker, "quote", quote)
+            quotes[ticker] = quote
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return quotes
 
 @tool
 def get_ticker_info(ticker: str) -> str:
@@ -20,54 +105,40 @@ def get_ticker_info(ticker: str) -> str:
     """
     print("Fetching info for ticker:", ticker)
     try:
-        stock = get_ticker_info_cached(ticker)
-        return json.dumps(stock.info, default=str)
+        info = get_ticker_info_cached(ticker)
+        return ContextBuilder("qa").add("info", info_table(info, "qa")).build()
     except Exception as e:
         return json.dumps({"error": str(e)})
     
 
-def filter_news(news_list, company_name, ticker):
-    """Filter news articles relevant to the company name or ticker."""
-    filtered = []
-    for a in news_list:
-        article = a['content']
-        title = article.get('title', '').lower()
-        if company_name.lower() in title or ticker.lower() in title:
-            filtered.append({
-                "title": article.get("title"),
-                "url": article.get("canonicalUrl"),
-            })
-    return filtered
-
-def prepare_history_data(history):
-    history_formatted = {}
-    for key, value in history.items():
-        if key != "Date":
-            history_formatted[key] = value
-        else:
-            print(type(value))
-            print([v.date().strftime("%Y-%m-%d") for v in value])
-            new_value = [v.date().strftime("%Y-%m-%d") if hasattr(v, 'date') else v for v in value]
-            history_formatted[key] = new_value
-    return history_formatted
+def get_ticker_snapshot(ticker: str) -> TickerSnapshot:
+    """Builds a TickerSnapshot with info, news, indicators and the last 120 daily bars."""
+    info = get_ticker_info_cached(ticker)
+    # a year of bars feeds the 200-day and 52-week indicators; the chart shows the tail
+    year = get_price_history(ticker, "1y")
+    indicators = feature_rows([ticker.upper()], features_for_histories([year]))[0]
+    news = match_news([ticker], {ticker: info})[ticker.upper()]
+    return TickerSnapshot.from_history(ticker, info, get_fast_info_cached(ticker), news, year.tail(120), indicators)
 
-@tool
-def yf_snapshot(ticker: str) -> dict:
+def get_watchlist_features(tickers) -> str:
+    """Computes the indicator table for several tickers in one vectorized pass."""
+    tickers = [t.upper() for t in dict.fromkeys(tickers)]
+    histories = get_price_histories(tickers, "1y")
+    return format_feature_table(tickers, features_for_histories(histories))
+
+def get_watchlist_news(tickers, limit: int = 10) -> dict:
+    """Matches news against a whole watchlist in one pass, using company names from the metadata store."""
+    infos = fetch_ticker_infos(tickers, NEWS_NAME_FIELDS)
+    return match_news(tickers, {t: i for t, i in infos.items() if "error" not in i}, limit=limit)
+
+@tool(response_format="content_and_artifact")
+def yf_snapshot(ticker: str):
     """Return a combined yfinance snapshot for a given ticker."""
     print("Fetching yf_snapshot for ticker:", ticker)
-    t = get_ticker_info_cached(ticker)
-    info = t.get_info() if hasattr(t, "get_info") else t.info
-    history = t.history(period="6mo", interval="1d").tail(120).reset_index().to_dict(orient="list")
-    fast = getattr(t, "fast_info", {})
-    news = filter_news(t.news, info.get("displayName", ""), ticker)
-    out = {
-        "ticker": ticker.upper(),
-        "info": info,
-        "fast_info": dict(fast) if fast is not None else {},
-        "history_6m": prepare_history_data(history),
-        "news": news
-    }
-    return out
+    # the model only sees the compact prompt; the full snapshot rides along
+    # as the ToolMessage artifact for charts and news
+    snapshot = get_ticker_snapshot(ticker)
+    return snapshot.to_prompt(), snapshot
     
 
 # print("yf_snapshot tool loaded for ticker:", yf_snapshot.invoke("AAPL").content)
@@ -76,17 +147,81 @@ def yf_snapshot(ticker: str) -> dict:
 def yf_news(ticker: str) -> list:
     """Fetch latest news articles for a given ticker."""
     print("Fetching yf_news for ticker:", ticker)
-    t = yf.Ticker(ticker)
-    news = t.news
-    for a in news:
-        article = a['content']
-        # print(f"Title: {article.get('title')}\nLink: {article.get('link')}\nPublished: {article.get('providerPublishTime')}\n")
-    return news
+    return get_news_cache().get(ticker)
 
 # print("yf_news tool loaded for ticker:", yf_news("AAPL"))
 
 # print("yf_snapshot tool loaded for ticker:", yf_snapshot.invoke("AAPL"))
 
+def fetch_ticker_info(ticker: str, fields=None) -> dict:
+    """Fetches info for a single ticker upstream and records it in the metadata store."""
+    return get_metadata_store().refresh(ticker, fields)
+
+def fetch_ticker_infos(tickers, fields=None, max_workers: int = ENRICH_MAX_WORKERS, timeout: float = ENRICH_TICKER_TIMEOUT) -> dict:
+    """
+    Fetches info for many tickers concurrently, answering fresh ones from the metadata store.
+    Args:
+        tickers: Ticker symbols, repeats are fetched only once.
+        fields: Info fields needed, or None for the full info dict.
+        max_workers: Maximum number of concurrent fetches.
+        timeout: Seconds each ticker may spend fetching once started.
+    Returns a dict mapping each ticker to its info dict, or to {"error": ...}
+    when that ticker failed or timed out.
+    """
+    unique = list(dict.fromkeys(t for t in tickers if t))
+    results = {}
+    store = get_metadata_store()
+    misses = []
+    for ticker in unique:
+        info = store.get_fresh(ticker, fields)
+        if info is None:
+            misses.append(ticker)
+        else:
+            results[ticker] = info
+    if not misses:
+        return results
+
+    workers = max(1, min(max_workers, len(misses)))
+    started = {}
+
+    def run(ticker):
+        started[ticker] = time.monotonic()
+        return fetch_ticker_info(ticker, fields)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enrich")
+    futures = {pool.submit(run, ticker): ticker for ticker in misses}
+    pending = set(futures)
+    # backstop in case queued tickers never get a worker
+    deadline = time.monotonic() + timeout * (math.ceil(len(misses) / workers) + 1)
+    try:
+        while pending:
+            now = time.monotonic()
+            next_check = deadline
+            for f in pending:
+                ticker = futures[f]
+                if ticker in started:
+                    next_check = min(next_check, started[ticker] + timeout)
+                else:
+                    next_check = min(next_check, now + 0.25)
+            done, pending = wait(pending, timeout=max(0, next_check - now), return_when=FIRST_COMPLETED)
+            for f in done:
+                ticker = futures[f]
+                try:
+                    results[ticker] = f.result()
+                except Exception as e:
+                    results[ticker] = {"error": str(e)}
+            now = time.monotonic()
+            for f in list(pending):
+                ticker = futures[f]
+                if now >= deadline or (ticker in started and now - started[ticker] >= timeout):
+                    f.cancel()
+                    pending.discard(f)
+                    results[ticker] = {"error": f"Timed out after {timeout}s"}
+    finally:
+        # do not block on fetches that are still stuck in a network call
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
 @tool
 def enhance_portfolio_data(portfolio_json: str) -> str:
     """
@@ -97,24 +232,58 @@ def enhance_portfolio_data(portfolio_json: str) -> str:
     try:
         portfolio = json.loads(portfolio_json)
         print("portfolio:", portfolio)
-        enhanced_holdings = []
+        holdings = portfolio.get("holdings", [])
         total_value = 0
-        for item in portfolio.get("holdings", []):
+        for item in holdings:
             total_value += item.get("current_value", 0)
-        for item in portfolio.get("holdings", []):
+
+        tickers = [item.get("ticker") for item in holdings]
+        start = time.perf_counter()
+        # one bulk quote request runs alongside the per-ticker info fetches
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quotes")
+        try:
+            quotes_future = pool.submit(get_quotes, tickers)
+            infos = fetch_ticker_infos(tickers, ENRICH_FIELDS)
+            try:
+                quotes = quotes_future.result(timeout=ENRICH_TICKER_TIMEOUT)
+            except TimeoutError:
+                # holdings show "N/A" prices rather than waiting on a stuck request
+                print(f"Quote fetch timed out after {ENRICH_TICKER_TIMEOUT}s")
+                quotes = {}
+        finally:
+            # do not block on a bulk request that is still stuck in a network call
+            pool.shutdown(wait=False)
+        elapsed = time.perf_counter() - start
+
+        enhanced_holdings = []
+        errors = 0
+        for item in holdings:
             ticker = item.get("ticker")
             if ticker:
-                stock_info = yf.Ticker(ticker).info
+                stock_info = infos.get(ticker, {})
                 item["current_value"] =  int(item.get("current_value", 0))
                 item["longName"] = stock_info.get("longName", "N/A")
                 item["sector"] = stock_info.get("sector", "N/A")
                 item["industry"] = stock_info.get("industry", "N/A")
                 item["weight_percent"] = round(item.get("current_value", 0) / total_value * 100, 2) if total_value > 0 else 0
+                quote = quotes.get(ticker.upper(), {})
+                last_price, previous_close = quote.get("lastPrice"), quote.get("previousClose")
+                item["last_price"] = round(last_price, 2) if last_price else "N/A"
+                item["day_change_percent"] = round((last_price / previous_close - 1) * 100, 2) if last_price and previous_close else "N/A"
+                if "error" in stock_info:
+                    item["error"] = stock_info["error"]
+                    errors += 1
                 # item["info"] = stock_info
             enhanced_holdings.append(item)
         # print("Total portfolio value:", total_value)
+        print(f"Enriched {len(infos)} tickers in {elapsed:.2f}s ({errors} holdings with errors)")
         portfolio['holdings'] = enhanced_holdings
         portfolio['total_value'] = total_value
+        portfolio['enrichment'] = {
+            "tickers": len(infos),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+        }
         return json.dumps(portfolio, default=str)
     except Exception as e:
         return json.dumps({"error": str(e)})
@@ -136,16 +305,3 @@ def enhance_portfolio_data(portfolio_json: str) -> str:
 # import json
 
 # print(enhance_portfolio_data(json.dumps(portfolio, default=str)))
-
-
-
-@wrap_tool_call
-def handle_tool_errors(request, handler):
-    """Handle tool execution errors with custom messages."""
-    try:
-        return handler(request)
-    except Exception as e:
-        # Return a custom error message to the model
-        return ToolMessage(
-            content=f"Tool error: Please check your input and try again. ({str(e)})",
-            tool_call_id=request.tool_call["id"])
\ No newline at end of file
@@ -1,4 +1,4 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_router import get_model
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 from typing import Any, Dict
@@ -10,7 +10,7 @@ load_dotenv()  # take environment variables from .env file
 
 from prompts import goal_planning_system_prompt
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0)
+llm = get_model("goal_planning")
 
 llm_with_tools = llm.bind_tools([])
 structured_llm = llm_with_tools.with_structured_output(GoalPlanResult)  # if using tools
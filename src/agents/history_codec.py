@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Conversions between yfinance history frames and the formats the app passes
+# around: int32 epoch-day arrays for the history store and snapshots, and a
+# dict of lists with ISO dates for JSON and the UI. Every conversion is a
+# whole-array numpy operation; nothing loops over bars in Python.
+
+DATE_COLUMN = "Date"
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+DATE_DTYPE = np.dtype("<i4")    # days since 1970-01-01
+PRICE_DTYPE = np.dtype("<f8")
+
+
+def epoch_days(index: pd.DatetimeIndex) -> np.ndarray:
+    """Calendar dates of a DatetimeIndex, in its own timezone, as days since 1970-01-01."""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.values.astype("datetime64[D]").astype(DATE_DTYPE)
+
+
+def iso_dates(days) -> list:
+    """Formats epoch days as "YYYY-MM-DD" strings in one call."""
+    return np.datetime_as_string(np.asarray(days, DATE_DTYPE).astype("datetime64[D]"), unit="D").tolist()
+
+
+def parse_iso_dates(dates) -> np.ndarray:
+    """Parses "YYYY-MM-DD" strings back to epoch days."""
+    return np.asarray(dates, dtype="datetime64[D]").astype(DATE_DTYPE)
+
+
+def frame_to_columns(df: pd.DataFrame):
+    """
+    Splits a yfinance history frame into (dates, columns), where dates are epoch
+    days and columns maps each of PRICE_COLUMNS to a float64 array.
+    """
+    if df.empty:
+        return np.empty(0, DATE_DTYPE), {c: np.empty(0, PRICE_DTYPE) for c in PRICE_COLUMNS}
+    return epoch_days(df.index), {c: df[c].to_numpy(dtype=PRICE_DTYPE) for c in PRICE_COLUMNS}
+
+
+def columns_to_wire(dates, columns: dict) -> dict:
+    """Encodes bars as {"Date": [ISO dates], "Open": [...], ...} for JSON and the UI."""
+    wire = {DATE_COLUMN: iso_dates(dates)}
+    for c in PRICE_COLUMNS:
+        wire[c] = np.asarray(columns[c], PRICE_DTYPE).tolist()
+    return wire
+
+
+def wire_to_columns(wire: dict):
+    """Decodes the dict-of-lists format back to (dates, columns)."""
+    return parse_iso_dates(wire[DATE_COLUMN]), {c: np.asarray(wire[c], PRICE_DTYPE) for c in PRICE_COLUMNS}
+
+
+def frame_to_wire(df: pd.DataFrame) -> dict:
+    """Encodes a yfinance history frame in the dict-of-lists wire format."""
+    return columns_to_wire(*frame_to_columns(df))
+
+
+def benchmark_codec(sizes=(120, 1260, 2520, 5040), iterations: int = 200):
+    """
+    Compares the old to_dict + per-row strftime conversion against the codec for
+    history frames from 120 bars (6 months) up to 5040 bars (20 years).
+    """
+    import time
+
+    def legacy(df):
+        history = df.reset_index().to_dict(orient="list")
+        return {
+            k: [v.date().strftime("%Y-%m-%d") if hasattr(v, "date") else v for v in values] if k == DATE_COLUMN else values
+            for k, values in history.items()
+        }
+
+    def timed(fn, df):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(df)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    rng = np.random.default_rng(0)
+    print(f"{'bars':>6}{'legacy (us)':>14}{'wire (us)':>12}{'epoch days (us)':>18}{'speedup':>10}")
+    for n in sizes:
+        index = pd.bdate_range(end="2025-12-31", periods=n, tz="America/New_York", name=DATE_COLUMN)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        df = pd.DataFrame({
+            "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+            "Volume": rng.integers(1e5, 1e7, n), "Dividends": 0.0, "Stock Splits": 0.0,
+        }, index=index)
+        assert legacy(df)[DATE_COLUMN] == frame_to_wire(df)[DATE_COLUMN]
+        legacy_us = timed(legacy, df)
+        wire_us = timed(frame_to_wire, df)
+        columns_us = timed(frame_to_columns, df)
+        print(f"{n:>6}{legacy_us:>14.1f}{wire_us:>12.1f}{columns_us:>18.1f}{legacy_us / wire_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark_codec()
@@ -0,0 +1,413 @@
+import datetime
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+import numpy as np
+from market_data import get_provider, provider_data_path
+from single_flight import SingleFlight
+from history_codec import DATE_COLUMN, PRICE_COLUMNS, DATE_DTYPE, PRICE_DTYPE, frame_to_columns
+
+# Local per-ticker daily OHLCV store. Each ticker gets a directory holding one
+# flat binary file per column; files only ever grow by appending, and reads map
+# them into memory so any window is a slice of the same arrays.
+
+HISTORY_STORE_PATH = os.getenv(
+    "HISTORY_STORE_PATH",
+    provider_data_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")),
+)
+
+# How much history to backfill the first time a ticker is seen
+INITIAL_HISTORY_PERIOD = os.getenv("INITIAL_HISTORY_PERIOD", "10y")
+
+# Minimum seconds between upstream checks for new bars of the same ticker
+REFRESH_INTERVAL = 15 * 60
+
+# Bars are dated in the exchange's calendar, so "today" is the exchange's date
+EXCHANGE_TIMEZONE = ZoneInfo("America/New_York")
+
+# Relative difference between a re-fetched close and the stored one that counts
+# as a price adjustment rather than rounding noise
+ADJUSTMENT_TOLERANCE = 1e-4
+
+# Days before the last stored bar that are re-fetched when an adjustment is found
+ADJUSTMENT_OVERLAP_DAYS = 31
+
+PERIOD_DAYS = {
+    "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183,
+    "1y": 366, "2y": 731, "5y": 1827, "10y": 3653,
+}
+
+
+@dataclass
+class PriceHistory:
+    """Daily bars for one ticker. Arrays are read-only views into the store."""
+
+    ticker: str
+    dates: np.ndarray   # int32 days since epoch
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.dates)
+
+    def tail(self, n: int) -> "PriceHistory":
+        """Returns the last n bars without copying."""
+        return self[-n:] if n < len(self) else self
+
+    def __getitem__(self, s: slice) -> "PriceHistory":
+        return PriceHistory(
+            self.ticker, self.dates[s], self.open[s], self.high[s],
+            self.low[s], self.close[s], self.volume[s],
+        )
+
+
+def _today() -> int:
+    """Today's date on the exchange, as days since epoch."""
+    return (datetime.datetime.now(EXCHANGE_TIMEZONE).date() - datetime.date(1970, 1, 1)).days
+
+
+def _last_completed_weekday(today: int) -> int:
+    """Most recent weekday strictly before today (1970-01-01 was a Thursday)."""
+    day = today - 1
+    while (day + 3) % 7 >= 5:
+        day -= 1
+    return day
+
+
+def _period_start(period: str, last_day: int) -> int:
+    """First epoch day covered by a yfinance-style period ending at last_day."""
+    if period == "max":
+        return np.iinfo(DATE_DTYPE).min
+    if period == "ytd":
+        year = (datetime.date(1970, 1, 1) + datetime.timedelta(days=last_day)).year
+        return (datetime.date(year, 1, 1) - datetime.date(1970, 1, 1)).days
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period: {period}")
+    return last_day - PERIOD_DAYS[period] + 1
+
+
+def _to_bars(df):
+    """Converts a provider history frame to (dates, columns), dropping today's forming bar."""
+    # bar dates in the exchange's own calendar, as epoch days
+    days, columns = frame_to_columns(df)
+    keep = days < _today()  # today's bar is still forming
+    return days[keep], {c: v[keep] for c, v in columns.items()}
+
+
+def _fetch_range(start: int = None) -> dict:
+    if start is None:
+        return {"period": INITIAL_HISTORY_PERIOD}
+    return {
+        "start": datetime.date(1970, 1, 1) + datetime.timedelta(days=start),
+        "end": datetime.date(1970, 1, 1) + datetime.timedelta(days=_today()),
+    }
+
+
+def fetch_daily_bars(ticker: str, start: int = None):
+    """
+    Fetches completed daily bars from the market data provider.
+    Args:
+        ticker: The stock ticker symbol.
+        start: First epoch day to fetch, or None for INITIAL_HISTORY_PERIOD.
+    Returns (dates, columns) where columns maps each of PRICE_COLUMNS to an array.
+    """
+    return _to_bars(get_provider().history(ticker, interval="1d", **_fetch_range(start)))
+
+
+def fetch_daily_bars_many(tickers, start: int = None) -> dict:
+    """
+    Fetches completed daily bars for many tickers in one bulk provider request.
+    Returns {ticker: (dates, columns)}; tickers the provider returned nothing for are left out.
+    """
+    frames = get_provider().bulk_history(list(tickers), **_fetch_range(start))
+    return {ticker.upper(): _to_bars(df) for ticker, df in frames.items()}
+
+
+class HistoryStore:
+    """Append-only on-disk store of daily OHLCV bars, read through numpy memmaps."""
+
+    def __init__(self, root: str = HISTORY_STORE_PATH):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _dir(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker.upper())
+
+    def _path(self, ticker: str, column: str) -> str:
+        dtype = DATE_DTYPE if column == DATE_COLUMN else PRICE_DTYPE
+        return os.path.join(self._dir(ticker), f"{column.lower()}.{dtype.str[1:]}")
+
+    def _lock(self, ticker: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(ticker.upper(), threading.Lock())
+
+    def _map(self, path: str, dtype: np.dtype, length: int) -> np.ndarray:
+        if length == 0:
+            return np.empty(0, dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+    def _length(self, ticker: str) -> int:
+        # the date column is written last, so it defines how many bars are complete
+        path = self._path(ticker, DATE_COLUMN)
+        return os.path.getsize(path) // DATE_DTYPE.itemsize if os.path.exists(path) else 0
+
+    def load(self, ticker: str) -> PriceHistory:
+        """Returns every stored bar for a ticker as memory-mapped arrays."""
+        n = self._length(ticker)
+        cols = {c: self._map(self._path(ticker, c), PRICE_DTYPE, n) for c in PRICE_COLUMNS}
+        return PriceHistory(
+            ticker.upper(), self._map(self._path(ticker, DATE_COLUMN), DATE_DTYPE, n),
+            cols["Open"], cols["High"], cols["Low"], cols["Close"], cols["Volume"],
+        )
+
+    def _append(self, ticker: str, dates: np.ndarray, columns: dict):
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        n = self._length(ticker)
+        for c in (*PRICE_COLUMNS, DATE_COLUMN):
+            dtype = DATE_DTYPE if c == DATE_COLUMN else PRICE_DTYPE
+            values = dates if c == DATE_COLUMN else columns[c]
+            with open(self._path(ticker, c), "ab") as f:
+                # drop a partial tail left behind by an interrupted append
+                f.truncate(n * dtype.itemsize)
+                f.write(np.ascontiguousarray(values, dtype).tobytes())
+
+    def _rewrite(self, ticker: str, dates: np.ndarray, columns: dict):
+        # write to new files and swap them in, so arrays mapped by readers
+        # keep pointing at the old data instead of a truncated file
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        for c in (*PRICE_COLUMNS, DATE_COLUMN):
+            dtype = DATE_DTYPE if c == DATE_COLUMN else PRICE_DTYPE
+            values = dates if c == DATE_COLUMN else columns[c]
+            path = self._path(ticker, c)
+            with open(path + ".tmp", "wb") as f:
+                f.write(np.ascontiguousarray(values, dtype).tobytes())
+            os.replace(path + ".tmp", path)
+
+    def _checked_path(self, ticker: str) -> str:
+        return os.path.join(self._dir(ticker), "checked.json")
+
+    def _recently_checked(self, ticker: str) -> bool:
+        try:
+            with open(self._checked_path(ticker)) as f:
+                return time.time() - json.load(f)["checked_at"] < REFRESH_INTERVAL
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _mark_checked(self, ticker: str):
+        with open(self._checked_path(ticker), "w") as f:
+            json.dump({"checked_at": time.time()}, f)
+
+    def _needs_update(self, ticker: str) -> bool:
+        stored = self.load(ticker)
+        if len(stored) and stored.dates[-1] >= _last_completed_weekday(_today()):
+            return False
+        return not self._recently_checked(ticker)
+
+    def update(self, ticker: str) -> int:
+        """
+        Brings a ticker's bars up to date, fetching only days missing since the last stored bar.
+        Returns the number of bars appended.
+        """
+        if not self._needs_update(ticker):
+            return 0
+        appended, _ = self._flight.do(ticker.upper(), lambda: self._update(ticker))
+        return appended
+
+    def _update(self, ticker: str) -> int:
+        with self._lock(ticker):
+            stored = self.load(ticker)
+            start = int(stored.dates[-1]) if len(stored) else None
+            return self._merge(ticker, stored, *fetch_daily_bars(ticker, start=start))
+
+    def _merge(self, ticker: str, stored: PriceHistory, dates: np.ndarray, columns: dict) -> int:
+        """
+        Stores freshly fetched bars for a ticker, whose lock the caller holds.
+        Returns the number of bars written.
+        """
+        if not len(stored):
+            self._rewrite(ticker, dates, columns)
+            self._mark_checked(ticker)
+            return len(dates)
+
+        # the fetch covers the last stored bar too: if the provider now reports a
+        # different close, prices were re-adjusted for a split or dividend
+        last = int(stored.dates[-1])
+        overlap = dates == last
+        if overlap.any() and not np.isclose(columns["Close"][overlap][0], stored.close[-1], rtol=ADJUSTMENT_TOLERANCE):
+            return self._readjust(ticker, stored)
+
+        new = dates > last
+        self._append(ticker, dates[new], {c: v[new] for c, v in columns.items()})
+        self._mark_checked(ticker)
+        return int(new.sum())
+
+    def _readjust(self, ticker: str, stored: PriceHistory) -> int:
+        """
+        Re-bases a ticker's stored bars after a split or dividend adjustment.
+        Only the last ADJUSTMENT_OVERLAP_DAYS are re-fetched: an adjustment
+        scales every earlier bar by the same factor, so older bars are rescaled
+        in place by the factor measured over the overlap. When the overlap does
+        not agree on one factor the full history is fetched again.
+        Returns the number of bars written.
+        """
+        dates, columns = fetch_daily_bars(ticker, start=int(stored.dates[-1]) - ADJUSTMENT_OVERLAP_DAYS)
+        _, old, new = np.intersect1d(stored.dates, dates, assume_unique=True, return_indices=True)
+        ratios = columns["Close"][new] / stored.close[old]
+        if len(old) and np.allclose(ratios, ratios[-1], rtol=ADJUSTMENT_TOLERANCE):
+            print(f"Price adjustment detected for {ticker}, rescaling stored history")
+            # splits also rescale volume, dividends leave it alone
+            stored_volume = stored.volume[old].sum()
+            factors = {c: ratios[-1] for c in PRICE_COLUMNS}
+            factors["Volume"] = columns["Volume"][new].sum() / stored_volume if stored_volume else 1.0
+            keep = stored.dates < dates[0]
+            dates = np.concatenate([stored.dates[keep], dates])
+            columns = {
+                c: np.concatenate([getattr(stored, c.lower())[keep] * factors[c], columns[c]])
+                for c in PRICE_COLUMNS
+            }
+        else:
+            print(f"Price history changed for {ticker}, fetching it again")
+            dates, columns = fetch_daily_bars(ticker)
+        self._rewrite(ticker, dates, columns)
+        self._mark_checked(ticker)
+        return len(dates)
+
+    def update_many(self, tickers) -> dict:
+        """
+        Brings many tickers up to date with bulk requests: one for tickers seen for
+        the first time and one per distinct last stored day for the rest (usually
+        just one). Tickers missing from a bulk response are fetched one at a time.
+        Returns {ticker: bars written}.
+        """
+        tickers = [t.upper() for t in dict.fromkeys(tickers) if t]
+        written = {t: 0 for t in tickers}
+        batches = {}
+        for ticker in tickers:
+            if not self._needs_update(ticker):
+                continue
+            stored = self.load(ticker)
+            start = int(stored.dates[-1]) if len(stored) else None
+            batches.setdefault(start, []).append(ticker)
+
+        failed = []
+        for start, batch in batches.items():
+            try:
+                fetched = fetch_daily_bars_many(batch, start=start)
+            except Exception as e:
+                print(f"Bulk history fetch failed for {len(batch)} tickers: {e}")
+                fetched = {}
+            for ticker in batch:
+                if ticker not in fetched:
+                    failed.append(ticker)
+                    continue
+                with self._lock(ticker):
+                    written[ticker] = self._merge(ticker, self.load(ticker), *fetched[ticker])
+
+        for ticker in failed:
+            try:
+                written[ticker] = self.update(ticker)
+            except Exception as e:
+                print(f"History fetch failed for {ticker}: {e}")
+        return written
+
+    @staticmethod
+    def _slice(history: PriceHistory, period: str) -> PriceHistory:
+        if not len(history):
+            return history
+        start = np.searchsorted(history.dates, _period_start(period, int(history.dates[-1])))
+        return history[start:]
+
+    def window(self, ticker: str, period: str = "6mo") -> PriceHistory:
+        """
+        Returns the bars covering a yfinance-style period (e.g. "1mo", "6mo", "5y"),
+        updating the ticker first. The result is a zero-copy slice of the store.
+        """
+        self.update(ticker)
+        return self._slice(self.load(ticker), period)
+
+    def windows(self, tickers, period: str = "6mo") -> list:
+        """Like window() for many tickers, updating them together with update_many()."""
+        tickers = [t.upper() for t in tickers]
+        self.update_many(tickers)
+        return [self._slice(self.load(t), period) for t in tickers]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """Returns the process-wide history store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
+
+
+# Large caps used by benchmark_bulk; record them first to benchmark the replay provider
+BENCHMARK_TICKERS = (
+    "AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "BRK-B", "TSLA", "AVGO", "JPM",
+    "LLY", "V", "UNH", "XOM", "MA", "JNJ", "PG", "HD", "COST", "ABBV",
+    "WMT", "MRK", "NFLX", "CVX", "KO", "BAC", "PEP", "ADBE", "CRM", "TMO",
+    "ORCL", "AMD", "ACN", "MCD", "CSCO", "ABT", "LIN", "DHR", "WFC", "INTU",
+    "TXN", "DIS", "PM", "VZ", "QCOM", "IBM", "AMGN", "CAT", "GE", "NOW",
+)
+
+
+def benchmark_bulk(provider_name: str, sizes=(10, 25, 50)):
+    """
+    Compares serial per-ticker fetches against the bulk path for history backfills
+    and quote refreshes, through a real provider: "yfinance" (network, so the bulk
+    path is one yf.download per batch) or "replay" (recorded fixtures).
+    """
+    import shutil
+    import tempfile
+    from market_data import create_provider, set_provider
+
+    provider = create_provider(provider_name)
+    set_provider(provider)
+    print(f"provider={provider.name}")
+    print(f"{'tickers':>8}{'history serial':>16}{'history bulk':>14}{'quotes serial':>15}{'quotes bulk':>13}")
+    for n in sizes:
+        tickers = list(BENCHMARK_TICKERS[:n])
+        timings = []
+        for bulk in (False, True):
+            root = tempfile.mkdtemp(prefix="history-bench-")
+            try:
+                store = HistoryStore(root)
+                start = time.perf_counter()
+                if bulk:
+                    store.update_many(tickers)
+                else:
+                    for t in tickers:
+                        store.update(t)
+                timings.append(time.perf_counter() - start)
+            finally:
+                shutil.rmtree(root)
+        start = time.perf_counter()
+        for t in tickers:
+            provider.fast_info(t)
+        quotes_serial = time.perf_counter() - start
+        start = time.perf_counter()
+        provider.quotes(tickers)
+        quotes_bulk = time.perf_counter() - start
+        print(f"{n:>8}{timings[0]:>15.2f}s{timings[1]:>13.2f}s{quotes_serial:>14.2f}s{quotes_bulk:>12.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark serial against bulk market data fetches.")
+    parser.add_argument("--provider", choices=("yfinance", "replay"), required=True,
+                        help="yfinance makes live requests; replay reads recorded fixtures")
+    benchmark_bulk(parser.parse_args().provider)
@@ -0,0 +1,154 @@
+import warnings
+import numpy as np
+
+# Technical indicators computed with numpy over a whole watchlist at once.
+# Inputs are 2-D arrays shaped (n_tickers, n_bars), oldest bar first and
+# right-aligned so the last column is every ticker's latest bar; tickers with
+# shorter histories are left-padded with NaN.
+
+TRADING_DAYS = 252
+
+# Columns of the feature table, in display order
+FEATURES = (
+    "last_close", "return_1m_pct", "return_6m_pct",
+    "sma_50", "sma_200", "pct_vs_sma_50", "pct_vs_sma_200",
+    "ema_12", "ema_26", "rsi_14", "realized_vol_20d_pct", "max_drawdown_1y_pct",
+    "pct_from_52w_high", "pct_from_52w_low", "volume_zscore_20d",
+)
+
+
+def stack_histories(histories, n_bars: int = TRADING_DAYS):
+    """
+    Stacks the last n_bars of several PriceHistory objects into 2-D arrays.
+    Returns a dict with "close", "high", "low" and "volume" arrays.
+    """
+    out = {name: np.full((len(histories), n_bars), np.nan) for name in ("close", "high", "low", "volume")}
+    for i, h in enumerate(histories):
+        n = min(len(h), n_bars)
+        if n == 0:
+            continue
+        for name in out:
+            out[name][i, n_bars - n:] = getattr(h, name)[-n:]
+    return out
+
+
+def _sma(x: np.ndarray, window: int) -> np.ndarray:
+    tail = x[:, -window:]
+    mean = np.nanmean(tail, axis=1)
+    # not enough bars for a full window
+    mean[np.sum(~np.isnan(tail), axis=1) < window] = np.nan
+    return mean
+
+
+def _ewm_last(x: np.ndarray, alpha: float) -> np.ndarray:
+    """Latest value of an exponentially weighted mean, as a single weighted sum per row."""
+    weights = (1 - alpha) ** np.arange(x.shape[1] - 1, -1, -1)
+    valid = ~np.isnan(x)
+    return np.nansum(x * weights, axis=1) / np.sum(valid * weights, axis=1)
+
+
+def _pct_change(close: np.ndarray, bars: int) -> np.ndarray:
+    if close.shape[1] <= bars:
+        return np.full(close.shape[0], np.nan)
+    return (close[:, -1] / close[:, -1 - bars] - 1) * 100
+
+
+def compute_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray) -> dict:
+    """
+    Computes every indicator in FEATURES for each row of the input arrays.
+    Returns a dict mapping feature name to a 1-D array with one value per ticker.
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    high = np.atleast_2d(np.asarray(high, dtype=float))
+    low = np.atleast_2d(np.asarray(low, dtype=float))
+    volume = np.atleast_2d(np.asarray(volume, dtype=float))
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        last = close[:, -1]
+        sma_50 = _sma(close, 50)
+        sma_200 = _sma(close, 200)
+
+        diff = np.diff(close, axis=1)
+        gains = np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+        losses = np.where(diff < 0, -diff, np.where(np.isnan(diff), np.nan, 0.0))
+        avg_gain = _ewm_last(gains, 1 / 14)
+        avg_loss = _ewm_last(losses, 1 / 14)
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+
+        log_returns = np.diff(np.log(close), axis=1)[:, -20:]
+        vol_20 = np.nanstd(log_returns, axis=1, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+
+        year_close = close[:, -TRADING_DAYS:]
+        peak = np.fmax.accumulate(year_close, axis=1)
+        max_drawdown = np.nanmin(year_close / peak - 1, axis=1) * 100
+
+        high_52w = np.nanmax(high[:, -TRADING_DAYS:], axis=1)
+        low_52w = np.nanmin(low[:, -TRADING_DAYS:], axis=1)
+
+        prior_volume = volume[:, -21:-1]
+        volume_z = (volume[:, -1] - np.nanmean(prior_volume, axis=1)) / np.nanstd(prior_volume, axis=1, ddof=1)
+
+        return {
+            "last_close": last,
+            "return_1m_pct": _pct_change(close, 21),
+            "return_6m_pct": _pct_change(close, 126),
+            "sma_50": sma_50,
+            "sma_200": sma_200,
+            "pct_vs_sma_50": (last / sma_50 - 1) * 100,
+            "pct_vs_sma_200": (last / sma_200 - 1) * 100,
+            "ema_12": _ewm_last(close, 2 / 13),
+            "ema_26": _ewm_last(close, 2 / 27),
+            "rsi_14": rsi,
+            "realized_vol_20d_pct": vol_20,
+            "max_drawdown_1y_pct": max_drawdown,
+            "pct_from_52w_high": (last / high_52w - 1) * 100,
+            "pct_from_52w_low": (last / low_52w - 1) * 100,
+            "volume_zscore_20d": volume_z,
+        }
+
+
+def trend_label(features: dict, i: int = 0) -> str:
+    """Classifies a ticker's trend from its price and moving averages."""
+    last, sma_50, sma_200 = features["last_close"][i], features["sma_50"][i], features["sma_200"][i]
+    if np.isnan(sma_50):
+        return "unknown"
+    if np.isnan(sma_200):
+        return "up" if last > sma_50 else "down"
+    if last > sma_50 > sma_200:
+        return "up"
+    if last < sma_50 < sma_200:
+        return "down"
+    return "sideways"
+
+
+def features_for_histories(histories, n_bars: int = TRADING_DAYS) -> dict:
+    """Stacks the histories and computes their indicators in one pass."""
+    stacked = stack_histories(histories, n_bars)
+    return compute_indicators(stacked["close"], stacked["high"], stacked["low"], stacked["volume"])
+
+
+def feature_rows(tickers, features: dict) -> list:
+    """Converts a feature dict to one {name: value} dict per ticker, NaN as None, rounded."""
+    rows = []
+    for i, ticker in enumerate(tickers):
+        row = {"ticker": ticker, "trend": trend_label(features, i)}
+        for name in FEATURES:
+            value = float(features[name][i])
+            row[name] = None if np.isnan(value) else round(value, 2)
+        rows.append(row)
+    return rows
+
+
+def format_rows(rows) -> str:
+    """Renders feature rows as a compact pipe-separated table for prompts."""
+    columns = ("ticker", "trend", *FEATURES)
+    lines = ["|".join(columns)]
+    for row in rows:
+        lines.append("|".join("n/a" if row.get(c) is None else str(row[c]) for c in columns))
+    return "\n".join(lines)
+
+
+def format_feature_table(tickers, features: dict) -> str:
+    """Renders the features of several tickers as a compact table for prompts."""
+    return format_rows(feature_rows(tickers, features))
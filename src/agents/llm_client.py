@@ -0,0 +1,377 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import httpx
+from dotenv import load_dotenv
+from langchain_core.exceptions import ModelRateLimitError
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Shared chat models for every agent. get_llm hands out models that share one
+# google-genai client (and so one keep-alive HTTP connection pool), and every
+# call they make passes through a single process-wide LLMGate:
+#   - at most LLM_MAX_CONCURRENCY calls are in flight
+#   - requests and tokens per minute are held to token buckets, so bursts are
+#     queued here instead of being throttled by the provider
+#   - queued calls are admitted by caller priority (the interactive chat before
+#     background work such as market trends fan-out and history summaries)
+#   - 429 and 5xx responses are retried with jittered exponential backoff; a
+#     429 also drains the request bucket so every caller slows down together
+# A call that cannot be admitted within LLM_ACQUIRE_TIMEOUT raises TimeoutError.
+
+load_dotenv()  # take environment variables from .env file
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "120"))
+LLM_REQUEST_TIMEOUT = 60        # seconds per HTTP request
+LLM_MAX_RETRIES = 4             # extra attempts after a 429/5xx
+LLM_RETRY_BASE_DELAY = 1.0      # seconds, doubled per attempt
+LLM_RETRY_MAX_DELAY = 30.0
+LLM_EXPECTED_OUTPUT_TOKENS = 800    # reserved per call on top of the prompt, settled against usage afterwards
+LLM_GATE_POLL = 0.5             # seconds between admission checks of a waiting call
+
+# HTTP connection pool shared by all models
+LLM_POOL_SIZE = 16
+LLM_KEEPALIVE_SECONDS = 60
+
+# Lower is admitted first
+CALLER_PRIORITIES = {
+    "chat": 0,
+    "portfolio": 1,
+    "goal_planning": 1,
+    "market_trends": 2,
+    "summary": 3,
+}
+DEFAULT_PRIORITY = 2
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, server errors and dropped connections."""
+    if isinstance(error, (ModelRateLimitError, httpx.TransportError)):
+        return True
+    # the langchain error wraps the google-genai one, which carries the status
+    for e in (error, error.__cause__):
+        code = getattr(e, "code", None) or getattr(e, "status_code", None)
+        if isinstance(code, int):
+            return code in RETRYABLE_STATUS
+    return False
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    if isinstance(error, ModelRateLimitError):
+        return True
+    return any(getattr(e, "code", None) == 429 for e in (error, error.__cause__))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base * 2**attempt], capped."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+class TokenBucket:
+    """Holds up to capacity units, refilled continuously at rate units per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; requests larger than the bucket wait for a full one."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        # may go negative: usage over the estimate is paid back before later calls are admitted
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self):
+        self.level = min(self.level, 0)
+
+
+class LLMGate:
+    """
+    Admission control for model calls: bounded concurrency, request and token
+    buckets, and a priority queue of waiting calls (FIFO within a priority).
+    Sync and async callers share the same queue.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE):
+        self.max_concurrency = max_concurrency
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._lock = threading.Lock()
+        self._queue = []                    # heap of [priority, seq, granted, notify, tokens]
+        self._seq = itertools.count()
+        self._active = 0
+        self._metrics = {"admitted": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                         "retries": 0, "rate_limited": 0, "timeouts": 0, "tokens_used": 0}
+
+    def _dispatch(self) -> float:
+        """
+        Admits waiting calls from the head of the queue while there is capacity.
+        Returns the seconds until the head call fits the buckets, or 0.
+        """
+        now = time.monotonic()
+        while self._queue and self._active < self.max_concurrency:
+            entry = self._queue[0]
+            tokens = entry[4]
+            delay = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+            if delay > 0:
+                return delay
+            heapq.heappop(self._queue)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._active += 1
+            entry[2] = True
+            entry[3]()
+        return 0.0
+
+    def _enqueue(self, caller: str, tokens: int, notify) -> tuple:
+        entry = [CALLER_PRIORITIES.get(caller, DEFAULT_PRIORITY), next(self._seq), False, notify, tokens]
+        with self._lock:
+            heapq.heappush(self._queue, entry)
+            delay = self._dispatch()
+            if not entry[2]:
+                self._metrics["queued"] += 1
+        return entry, delay
+
+    def _poll(self, entry, start: float, timeout: float, caller: str):
+        """Re-checks a waiting call; returns the next delay, None once admitted."""
+        with self._lock:
+            if entry[2]:
+                return None
+            if time.monotonic() - start > timeout:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._metrics["timeouts"] += 1
+                raise TimeoutError(f"LLM call for {caller} not admitted within {timeout}s")
+            return self._dispatch()
+
+    def _admitted(self, start: float):
+        waited = time.monotonic() - start
+        with self._lock:
+            self._metrics["admitted"] += 1
+            self._metrics["wait_seconds"] += waited
+            self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], waited)
+
+    def acquire(self, caller: str, tokens: int, timeout: float = LLM_ACQUIRE_TIMEOUT):
+        """Blocks until a call reserving tokens may start."""
+        start = time.monotonic()
+        event = threading.Event()
+        entry, delay = self._enqueue(caller, tokens, event.set)
+        while delay is not None:
+            event.wait(delay or LLM_GATE_POLL)
+            delay = self._poll(entry, start, timeout, caller)
+        self._admitted(start)
+
+    async def aacquire(self, caller: str, tokens: int, timeout: float = LLM_ACQUIRE_TIMEOUT):
+        """Async version of acquire; waits without holding a thread."""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        # calls may be admitted from any thread, so the event is set on its own loop
+        entry, delay = self._enqueue(caller, tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while delay is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), delay or LLM_GATE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                delay = self._poll(entry, start, timeout, caller)
+        except asyncio.CancelledError:
+            with self._lock:
+                if entry[2]:
+                    self._active -= 1
+                    self._tokens.take(-tokens)
+                else:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._dispatch()
+            raise
+        self._admitted(start)
+
+    def release(self, reserved: int, used: int = None):
+        """Ends a call; used settles the token reservation against the reported usage."""
+        with self._lock:
+            self._active -= 1
+            if used:
+                self._tokens.take(used - reserved)
+                self._metrics["tokens_used"] += used
+            self._dispatch()
+
+    def retrying(self, error: BaseException):
+        """Records a retried call; a rate limit also drains the request bucket."""
+        with self._lock:
+            self._metrics["retries"] += 1
+            if is_rate_limit(error):
+                self._metrics["rate_limited"] += 1
+                self._requests.drain()
+
+    def stats(self) -> dict:
+        """Returns admission counters plus the calls in flight and waiting."""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["active"] = self._active
+            stats["waiting"] = len(self._queue)
+        stats["avg_wait_seconds"] = stats["wait_seconds"] / stats["admitted"] if stats["admitted"] else 0.0
+        return stats
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+def get_llm_gate() -> LLMGate:
+    """Returns the process-wide gate, creating it on first use."""
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                _gate = LLMGate()
+    return _gate
+
+
+def _usage(message) -> int:
+    return (getattr(message, "usage_metadata", None) or {}).get("total_tokens", 0)
+
+
+class PooledChatModel(ChatGoogleGenerativeAI):
+    """ChatGoogleGenerativeAI whose calls are admitted by the shared LLMGate and retried on 429/5xx."""
+
+    caller: str = "default"
+
+    def _reserve(self, messages) -> int:
+        return count_tokens_approximately(messages) + LLM_EXPECTED_OUTPUT_TOKENS
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        gate = get_llm_gate()
+        reserved = self._reserve(messages)
+        for attempt in itertools.count():
+            gate.acquire(self.caller, reserved)
+            used = 0
+            try:
+                result = super()._generate(messages, stop, run_manager, **kwargs)
+                used = sum(_usage(g.message) for g in result.generations)
+                return result
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                gate.retrying(e)
+            finally:
+                gate.release(reserved, used)
+            delay = backoff_delay(attempt)
+            print(f"LLM call for {self.caller} failed, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        gate = get_llm_gate()
+        reserved = self._reserve(messages)
+        for attempt in itertools.count():
+            await gate.aacquire(self.caller, reserved)
+            used = 0
+            try:
+                result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+                used = sum(_usage(g.message) for g in result.generations)
+                return result
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                gate.retrying(e)
+            finally:
+                gate.release(reserved, used)
+            delay = backoff_delay(attempt)
+            print(f"LLM call for {self.caller} failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        gate = get_llm_gate()
+        reserved = self._reserve(messages)
+        for attempt in itertools.count():
+            gate.acquire(self.caller, reserved)
+            used, started = 0, False
+            try:
+                for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+                    started = True
+                    used += _usage(chunk.message)
+                    yield chunk
+                return
+            except Exception as e:
+                # once tokens have reached the caller the stream cannot be replayed
+                if started or attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                gate.retrying(e)
+            finally:
+                gate.release(reserved, used)
+            delay = backoff_delay(attempt)
+            print(f"LLM stream for {self.caller} failed, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        gate = get_llm_gate()
+        reserved = self._reserve(messages)
+        for attempt in itertools.count():
+            await gate.aacquire(self.caller, reserved)
+            used, started = 0, False
+            try:
+                async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                    started = True
+                    used += _usage(chunk.message)
+                    yield chunk
+                return
+            except Exception as e:
+                if started or attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                gate.retrying(e)
+            finally:
+                gate.release(reserved, used)
+            delay = backoff_delay(attempt)
+            print(f"LLM stream for {self.caller} failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_llm(caller: str = "default", model: str = LLM_MODEL, temperature: float = 0.0) -> PooledChatModel:
+    """
+    Returns the shared chat model for a caller. Models for the same model name
+    and temperature share one client and connection pool; caller sets the
+    priority of their calls (see CALLER_PRIORITIES).
+    """
+    with _models_lock:
+        llm = _models.get((model, temperature, caller))
+        if llm is None:
+            base = _models.get((model, temperature, None))
+            if base is None:
+                base = _models[(model, temperature, None)] = PooledChatModel(
+                    model=model,
+                    temperature=temperature,
+                    timeout=LLM_REQUEST_TIMEOUT,
+                    # retries are handled here; 1 means a single attempt to the SDK
+                    max_retries=1,
+                    client_args={"limits": httpx.Limits(
+                        max_connections=LLM_POOL_SIZE,
+                        max_keepalive_connections=LLM_POOL_SIZE,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+                    )},
+                )
+            # the copy shares the base model's client
+            llm = _models[(model, temperature, caller)] = base.model_copy(update={"caller": caller})
+        return llm
@@ -0,0 +1,444 @@
+import datetime
+import json
+import os
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# All market data used by the agents goes through a MarketDataProvider so the
+# workflow can run against live Yahoo data, recorded fixtures, or a seeded
+# synthetic universe. Pick the backend with MARKET_DATA_PROVIDER.
+
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+MARKET_DATA_FIXTURES = os.getenv(
+    "MARKET_DATA_FIXTURES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures"),
+)
+MARKET_DATA_SEED = int(os.getenv("MARKET_DATA_SEED", "0"))
+
+# First bar of every synthetic series
+SYNTHETIC_START = "1996-01-02"
+
+
+def provider_data_path(path: str) -> str:
+    """
+    Suffixes a local store path with the configured provider's name, so data
+    from replay or synthetic runs never mixes with live yfinance data.
+    """
+    if MARKET_DATA_PROVIDER == "yfinance":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{MARKET_DATA_PROVIDER}{ext}"
+
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_PERIOD_OFFSETS = {
+    "1d": pd.DateOffset(days=1), "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1), "3mo": pd.DateOffset(months=3), "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1), "2y": pd.DateOffset(years=2), "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def slice_history(df: pd.DataFrame, period: str = None, start=None, end=None) -> pd.DataFrame:
+    """
+    Selects rows of a daily history frame the way yfinance's history() arguments do.
+    A period is measured back from the last row; end is exclusive.
+    """
+    if df.empty:
+        return df
+    if start is not None or end is not None:
+        tz = df.index.tz
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start).tz_localize(tz)]
+        if end is not None:
+            df = df[df.index < pd.Timestamp(end).tz_localize(tz)]
+        return df
+    if period in (None, "max") or df.empty:
+        return df
+    if period == "ytd":
+        return df[df.index.year == df.index[-1].year]
+    return df[df.index > df.index[-1] - _PERIOD_OFFSETS[period]]
+
+
+class MarketDataProvider(ABC):
+    """
+    Interface for market data backends. History frames mirror yfinance's shape.
+    Every method must be implemented; backends without bulk requests can return
+    super().bulk_history() or super().quotes(), which loop over single fetches.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def info(self, ticker: str) -> dict:
+        """Returns the Ticker.info-style metadata dict for a ticker."""
+
+    @abstractmethod
+    def fast_info(self, ticker: str) -> dict:
+        """Returns quick quote fields (lastPrice, previousClose, ...) for a ticker."""
+
+    @abstractmethod
+    def history(self, ticker: str, period: str = None, start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        """Returns daily bars indexed by a tz-aware DatetimeIndex with PRICE_COLUMNS."""
+
+    @abstractmethod
+    def news(self, ticker: str) -> list:
+        """Returns recent news articles in yfinance's {"content": {...}} format."""
+
+    @abstractmethod
+    def bulk_history(self, tickers, period: str = None, start=None, end=None) -> dict:
+        """
+        Returns {ticker: daily bars} for many tickers in as few upstream requests as
+        the backend allows. Tickers that failed or returned no bars are left out.
+        """
+        out = {}
+        for ticker in tickers:
+            try:
+                df = self.history(ticker, period=period, start=start, end=end)
+            except Exception as e:
+                print(f"History fetch failed for {ticker}: {e}")
+                continue
+            if not df.empty:
+                out[ticker] = df
+        return out
+
+    @abstractmethod
+    def quotes(self, tickers) -> dict:
+        """
+        Returns {ticker: {"lastPrice": ..., "previousClose": ...}} for many tickers.
+        Tickers that failed are left out.
+        """
+        out = {}
+        for ticker in tickers:
+            try:
+                fast = self.fast_info(ticker)
+            except Exception as e:
+                print(f"Quote fetch failed for {ticker}: {e}")
+                continue
+            out[ticker] = {"lastPrice": fast.get("lastPrice"), "previousClose": fast.get("previousClose")}
+        return out
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live Yahoo Finance data through yfinance."""
+
+    name = "yfinance"
+
+    def info(self, ticker: str) -> dict:
+        return yf.Ticker(ticker).info
+
+    def fast_info(self, ticker: str) -> dict:
+        fast = getattr(yf.Ticker(ticker), "fast_info", None)
+        return dict(fast) if fast is not None else {}
+
+    def history(self, ticker: str, period: str = None, start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        t = yf.Ticker(ticker)
+        if start is not None or end is not None:
+            return t.history(start=start, end=end, interval=interval)
+        return t.history(period=period or "1mo", interval=interval)
+
+    def news(self, ticker: str) -> list:
+        return yf.Ticker(ticker).news
+
+    @staticmethod
+    def _download(tickers, **kwargs) -> dict:
+        """One yf.download call for many tickers, split into a frame per ticker."""
+        df = yf.download(
+            list(tickers), group_by="ticker", auto_adjust=True, actions=False,
+            threads=True, progress=False, **kwargs,
+        )
+        out = {}
+        if df is None or df.empty or not isinstance(df.columns, pd.MultiIndex):
+            return out
+        present = set(df.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in present:
+                continue
+            bars = df[ticker].reindex(columns=PRICE_COLUMNS).dropna(subset=["Close"])
+            if bars.empty:
+                continue
+            # download() drops the exchange timezone for daily bars
+            if bars.index.tz is None:
+                bars.index = bars.index.tz_localize("UTC")
+            bars.index = bars.index.rename("Date")
+            out[ticker] = bars
+        return out
+
+    def bulk_history(self, tickers, period: str = None, start=None, end=None) -> dict:
+        tickers = [t.upper() for t in tickers]
+        if start is not None or end is not None:
+            return self._download(tickers, start=start, end=end, interval="1d")
+        return self._download(tickers, period=period or "1mo", interval="1d")
+
+    def quotes(self, tickers) -> dict:
+        # the last two daily bars give the latest price (today's bar while the
+        # market is open) and the previous close for every ticker in one request
+        out = {}
+        for ticker, bars in self._download([t.upper() for t in tickers], period="5d", interval="1d").items():
+            close = bars["Close"]
+            out[ticker] = {
+                "lastPrice": float(close.iloc[-1]),
+                "previousClose": float(close.iloc[-2]) if len(close) > 1 else None,
+            }
+        return out
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves captured fixtures from disk. In record mode every call is forwarded
+    to an upstream provider and its result is merged into the fixtures first.
+
+    Layout: <root>/<TICKER>/{info.json, fast_info.json, news.json, history.csv}.
+    History is stored once per ticker and sliced per request, so replayed
+    periods are measured back from the last recorded bar.
+    """
+
+    name = "replay"
+
+    def __init__(self, root: str = MARKET_DATA_FIXTURES, record: bool = False, upstream: MarketDataProvider = None):
+        self.root = root
+        self.record = record
+        self.upstream = upstream or YFinanceProvider()
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str, name: str) -> str:
+        return os.path.join(self.root, ticker.upper(), name)
+
+    def _load_json(self, ticker: str, name: str, fetch):
+        path = self._path(ticker, f"{name}.json")
+        if self.record:
+            value = fetch()
+            with self._lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(value, f, default=str)
+            return value
+        if not os.path.exists(path):
+            raise KeyError(f"No {name} fixture recorded for {ticker}")
+        with open(path) as f:
+            return json.load(f)
+
+    def _load_history(self, ticker: str) -> pd.DataFrame:
+        path = self._path(ticker, "history.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], tz="UTC"))
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True).rename("Date")
+        return df
+
+    def info(self, ticker: str) -> dict:
+        return self._load_json(ticker, "info", lambda: self.upstream.info(ticker))
+
+    def fast_info(self, ticker: str) -> dict:
+        return self._load_json(ticker, "fast_info", lambda: self.upstream.fast_info(ticker))
+
+    def news(self, ticker: str) -> list:
+        return self._load_json(ticker, "news", lambda: self.upstream.news(ticker))
+
+    def _record_history(self, ticker: str, fresh: pd.DataFrame):
+        with self._lock:
+            recorded = self._load_history(ticker)
+            merged = fresh[PRICE_COLUMNS].tz_convert("UTC")
+            if not recorded.empty:
+                merged = pd.concat([recorded, merged])
+                merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            os.makedirs(os.path.dirname(self._path(ticker, "history.csv")), exist_ok=True)
+            merged.to_csv(self._path(ticker, "history.csv"))
+
+    def history(self, ticker: str, period: str = None, start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        if self.record:
+            fresh = self.upstream.history(ticker, period=period, start=start, end=end, interval=interval)
+            if not fresh.empty:
+                self._record_history(ticker, fresh)
+            return fresh
+        return slice_history(self._load_history(ticker), period, start, end)
+
+    def bulk_history(self, tickers, period: str = None, start=None, end=None) -> dict:
+        if not self.record:
+            return super().bulk_history(tickers, period, start, end)
+        frames = self.upstream.bulk_history(tickers, period=period, start=start, end=end)
+        for ticker, fresh in frames.items():
+            self._record_history(ticker, fresh)
+        return frames
+
+    def quotes(self, tickers) -> dict:
+        # fixtures hold one fast_info per ticker, recorded through fast_info()
+        return super().quotes(tickers)
+
+
+SECTORS = [
+    ("Technology", "Software—Infrastructure"), ("Technology", "Semiconductors"),
+    ("Healthcare", "Drug Manufacturers—General"), ("Financial Services", "Banks—Diversified"),
+    ("Consumer Cyclical", "Internet Retail"), ("Energy", "Oil & Gas Integrated"),
+    ("Industrials", "Aerospace & Defense"), ("Utilities", "Utilities—Regulated Electric"),
+]
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Seeded generator of arbitrary universes for scale tests. Every ticker gets
+    stable metadata and a geometric random walk of daily bars derived from
+    (seed, ticker), so runs are reproducible without network access. Bars run
+    from SYNTHETIC_START to yesterday and each day only appends a bar, like a
+    real upstream between adjustments.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed: int = MARKET_DATA_SEED, latency: float = 0.0, transfer: float = 0.0):
+        self.seed = seed
+        # simulated upstream round trip per request, and extra time per ticker
+        # carried in a bulk response, for benchmarking fetch paths
+        self.latency = latency
+        self.transfer = transfer
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def universe(n: int) -> list:
+        """Returns n synthetic ticker symbols."""
+        return [f"SYN{i:05d}" for i in range(n)]
+
+    def _rng(self, ticker: str, stream: int = 0) -> np.random.Generator:
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.upper().encode()), stream])
+
+    def _sleep(self, tickers: int = 0):
+        delay = self.latency + self.transfer * tickers
+        if delay:
+            time.sleep(delay)
+
+    def _bars(self, ticker: str) -> pd.DataFrame:
+        ticker = ticker.upper()
+        with self._lock:
+            if ticker in self._cache:
+                return self._cache[ticker]
+        rng = self._rng(ticker)
+        today = pd.Timestamp.now(tz="America/New_York").normalize().tz_localize(None)
+        index = pd.bdate_range(start=SYNTHETIC_START, end=today - pd.Timedelta(days=1), tz="America/New_York", name="Date")
+        n = len(index)
+        # one generator per column, so a longer series keeps every earlier bar
+        volatility, first_close = rng.uniform(0.01, 0.03), rng.uniform(10, 500)
+        returns = self._rng(ticker, 1).normal(0.0003, volatility, n)
+        close = first_close * np.exp(np.cumsum(returns))
+        spread = np.abs(self._rng(ticker, 2).normal(0, 0.01, n)) * close
+        open_ = close * (1 + self._rng(ticker, 3).normal(0, 0.005, n))
+        df = pd.DataFrame({
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Volume": self._rng(ticker, 4).lognormal(14, 0.5, n).round(),
+        }, index=index)
+        with self._lock:
+            self._cache[ticker] = df
+        return df
+
+    def info(self, ticker: str) -> dict:
+        self._sleep()
+        ticker = ticker.upper()
+        rng = self._rng(ticker)
+        sector, industry = SECTORS[rng.integers(len(SECTORS))]
+        bars = self._bars(ticker)
+        close = bars["Close"].to_numpy()
+        year = close[-252:]
+        return {
+            "symbol": ticker,
+            "longName": f"{ticker.title()} Holdings Inc.",
+            "shortName": f"{ticker.title()} Holdings",
+            "displayName": ticker.title(),
+            "quoteType": "EQUITY",
+            "sector": sector,
+            "industry": industry,
+            "currency": "USD",
+            "currentPrice": float(close[-1]),
+            "previousClose": float(close[-2]),
+            "fiftyTwoWeekHigh": float(year.max()),
+            "fiftyTwoWeekLow": float(year.min()),
+            "52WeekChange": float(year[-1] / year[0] - 1),
+            "marketCap": float(close[-1] * rng.uniform(1e7, 1e10)),
+            "trailingPE": float(rng.uniform(5, 60)),
+            "forwardPE": float(rng.uniform(5, 50)),
+            "beta": float(rng.uniform(0.4, 2.0)),
+            "dividendYield": float(rng.choice([0, rng.uniform(0.2, 4)])),
+            "averageVolume": float(bars["Volume"].iloc[-63:].mean()),
+        }
+
+    def fast_info(self, ticker: str) -> dict:
+        self._sleep()
+        close = self._bars(ticker)["Close"]
+        return {"lastPrice": float(close.iloc[-1]), "previousClose": float(close.iloc[-2]), "currency": "USD"}
+
+    def history(self, ticker: str, period: str = None, start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        self._sleep()
+        return slice_history(self._bars(ticker), period or "1mo", start, end)
+
+    def bulk_history(self, tickers, period: str = None, start=None, end=None) -> dict:
+        tickers = [t.upper() for t in tickers]
+        self._sleep(len(tickers))
+        return {t: slice_history(self._bars(t), period or "1mo", start, end) for t in tickers}
+
+    def quotes(self, tickers) -> dict:
+        tickers = [t.upper() for t in tickers]
+        self._sleep(len(tickers))
+        out = {}
+        for ticker in tickers:
+            close = self._bars(ticker)["Close"]
+            out[ticker] = {"lastPrice": float(close.iloc[-1]), "previousClose": float(close.iloc[-2])}
+        return out
+
+    def news(self, ticker: str) -> list:
+        self._sleep()
+        ticker = ticker.upper()
+        rng = self._rng(ticker)
+        name = ticker.title()
+        now = time.time()
+        articles = []
+        for i in range(int(rng.integers(3, 10))):
+            published = datetime.datetime.fromtimestamp(now - i * 3600 * rng.uniform(1, 12), datetime.timezone.utc)
+            articles.append({
+                "id": f"{ticker}-{i}",
+                "content": {
+                    "id": f"{ticker}-{i}",
+                    "title": f"{name} {rng.choice(['rises', 'falls', 'reports earnings', 'announces buyback'])} ({i})",
+                    "pubDate": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "canonicalUrl": {"url": f"https://example.com/news/{ticker.lower()}/{i}"},
+                },
+            })
+        return articles
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def create_provider(name: str = MARKET_DATA_PROVIDER) -> MarketDataProvider:
+    """Creates a provider by name: "yfinance", "replay", "record" or "synthetic"."""
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "replay":
+        return ReplayProvider()
+    if name == "record":
+        return ReplayProvider(record=True)
+    if name == "synthetic":
+        return SyntheticProvider()
+    raise ValueError(f"Unknown market data provider: {name}")
+
+def get_provider() -> MarketDataProvider:
+    """Returns the process-wide provider selected by MARKET_DATA_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+def set_provider(provider: MarketDataProvider):
+    """Replaces the process-wide provider, e.g. with a synthetic one for load tests."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -1,5 +1,5 @@
 from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_router import get_model
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 from typing import Any, Dict
@@ -60,11 +60,12 @@ For each ticker you analyze, produce a report organized in these markdown sectio
 - Do not invent sector averages; if sector/peer data is not provided, say so and keep comparison qualitative.
 
 ## Momentum & Price Action
-- Use recent price history (e.g., 1–6 months from history data) to describe short- and medium-term trends:
-  - Uptrend, downtrend, or sideways.
+- The snapshot includes a precomputed `technical_indicators` table (trend, 1m/6m returns, 50/200-day SMA, EMA 12/26, RSI 14, 20-day realized volatility, 1-year max drawdown, distance from the 52-week high/low, 20-day volume z-score). Use these values; do not recompute them.
+- Describe short- and medium-term trends from the table:
+  - Uptrend, downtrend, or sideways (the `trend` column).
   - Note if current price is near 52-week high/low.
-- When moving averages are provided or can be derived (e.g., 50-day, 200-day), mention whether the price is above/below them.
-- Comment on volume patterns if abnormal (e.g., volume >> averageVolume).
+- Mention whether the price is above/below its 50-day and 200-day moving averages.
+- Comment on volume patterns if abnormal (e.g., |volume_zscore_20d| > 2).
 
 ## Fundamentals & Financial Health
 - Use financials, earnings, and margins fields (when available) to discuss:
@@ -103,7 +104,7 @@ Behavioral Rules
 """
 
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0)
+llm = get_model("market_trends")
 
 
 llm_with_tools = llm.bind_tools([yf_snapshot])
@@ -128,9 +129,34 @@ prompt = ChatPromptTemplate.from_messages(
 
 agent = prompt | llm_with_tools
 
+# Prefetch mode: the node already knows the only tool input (the ticker), so it
+# fetches the snapshot itself and the model answers in a single call, without
+# the round trip that only asks for the tool call.
+prefetch_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system_prompt),
+        (
+            "user",
+            """
+            Here is the ticker the user is interested in: {ticker}
+
+            The yf_snapshot data for this ticker has already been fetched and is below; do not call any tools.
+            Analyze the data and produce structured market insights as per the specified sections.
+
+            {snapshot}
+            """,
+        ),
+    ]
+)
+
+prefetch_agent = prefetch_prompt | llm
+
 def get_market_trends_agent():
     return agent
 
+def get_market_trends_prefetch_agent():
+    return prefetch_agent
+
 def get_market_trends_for_ticker(ticker: str) -> str:
     """
     ticker: stock ticker symbol, e.g. "AAPL"
@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from collections import deque
+from langchain_core.messages import HumanMessage, convert_to_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.prompt_values import PromptValue
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config, merge_configs
+from llm_client import get_llm
+
+# Tiered model routing. Agents get their model from get_model(task); each call
+# is sent either to a small local model (Ollama, or any OpenAI-compatible local
+# server) or to the hosted model from llm_client:
+#   - only tasks in the local tier (chat questions, history summaries) may run
+#     locally; structured outputs (PortfolioInsights, GoalPlanResult) and the
+#     market trends analysis always use the hosted model
+#   - prompts over LOCAL_MAX_PROMPT_TOKENS go to the hosted model
+#   - the local tier goes hosted while its recent p95 latency is over the task's
+#     latency budget, while all LOCAL_LLM_MAX_CONCURRENCY slots are busy, and
+#     for LOCAL_RETRY_AFTER seconds after a local call fails
+#   - a failed local call is retried on the hosted model, unless it already
+#     streamed tokens
+# Latency is recorded per tier; see ModelRouter.stats.
+#
+# LOCAL_LLM_BACKEND picks the local tier: "ollama", "openai" (an OpenAI-compatible
+# server at LOCAL_LLM_BASE_URL) or "none" (the default) to send everything to
+# the hosted model.
+
+LOCAL_LLM_BACKEND = os.getenv("LOCAL_LLM_BACKEND", "none")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3.2:3b")
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "")
+LOCAL_LLM_MAX_CONCURRENCY = int(os.getenv("LOCAL_LLM_MAX_CONCURRENCY", "1"))
+LOCAL_LLM_TIMEOUT = 30          # seconds per local request
+LOCAL_LLM_CONTEXT = 8192        # context window requested from Ollama
+LOCAL_MAX_PROMPT_TOKENS = 6000
+LOCAL_RETRY_AFTER = 60          # seconds the local tier is skipped after a failure
+
+LOCAL = "local"
+HOSTED = "hosted"
+
+# Tier each task may use; tasks not listed are hosted
+TASK_TIERS = {
+    "chat": LOCAL,
+    "summary": LOCAL,
+    "market_trends": HOSTED,
+    "portfolio": HOSTED,
+    "goal_planning": HOSTED,
+}
+
+# Seconds a task's local call may take (p95) before the task is sent to the hosted model
+LATENCY_BUDGETS = {
+    "chat": 10.0,
+    "summary": 20.0,
+}
+
+LATENCY_WINDOW = 300            # seconds of latency samples kept per tier
+LATENCY_MIN_SAMPLES = 5         # samples needed before the latency budget is applied
+
+
+def create_local_model(temperature: float = 0.0):
+    """Creates the LOCAL_LLM_BACKEND chat model, or returns None when the local tier is disabled."""
+    if LOCAL_LLM_BACKEND == "ollama":
+        try:
+            from langchain_ollama import ChatOllama
+        except ImportError as e:
+            raise ImportError("LOCAL_LLM_BACKEND=ollama requires the langchain-ollama package") from e
+        return ChatOllama(
+            model=LOCAL_LLM_MODEL,
+            base_url=LOCAL_LLM_BASE_URL or None,
+            temperature=temperature,
+            num_ctx=LOCAL_LLM_CONTEXT,
+            client_kwargs={"timeout": LOCAL_LLM_TIMEOUT},
+        )
+    if LOCAL_LLM_BACKEND == "openai":
+        try:
+            from langchain_openai import ChatOpenAI
+        except ImportError as e:
+            raise ImportError("LOCAL_LLM_BACKEND=openai requires the langchain-openai package") from e
+        return ChatOpenAI(
+            model=LOCAL_LLM_MODEL,
+            base_url=LOCAL_LLM_BASE_URL or "http://localhost:8000/v1",
+            # local servers usually ignore the key, but the client requires one
+            api_key=os.getenv("LOCAL_LLM_API_KEY", "local"),
+            temperature=temperature,
+            timeout=LOCAL_LLM_TIMEOUT,
+            max_retries=0,
+        )
+    return None
+
+
+def prompt_tokens(input) -> int:
+    """Approximate prompt tokens of a chat model input (prompt value, messages or text)."""
+    if isinstance(input, PromptValue):
+        messages = input.to_messages()
+    elif isinstance(input, str):
+        messages = [HumanMessage(content=input)]
+    else:
+        messages = convert_to_messages(input)
+    return count_tokens_approximately(messages)
+
+
+def _percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class ModelRouter:
+    """Chooses the tier for each call, guards the local tier and records latency per tier."""
+
+    def __init__(self, max_local_concurrency: int = LOCAL_LLM_MAX_CONCURRENCY):
+        self._local_slots = threading.BoundedSemaphore(max_local_concurrency)
+        self._local_models = {}
+        self._local_down_until = 0.0
+        self._lock = threading.Lock()
+        self._latencies = {LOCAL: deque(), HOSTED: deque()}     # (finished at, seconds)
+        self._routes = {}                                       # (task, tier or fallback reason) -> count
+
+    def local_model(self, temperature: float = 0.0):
+        """The shared local model for a temperature, or None when the local tier is disabled."""
+        with self._lock:
+            if temperature not in self._local_models:
+                self._local_models[temperature] = create_local_model(temperature)
+            return self._local_models[temperature]
+
+    def _count(self, task: str, outcome: str):
+        with self._lock:
+            self._routes[(task, outcome)] = self._routes.get((task, outcome), 0) + 1
+
+    def _recent(self, tier: str, now: float) -> list:
+        samples = self._latencies[tier]
+        while samples and samples[0][0] < now - LATENCY_WINDOW:
+            samples.popleft()
+        return [seconds for _, seconds in samples]
+
+    def _record(self, tier: str, seconds: float):
+        with self._lock:
+            self._latencies[tier].append((time.time(), seconds))
+
+    def choose(self, task: str, input, has_local: bool) -> str:
+        """
+        Returns the tier for a call. A LOCAL result holds a local slot, which the
+        caller must give back with release_local.
+        """
+        if not has_local or TASK_TIERS.get(task) != LOCAL:
+            return HOSTED
+        reason = None
+        now = time.time()
+        with self._lock:
+            recent = self._recent(LOCAL, now)
+            if now < self._local_down_until:
+                reason = "local_down"
+            elif len(recent) >= LATENCY_MIN_SAMPLES and _percentile(recent, 0.95) > LATENCY_BUDGETS.get(task, float("inf")):
+                reason = "over_latency_budget"
+        if reason is None and prompt_tokens(input) > LOCAL_MAX_PROMPT_TOKENS:
+            reason = "prompt_too_large"
+        if reason is None and not self._local_slots.acquire(blocking=False):
+            reason = "local_busy"
+        if reason is not None:
+            self._count(task, reason)
+            return HOSTED
+        return LOCAL
+
+    def release_local(self):
+        self._local_slots.release()
+
+    def local_failed(self, task: str, error: Exception):
+        print(f"Local model failed for {task}: {error}")
+        self._count(task, "local_error")
+        with self._lock:
+            self._local_down_until = time.time() + LOCAL_RETRY_AFTER
+
+    def run(self, task: str, tier: str, call):
+        """Runs call, recording its latency for the tier."""
+        start = time.perf_counter()
+        result = call()
+        self._record(tier, time.perf_counter() - start)
+        self._count(task, tier)
+        return result
+
+    async def arun(self, task: str, tier: str, call):
+        start = time.perf_counter()
+        result = await call()
+        self._record(tier, time.perf_counter() - start)
+        self._count(task, tier)
+        return result
+
+    def stats(self) -> dict:
+        """Returns call counts and p50/p95 latency per tier over the window, and routing counts per task."""
+        now = time.time()
+        with self._lock:
+            tiers = {}
+            for tier in (LOCAL, HOSTED):
+                recent = self._recent(tier, now)
+                tiers[tier] = {
+                    "calls": len(recent),
+                    "p50_seconds": _percentile(recent, 0.5) if recent else None,
+                    "p95_seconds": _percentile(recent, 0.95) if recent else None,
+                }
+            routes = {}
+            for (task, outcome), count in self._routes.items():
+                routes.setdefault(task, {})[outcome] = count
+        return {"tiers": tiers, "routes": routes}
+
+
+class _OutputWatcher(BaseCallbackHandler):
+    """
+    Notes whether a local call streamed any tokens. Tokens already streamed into
+    the graph's "messages" stream cannot be taken back, so such a call is not
+    retried on the hosted model.
+    """
+
+    def __init__(self):
+        self.emitted = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.emitted = True
+
+    def attach(self, config):
+        return merge_configs(ensure_config(config), {"callbacks": [self]})
+
+
+class TieredModel(Runnable):
+    """
+    A chat model for one task that routes each call through the ModelRouter.
+    bind_tools applies to both tiers; with_structured_output keeps the result
+    on the hosted model.
+    """
+
+    def __init__(self, router: ModelRouter, task: str, hosted, local=None):
+        self.router = router
+        self.task = task
+        self.hosted = hosted
+        self.local = local
+
+    def bind_tools(self, tools, **kwargs) -> "TieredModel":
+        local = self.local.bind_tools(tools, **kwargs) if self.local is not None else None
+        return TieredModel(self.router, self.task, self.hosted.bind_tools(tools, **kwargs), local)
+
+    def with_structured_output(self, schema, **kwargs) -> "TieredModel":
+        return TieredModel(self.router, self.task, self.hosted.with_structured_output(schema, **kwargs))
+
+    def invoke(self, input, config=None, **kwargs):
+        if self.router.choose(self.task, input, self.local is not None) == LOCAL:
+            watcher = _OutputWatcher()
+            try:
+                return self.router.run(self.task, LOCAL, lambda: self.local.invoke(input, watcher.attach(config), **kwargs))
+            except Exception as e:
+                self.router.local_failed(self.task, e)
+                if watcher.emitted:
+                    raise
+            finally:
+                self.router.release_local()
+        return self.router.run(self.task, HOSTED, lambda: self.hosted.invoke(input, config, **kwargs))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if self.router.choose(self.task, input, self.local is not None) == LOCAL:
+            watcher = _OutputWatcher()
+            try:
+                return await self.router.arun(self.task, LOCAL, lambda: self.local.ainvoke(input, watcher.attach(config), **kwargs))
+            except Exception as e:
+                self.router.local_failed(self.task, e)
+                if watcher.emitted:
+                    raise
+            finally:
+                self.router.release_local()
+        return await self.router.arun(self.task, HOSTED, lambda: self.hosted.ainvoke(input, config, **kwargs))
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide model router, creating it on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def get_model(task: str, temperature: float = 0.0) -> TieredModel:
+    """
+    Returns the routed chat model for a task. The hosted tier is the shared
+    llm_client model for the task; tasks in the local tier also get the local model.
+    """
+    router = get_model_router()
+    local = router.local_model(temperature) if TASK_TIERS.get(task) == LOCAL else None
+    return TieredModel(router, task, get_llm(task, temperature=temperature), local)
@@ -0,0 +1,261 @@
+import datetime
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from market_data import get_provider
+from single_flight import SingleFlight
+
+# News for tickers and watchlists. Each ticker's feed is cached in process and
+# refetched at most every NEWS_REFRESH_INTERVAL seconds, merging in the articles
+# whose URL it does not hold yet and keeping the newest NEWS_MAX_ARTICLES.
+# Articles are keyed by canonical URL, so a story syndicated to several
+# tickers' feeds is kept once.
+
+NEWS_REFRESH_INTERVAL = int(os.getenv("NEWS_REFRESH_INTERVAL", "600"))
+NEWS_MAX_ARTICLES = 50              # kept per ticker, newest first
+NEWS_MAX_AGE = 14 * 24 * 3600       # older articles are dropped from the cache
+NEWS_MAX_WORKERS = 8                # concurrent feed fetches for a watchlist
+
+# Trailing corporate designators removed from company names to form aliases,
+# so "Apple Inc." also matches headlines that just say "Apple"
+_NAME_SUFFIX = re.compile(
+    r"[,.]?\s+(inc|incorporated|corp|corporation|co|company|ltd|limited|plc|holdings|group|"
+    r"sa|ag|nv|se|lp|llc|class [a-c])\.?$",
+    re.IGNORECASE,
+)
+_MIN_ALIAS_LENGTH = 3
+
+
+def _published(content: dict) -> float:
+    """Publish time of an article as epoch seconds, 0 when unknown."""
+    pub_date = content.get("pubDate") or content.get("displayTime")
+    if pub_date:
+        try:
+            return datetime.datetime.fromisoformat(pub_date.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return float(content.get("providerPublishTime") or 0)
+
+
+def normalize_article(article: dict):
+    """
+    Reduces a yfinance news item to {"title", "url", "published", "publisher"}.
+    Returns None for items without a title or URL.
+    """
+    content = article.get("content", article)
+    url = content.get("canonicalUrl") or content.get("clickThroughUrl") or content.get("link")
+    if isinstance(url, dict):
+        url = url.get("url")
+    title = content.get("title")
+    if not url or not title:
+        return None
+    provider = content.get("provider")
+    return {
+        "title": title,
+        "url": url,
+        "published": _published(content),
+        "publisher": provider.get("displayName") if isinstance(provider, dict) else content.get("publisher"),
+    }
+
+
+class NewsCache:
+    """Per-ticker news feeds, deduplicated by canonical URL and fetched incrementally."""
+
+    def __init__(self, refresh_interval: int = NEWS_REFRESH_INTERVAL, max_articles: int = NEWS_MAX_ARTICLES,
+                 max_age: int = NEWS_MAX_AGE):
+        self.refresh_interval = refresh_interval
+        self.max_articles = max_articles
+        self.max_age = max_age
+        # ticker -> {"articles": {url: article}, "fetched_at": time}
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.fetches = 0
+        self.added = 0
+        self.duplicates = 0
+
+    def _refresh(self, ticker: str):
+        items = get_provider().news(ticker)
+        now = time.time()
+        with self._lock:
+            self.fetches += 1
+            feed = self._feeds.setdefault(ticker, {"articles": {}, "fetched_at": 0.0})
+            articles = feed["articles"]
+            for item in items or []:
+                article = normalize_article(item)
+                if article is None:
+                    continue
+                # the feed mostly repeats what we already hold; articles indexed
+                # late can still be older than ones we have, so only the URL counts
+                if article["url"] in articles:
+                    self.duplicates += 1
+                    continue
+                articles[article["url"]] = article
+                self.added += 1
+            kept = sorted(
+                (a for a in articles.values() if not a["published"] or now - a["published"] < self.max_age),
+                key=lambda a: a["published"], reverse=True,
+            )[:self.max_articles]
+            feed["articles"] = {a["url"]: a for a in kept}
+            feed["fetched_at"] = now
+
+    def get(self, ticker: str) -> list:
+        """Returns a ticker's cached articles, newest first, refreshing the feed when due."""
+        ticker = ticker.upper()
+        with self._lock:
+            feed = self._feeds.get(ticker)
+            due = feed is None or time.time() - feed["fetched_at"] >= self.refresh_interval
+        if due:
+            try:
+                self._flight.do(ticker, lambda: self._refresh(ticker))
+            except Exception as e:
+                if feed is None:
+                    raise
+                # serve the stale feed rather than nothing
+                print(f"News refresh failed for {ticker}: {e}")
+        with self._lock:
+            articles = self._feeds[ticker]["articles"].values()
+            return sorted(articles, key=lambda a: a["published"], reverse=True)
+
+    def articles_for(self, tickers, max_workers: int = NEWS_MAX_WORKERS) -> list:
+        """
+        Returns the articles from several tickers' feeds, deduplicated by URL and newest
+        first. Feeds are refreshed concurrently; a feed that fails is skipped.
+        """
+        tickers = [t.upper() for t in dict.fromkeys(tickers) if t]
+        if not tickers:
+            return []
+
+        def load(ticker):
+            try:
+                return self.get(ticker)
+            except Exception as e:
+                print(f"News fetch failed for {ticker}: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers))), thread_name_prefix="news") as pool:
+            feeds = list(pool.map(load, tickers))
+        merged = {}
+        for feed in feeds:
+            for article in feed:
+                merged.setdefault(article["url"], article)
+        return sorted(merged.values(), key=lambda a: a["published"], reverse=True)
+
+    def stats(self) -> dict:
+        """Returns fetch and dedupe counters plus the number of cached feeds."""
+        with self._lock:
+            return {"fetches": self.fetches, "added": self.added, "duplicates": self.duplicates, "feeds": len(self._feeds)}
+
+
+def aliases_for(ticker: str, info: dict) -> list:
+    """Company names a headline may use for a ticker, from its info dict."""
+    aliases = []
+    for key in ("longName", "shortName", "displayName"):
+        name = (info or {}).get(key)
+        while name:
+            name = name.strip()
+            if name not in aliases:
+                aliases.append(name)
+            stripped = _NAME_SUFFIX.sub("", name)
+            if stripped == name:
+                break
+            name = stripped
+    return aliases
+
+
+class NewsMatcher:
+    """
+    Finds which of many tickers a headline mentions with one precompiled regex.
+
+    Company names match case-insensitively on word boundaries. Ticker symbols
+    must appear in upper case, and symbols shorter than three letters only as
+    cashtags ("$A"), so they do not match ordinary words like "IT" or "A".
+    """
+
+    def __init__(self, aliases: dict):
+        """
+        Args:
+            aliases: Mapping of ticker symbol to the company names to match for it.
+        """
+        self._symbols = {}
+        self._names = {}
+        for ticker, names in aliases.items():
+            ticker = ticker.upper()
+            self._symbols.setdefault(ticker, set()).add(ticker)
+            for name in names:
+                name = name.strip().lower()
+                if len(name) >= _MIN_ALIAS_LENGTH:
+                    self._names.setdefault(name, set()).add(ticker)
+
+        alternatives = []
+        # longest first, so "Apple Inc" wins over "Apple" at the same position
+        if self._names:
+            names = sorted(self._names, key=len, reverse=True)
+            alternatives.append("(?i:" + "|".join(re.escape(n) for n in names) + ")")
+        if self._symbols:
+            symbols = sorted(self._symbols, key=len, reverse=True)
+            alternatives.append("|".join(
+                re.escape(s) if len(s) >= _MIN_ALIAS_LENGTH else r"\$" + re.escape(s) for s in symbols
+            ))
+        self._pattern = re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)") if alternatives else None
+
+    def match(self, text: str) -> set:
+        """Returns the tickers mentioned in text."""
+        found = set()
+        if not text or self._pattern is None:
+            return found
+        for m in self._pattern.finditer(text):
+            hit = m.group().lstrip("$")
+            found |= self._symbols.get(hit, set())
+            found |= self._names.get(hit.lower(), set())
+        return found
+
+
+@lru_cache(maxsize=64)
+def _compiled_matcher(aliases: tuple) -> NewsMatcher:
+    return NewsMatcher(dict(aliases))
+
+
+def get_matcher(aliases: dict) -> NewsMatcher:
+    """Returns a NewsMatcher for the aliases, reusing one compiled for the same watchlist."""
+    return _compiled_matcher(tuple(sorted((t.upper(), tuple(names)) for t, names in aliases.items())))
+
+
+def match_news(tickers, infos: dict = None, cache: NewsCache = None, limit: int = 10) -> dict:
+    """
+    Collects news for a watchlist and assigns each article to every ticker its
+    headline mentions, in a single pass over the combined articles.
+    Args:
+        tickers: Ticker symbols to collect and match news for.
+        infos: Mapping of ticker to info dict supplying company names; tickers without
+            one are matched on their symbol only.
+        cache: NewsCache to read feeds from, defaults to the process-wide one.
+        limit: Maximum articles returned per ticker.
+    Returns a dict mapping each ticker to its matching articles, newest first.
+    """
+    cache = cache or get_news_cache()
+    tickers = [t.upper() for t in dict.fromkeys(tickers) if t]
+    infos = {t.upper(): info for t, info in (infos or {}).items()}
+    matcher = get_matcher({t: aliases_for(t, infos.get(t)) for t in tickers})
+    matched = {t: [] for t in tickers}
+    for article in cache.articles_for(tickers):
+        for ticker in matcher.match(article["title"]):
+            if len(matched[ticker]) < limit:
+                matched[ticker].append(article)
+    return matched
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_news_cache() -> NewsCache:
+    """Returns the process-wide news cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NewsCache()
+    return _cache
@@ -1,4 +1,4 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from model_router import get_model
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 from typing import Any, Dict
@@ -9,7 +9,7 @@ from prompts import portfolio_prompt
 
 load_dotenv()  # take environment variables from .env file
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0)
+llm = get_model("portfolio")
 
 llm_with_tools = llm.bind_tools([enhance_portfolio_data])
 structured_llm = llm_with_tools.with_structured_output(PortfolioInsights)  # if using tools
@@ -1,13 +1,19 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from model_router import get_model
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from dotenv import load_dotenv
-from retrieval_tool import retrieve_documents
+from retrieval_tool import retrieve_documents, embeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from fin_tools import get_ticker_info
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langgraph.checkpoint.memory import InMemorySaver
+from checkpointer import get_checkpointer
+from langgraph.config import get_stream_writer
+from streaming import stream_graph
+from compaction import compact_messages, llm_summarizer
+from tool_middleware import run_tool
+from semantic_cache import SemanticCache
 from typing import TypedDict, Annotated, List, Optional
 import operator
+import threading
 from langchain_core.messages import BaseMessage
 
 import sys
@@ -15,7 +21,7 @@ sys.path.append('../')
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0)
+llm = get_model("chat")
 
 tools = [retrieve_documents, get_ticker_info]
 llm_with_tools = llm.bind_tools(tools)
@@ -54,6 +60,8 @@ prompt = ChatPromptTemplate.from_messages([
 
 qa_agent = prompt | llm_with_tools
 
+summarize_history = llm_summarizer(get_model("summary"))
+
 def get_qa_agent():
     return qa_agent
 
@@ -66,13 +74,15 @@ class AgentState(TypedDict):
 def call_model(state: AgentState):
     """Itinerary planning agent node"""
     print("Invoking QA agent...")
-    messages = state["messages"]
+    # the thread keeps the full history; the model sees a compacted copy
+    messages, _ = compact_messages(state["messages"], summarize=summarize_history)
     response = qa_agent.invoke({"messages": messages})
 
     print("QA agent response:", response)
 
     # Handle tool calls if present
     if hasattr(response, 'tool_calls') and response.tool_calls:
+        writer = get_stream_writer()
         tool_messages = []
         tool_map = {
             "get_ticker_info": get_ticker_info,
@@ -80,12 +90,9 @@ def call_model(state: AgentState):
         }
         for tool_call in response.tool_calls:
             if tool_call['name'] in tool_map.keys():
-                try:
-                    tool_result = tool_map[tool_call['name']].invoke(tool_call)
-                except Exception as e:
-                    tool_result = f"Search failed: {str(e)}"
-                finally:
-                    tool_messages.append(tool_result)
+                writer({"node": "agent", "message": f"Running {tool_call['name']}"})
+                # cached, time-limited and retried by the tool middleware
+                tool_messages.append(run_tool(tool_map[tool_call['name']], tool_call))
 
         if tool_messages:
             all_messages = messages + [response] + tool_messages
@@ -97,17 +104,90 @@ def call_model(state: AgentState):
 
     return {"messages": [response]}
 
-checkpointer = InMemorySaver()
-
 workflow = StateGraph(AgentState)
 workflow.add_node("agent", call_model)
 workflow.add_edge("agent", END) # Simple graph, transitions to END after model call
 workflow.add_edge(START, "agent")
 
-qa_agent_app = workflow.compile(checkpointer=checkpointer)
-
-def get_response(user_input: str) -> str:
+_qa_agent_app = None
+_qa_agent_app_lock = threading.Lock()
+
+def get_qa_agent_app():
+    """
+    Returns the compiled chat graph, compiling it on first use so importing this
+    module does not open the checkpoint database.
+    """
+    global _qa_agent_app
+    if _qa_agent_app is None:
+        with _qa_agent_app_lock:
+            if _qa_agent_app is None:
+                _qa_agent_app = workflow.compile(checkpointer=get_checkpointer())
+    return _qa_agent_app
+
+# answers to general questions, reused for similar questions from any session
+answer_cache = SemanticCache(embeddings.embed_query)
+
+def cached_answer(user_input: str, thread_id: str):
+    """
+    Returns a cached answer for the question, or None. A hit is still recorded in
+    the thread, so follow-up questions see it in the conversation history.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    answer = answer_cache.lookup(user_input, has_history=bool(thread_messages(config)))
+    if answer is not None:
+        print("Using cached answer for:", user_input)
+        get_qa_agent_app().update_state(
+            config,
+            {"messages": [HumanMessage(content=user_input), AIMessage(content=answer)]},
+            as_node="agent",
+        )
+    return answer
+
+# tools whose output is live market data; answers built on it are never shared
+LIVE_DATA_TOOLS = {"get_ticker_info"}
+
+def thread_messages(config: dict) -> list:
+    return get_qa_agent_app().get_state(config).values.get("messages", [])
+
+def store_answer(user_input: str, new_messages: list, has_history: bool):
+    """Caches the final answer of a run, unless the run used live data."""
+    if any(isinstance(m, ToolMessage) and m.name in LIVE_DATA_TOOLS for m in new_messages):
+        return
+    if new_messages and isinstance(new_messages[-1], AIMessage):
+        answer_cache.store(user_input, new_messages[-1].text, has_history)
+
+def get_response(user_input: str, thread_id: str = "1") -> str:
+    answer = cached_answer(user_input, thread_id)
+    if answer is not None:
+        return answer
+    config = {"configurable": {"thread_id": thread_id}}
+    seen = len(thread_messages(config))
     input_message = HumanMessage(content=user_input)
-    result = qa_agent_app.invoke({"messages": [input_message]}, {"configurable": {"thread_id": 1}})
+    result = get_qa_agent_app().invoke({"messages": [input_message]}, config)
     print(result)
-    return result["messages"][-1].content
\ No newline at end of file
+    store_answer(user_input, result["messages"][seen:], has_history=seen > 0)
+    return result["messages"][-1].content
+
+def stream_response(user_input: str, thread_id: str = "1", on_progress=None):
+    """
+    Like get_response, but yields the answer text as each model turn that
+    answers (rather than calls tools) completes.
+    Args:
+        user_input: The user's question.
+        thread_id: Conversation thread to continue.
+        on_progress: Optional callable receiving a message while tools run.
+    """
+    answer = cached_answer(user_input, thread_id)
+    if answer is not None:
+        yield answer
+        return
+    config = {"configurable": {"thread_id": thread_id}}
+    seen = len(thread_messages(config))
+    input_message = HumanMessage(content=user_input)
+    for kind, value in stream_graph(get_qa_agent_app(), {"messages": [input_message]}, config):
+        if kind == "token":
+            yield value
+        elif on_progress is not None:
+            on_progress(value["message"])
+    # the thread holds the final answer on its own, without earlier turns' text
+    store_answer(user_input, thread_messages(config)[seen:], has_history=seen > 0)
@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+import model
+from market_data import provider_data_path
+
+# Cache for agent results (portfolio analyses, market trends, goal plans).
+# Values are serialized and zlib-compressed once, then kept in a byte-bounded
+# in-process LRU in front of an optional shared tier: a SQLite file that every
+# worker on the node can open, or any Redis-protocol server (redis, valkey, or
+# a local stand-in) so replicas behind a load balancer share warm results.
+#
+# RESULT_CACHE_BACKEND picks the shared tier: "memory" (none), "sqlite" or "redis".
+
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "sqlite")
+RESULT_CACHE_PATH = os.getenv(
+    "RESULT_CACHE_PATH",
+    provider_data_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "result_cache.sqlite3")),
+)
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "redis://localhost:6379/0")
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+# Seconds a result stays valid, per namespace
+RESULT_CACHE_TTLS = {
+    "portfolio": 3600,
+    "market_trends": 3600,
+    "goal_plan": 3600,
+    # enriched portfolio with its live prices plus the analysis; shorter, so
+    # the pie chart and day change do not go stale for long
+    "portfolio_run": 600,
+}
+
+COMPRESSION_LEVEL = 6
+
+
+# Values are serialized with the checkpointer's msgpack serde, never pickle:
+# anything that can write to the shared tier could otherwise run code in the
+# app. Only plain data, LangChain messages and the result models in model.py
+# are rebuilt from a blob.
+RESULT_TYPES = [("model", name) for name, obj in vars(model).items()
+                if isinstance(obj, type) and issubclass(obj, BaseModel) and obj.__module__ == "model"]
+_serde = JsonPlusSerializer(allowed_msgpack_modules=RESULT_TYPES)
+_FORMAT = b"RC2\0"
+
+
+def encode(value) -> bytes:
+    """Serializes and compresses a cache value."""
+    type_, data = _serde.dumps_typed(value)
+    return zlib.compress(_FORMAT + type_.encode() + b"\0" + data, COMPRESSION_LEVEL)
+
+
+def decode(blob: bytes):
+    """Inverse of encode; raises ValueError for blobs it did not write (e.g. old pickles)."""
+    raw = zlib.decompress(blob)
+    if not raw.startswith(_FORMAT):
+        raise ValueError("Not a result cache value")
+    type_, _, data = raw[len(_FORMAT):].partition(b"\0")
+    return _serde.loads_typed((type_.decode(), data))
+
+
+class MemoryTier:
+    """LRU of compressed blobs bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (namespace, blob, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, namespace: str, blob: bytes, expires_at: float) -> list:
+        """Stores a blob and returns the namespaces of entries evicted to make room."""
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # a single value larger than a quarter of the budget would flush
+            # most of the tier; leave it to the shared tier
+            if len(blob) > self.max_bytes // 4:
+                return evicted
+            self._entries[key] = (namespace, blob, expires_at)
+            self.bytes += len(blob)
+            while self.bytes > self.max_bytes:
+                _, (ns, old, _) = self._entries.popitem(last=False)
+                self.bytes -= len(old)
+                evicted.append(ns)
+        return evicted
+
+    def _remove(self, key: str):
+        _, blob, _ = self._entries.pop(key)
+        self.bytes -= len(blob)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteTier:
+    """Shared on-disk tier in one SQLite file, pruned by expiry and total size."""
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_bytes: int = RESULT_CACHE_DISK_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, namespace: str, blob: bytes, expires_at: float) -> list:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, namespace, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, blob, len(blob), expires_at, now),
+            )
+            return self._prune(now)
+
+    def _prune(self, now: float) -> list:
+        # SELECT then DELETE rather than DELETE ... RETURNING, which needs SQLite 3.35+
+        evicted = [ns for (ns,) in self._conn.execute(
+            "SELECT namespace FROM results WHERE expires_at <= ?", (now,)
+        ).fetchall()]
+        self._conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return evicted
+        # least recently used first, until back under budget
+        for key, namespace, size in self._conn.execute(
+            "SELECT key, namespace, size FROM results ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            evicted.append(namespace)
+        return evicted
+
+
+class RedisTier:
+    """
+    Shared tier on a Redis-protocol server. Expiry is set per key; the byte budget
+    is the server's maxmemory with an LRU eviction policy.
+    """
+
+    def __init__(self, url: str = RESULT_CACHE_URL, prefix: str = "result:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RESULT_CACHE_BACKEND=redis requires the redis package (pip install redis)") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, namespace: str, blob: bytes, expires_at: float) -> list:
+        self._client.set(self.prefix + key, blob, px=max(1, int((expires_at - time.time()) * 1000)))
+        return []
+
+
+class ResultCache:
+    """
+    Two-tier result cache with per-namespace hit, miss and eviction counters.
+    Keys come from cache_keys and already include their namespace and version.
+    """
+
+    def __init__(self, shared=None, memory_bytes: int = RESULT_CACHE_MEMORY_BYTES, ttls: dict = RESULT_CACHE_TTLS):
+        self.memory = MemoryTier(memory_bytes)
+        self.shared = shared
+        self.ttls = ttls
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace: str, name: str, n: int = 1):
+        with self._lock:
+            counters = self._metrics.setdefault(namespace, {
+                "memory_hits": 0, "shared_hits": 0, "misses": 0, "sets": 0,
+                "memory_evictions": 0, "shared_evictions": 0, "bytes_written": 0,
+            })
+            counters[name] += n
+
+    def get(self, namespace: str, key: str):
+        """Returns the cached value for key, or None."""
+        blob = self.memory.get(key)
+        if blob is not None:
+            self._count(namespace, "memory_hits")
+            return decode(blob)
+        if self.shared is not None:
+            try:
+                blob = self.shared.get(key)
+            except Exception as e:
+                # a shared tier outage degrades to a miss, never to a failed request
+                print(f"Shared result cache read failed: {e}")
+                blob = None
+            if blob is not None:
+                try:
+                    value = decode(blob)
+                except Exception as e:
+                    # unreadable or foreign data in the shared tier is a miss
+                    print(f"Shared result cache value for {key} rejected: {e}")
+                    self._count(namespace, "misses")
+                    return None
+                self._count(namespace, "shared_hits")
+                # the shared tier does not expose the remaining TTL; hold the
+                # promoted copy for the namespace TTL at most
+                for ns in self.memory.set(key, namespace, blob, time.time() + self.ttls[namespace]):
+                    self._count(ns, "memory_evictions")
+                return value
+        self._count(namespace, "misses")
+        return None
+
+    def set(self, namespace: str, key: str, value):
+        """Caches value under key in both tiers for the namespace's TTL."""
+        blob = encode(value)
+        expires_at = time.time() + self.ttls[namespace]
+        self._count(namespace, "sets")
+        self._count(namespace, "bytes_written", len(blob))
+        for ns in self.memory.set(key, namespace, blob, expires_at):
+            self._count(ns, "memory_evictions")
+        if self.shared is not None:
+            try:
+                for ns in self.shared.set(key, namespace, blob, expires_at):
+                    self._count(ns, "shared_evictions")
+            except Exception as e:
+                print(f"Shared result cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Returns counters per namespace plus the memory tier's size."""
+        with self._lock:
+            namespaces = {ns: dict(c) for ns, c in self._metrics.items()}
+        return {
+            "namespaces": namespaces,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_budget": self.memory.max_bytes,
+        }
+
+
+def create_result_cache(backend: str = RESULT_CACHE_BACKEND) -> ResultCache:
+    """Creates a result cache with the shared tier named by backend: "memory", "sqlite" or "redis"."""
+    if backend == "memory":
+        return ResultCache()
+    if backend == "sqlite":
+        return ResultCache(SqliteTier())
+    if backend == "redis":
+        return ResultCache(RedisTier())
+    raise ValueError(f"Unknown result cache backend: {backend}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """Returns the process-wide result cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_result_cache()
+    return _cache
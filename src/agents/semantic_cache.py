@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+
+# Semantic answer cache for the chat agent. Questions are embedded and compared
+# by cosine similarity against previously answered ones held in a fixed-size
+# numpy index; a close enough match returns the stored answer without running
+# the agent. Only general questions are cached: questions naming tickers,
+# asking about anything time-sensitive, or following up on the conversation
+# ("what about its fees?") bypass the cache in both directions. Pronouns only
+# count as a follow-up once the conversation has earlier turns, since a
+# standalone question uses them too ("what is an ETF and how does it work").
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# $AAPL, or an upper-case word of up to five letters that is not a common
+# finance acronym (ETF, IRA, ...)
+_TICKER = re.compile(r"\$[A-Za-z]{1,5}\b|\b[A-Z]{1,5}(?:\.[A-Z])?\b")
+COMMON_ACRONYMS = {
+    "I", "A", "ETF", "ETFS", "IRA", "IRAS", "ROTH", "HSA", "FSA", "CD", "CDS", "APR", "APY", "ESPP", "RSU", "RSUS",
+    "REIT", "REITS", "IPO", "CEO", "CFO", "EPS", "PE", "ROI", "ROE", "GDP", "CPI", "FED", "FDIC", "SEC", "IRS",
+    "US", "USA", "USD", "UK", "EU", "TIPS", "DCA", "FIRE", "NAV", "AUM", "YTD", "ESG", "LLC", "OK", "VS", "FAQ",
+    "SP",
+}
+TIME_SENSITIVE = re.compile(
+    r"\b(today|tonight|now|right now|currently|current|latest|recent|recently|yesterday|tomorrow|"
+    r"this (week|month|quarter|year)|last (week|month|quarter)|price|prices|quote|trading at|news|"
+    r"forecast|prediction|outlook|rate cut|rates? (now|today))\b|\b20\d\d\b",
+    re.IGNORECASE,
+)
+# Explicit references to the conversation, a follow-up in any thread
+BACK_REFERENCE = re.compile(
+    r"\b(the above|above answer|previous (answer|question|response)|your (last|previous|earlier) (answer|reply|response)|"
+    r"(as|same as|like) (before|earlier)|you (said|mentioned|suggested)|what about|how about)\b",
+    re.IGNORECASE,
+)
+# Words that refer back to something only when there is something to refer to
+PRONOUNS = re.compile(r"\b(it|its|that|those|they|them|their|these|same)\b", re.IGNORECASE)
+
+
+def bypass_reason(question: str, has_history: bool = False):
+    """
+    Returns why a question must not use the cache, or None when it may.
+    Args:
+        question: The user's question.
+        has_history: Whether the conversation has earlier turns the question could refer to.
+    """
+    # "S&P 500" names an index, not tickers S and P
+    for match in _TICKER.finditer(question.replace("S&P", "SP")):
+        token = match.group().lstrip("$")
+        if match.group().startswith("$") or token.upper() not in COMMON_ACRONYMS:
+            return "ticker"
+    if TIME_SENSITIVE.search(question):
+        return "time_sensitive"
+    if BACK_REFERENCE.search(question) or (has_history and PRONOUNS.search(question)):
+        return "follow_up"
+    return None
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class SemanticCache:
+    """
+    Question/answer pairs in a fixed-capacity embedding index. Entries expire
+    after ttl seconds; when the index is full the least recently used entry
+    is replaced.
+    """
+
+    def __init__(self, embed, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: int = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            embed: Callable returning the embedding (list of floats) of a text,
+                e.g. an Embeddings model's embed_query.
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._vectors = None                          # (max_entries, dim) unit vectors, allocated on first store
+        self._expires = np.zeros(max_entries)         # 0 marks a free slot
+        self._last_used = np.zeros(max_entries)
+        self._entries = [None] * max_entries          # (normalized question, answer)
+        self._exact = {}                              # normalized question -> slot
+        self._lock = threading.Lock()
+        self._metrics = {"lookups": 0, "hits": 0, "exact_hits": 0, "misses": 0, "bypassed": 0,
+                         "stores": 0, "evictions": 0, "expired": 0, "embed_errors": 0}
+
+    def _count(self, name: str, n: int = 1):
+        self._metrics[name] += n
+
+    def _embed(self, question: str):
+        try:
+            vector = np.asarray(self.embed(question), dtype=np.float32)
+        except Exception as e:
+            # an embedding outage only costs the cache, never the answer
+            print(f"Semantic cache embedding failed: {e}")
+            with self._lock:
+                self._count("embed_errors")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _expire(self, now: float):
+        expired = np.flatnonzero((self._expires > 0) & (self._expires <= now))
+        for slot in expired:
+            self._free(slot)
+        self._count("expired", len(expired))
+
+    def _free(self, slot: int):
+        normalized, _ = self._entries[slot]
+        self._exact.pop(normalized, None)
+        self._entries[slot] = None
+        self._expires[slot] = 0
+
+    def _hit(self, slot: int, now: float) -> str:
+        self._last_used[slot] = now
+        self._count("hits")
+        return self._entries[slot][1]
+
+    def lookup(self, question: str, has_history: bool = False):
+        """
+        Returns the cached answer for a question similar enough to one already answered, or None.
+        has_history tells whether the question follows earlier turns of its conversation.
+        """
+        with self._lock:
+            self._count("lookups")
+            if bypass_reason(question, has_history):
+                self._count("bypassed")
+                return None
+            now = time.time()
+            self._expire(now)
+            slot = self._exact.get(normalize_question(question))
+            if slot is not None:
+                # same words, no embedding call needed
+                self._count("exact_hits")
+                return self._hit(slot, now)
+            if self._vectors is None or not self._exact:
+                self._count("misses")
+                return None
+
+        vector = self._embed(question)
+        with self._lock:
+            if vector is None or self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self._count("misses")
+                return None
+            similarity = self._vectors @ vector
+            similarity[self._expires <= now] = -np.inf
+            slot = int(np.argmax(similarity))
+            if similarity[slot] < self.threshold:
+                self._count("misses")
+                return None
+            return self._hit(slot, now)
+
+    def store(self, question: str, answer: str, has_history: bool = False) -> bool:
+        """Caches an answer; returns False when the question is not cacheable."""
+        if not answer or bypass_reason(question, has_history):
+            return False
+        vector = self._embed(question)
+        if vector is None:
+            return False
+        normalized = normalize_question(question)
+        with self._lock:
+            now = time.time()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self._expire(now)
+            slot = self._exact.get(normalized)
+            if slot is None:
+                free = np.flatnonzero(self._expires == 0)
+                if len(free):
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self._free(slot)
+                    self._count("evictions")
+            self._vectors[slot] = vector
+            self._entries[slot] = (normalized, answer)
+            self._exact[normalized] = slot
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._count("stores")
+            return True
+
+    def stats(self) -> dict:
+        """Returns lookup, hit and eviction counters, the hit rate over non-bypassed lookups and the entry count."""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["entries"] = len(self._exact)
+        eligible = stats["lookups"] - stats["bypassed"]
+        stats["hit_rate"] = stats["hits"] / eligible if eligible else 0.0
+        return stats
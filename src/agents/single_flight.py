@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+
+class _Call:
+    """A call in flight, shared by the caller running it and everyone waiting on it."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running block until it finishes and receive the same result (or
+    exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() for key, or waits for the call already in flight for key.
+        Returns a (result, shared) tuple, where shared is True when the result
+        came from another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines. Calls are coalesced per event loop: the first
+    caller for a key starts the coroutine as a task, and every caller on the
+    same loop while it runs (the first included) awaits that task's result (or
+    exception). Each caller awaits it shielded, so a cancelled caller, e.g. a
+    dropped client, never cancels the call the others are waiting on; the task
+    runs to completion even if every caller is gone.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def _done(self, loop, key, task):
+        if self._calls.get((loop, key)) is task:
+            del self._calls[(loop, key)]
+        # mark the exception retrieved even when nobody was waiting
+        task.cancelled() or task.exception()
+
+    async def do(self, key, fn):
+        """
+        Awaits fn() for key, or the call already in flight for key.
+        Returns a (result, shared) tuple like SingleFlight.do.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._calls.get((loop, key))
+        if task is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = loop.create_task(fn())
+        self._calls[(loop, key)] = task
+        task.add_done_callback(lambda t: self._done(loop, key, t))
+        return await asyncio.shield(task), False
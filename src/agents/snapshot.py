@@ -0,0 +1,146 @@
+import json
+import struct
+from dataclasses import dataclass, field
+import numpy as np
+from history_store import PriceHistory
+from history_codec import DATE_DTYPE, PRICE_DTYPE, columns_to_wire
+from indicators import format_rows
+from context_builder import ContextBuilder, info_table
+
+# Binary layout: header, JSON metadata, then the OHLCV columns back to back
+# as raw little-endian arrays (dates first).
+_MAGIC = b"TSN1"
+_HEADER = struct.Struct("<4sII")  # magic, metadata length, number of bars
+_COLUMNS = ("dates", "open", "high", "low", "close", "volume")
+
+
+@dataclass(slots=True)
+class TickerSnapshot:
+    """Market data for one ticker: small metadata plus OHLCV as numpy arrays."""
+
+    ticker: str
+    info: dict = field(default_factory=dict)
+    fast_info: dict = field(default_factory=dict)
+    news: list = field(default_factory=list)
+    dates: np.ndarray = field(default_factory=lambda: np.empty(0, DATE_DTYPE))  # days since epoch
+    open: np.ndarray = field(default_factory=lambda: np.empty(0, PRICE_DTYPE))
+    high: np.ndarray = field(default_factory=lambda: np.empty(0, PRICE_DTYPE))
+    low: np.ndarray = field(default_factory=lambda: np.empty(0, PRICE_DTYPE))
+    close: np.ndarray = field(default_factory=lambda: np.empty(0, PRICE_DTYPE))
+    volume: np.ndarray = field(default_factory=lambda: np.empty(0, PRICE_DTYPE))
+    # one feature row from indicators.feature_rows
+    indicators: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_history(cls, ticker: str, info: dict, fast_info: dict, news: list, history: PriceHistory,
+                     indicators: dict = None) -> "TickerSnapshot":
+        return cls(
+            ticker.upper(), info, fast_info, news,
+            history.dates, history.open, history.high, history.low, history.close, history.volume,
+            indicators or {},
+        )
+
+    def to_bytes(self) -> bytes:
+        """Encodes the snapshot as a single bytes object."""
+        meta = json.dumps(
+            {"ticker": self.ticker, "info": self.info, "fast_info": self.fast_info, "news": self.news,
+             "indicators": self.indicators},
+            default=str, separators=(",", ":"),
+        ).encode()
+        parts = [_HEADER.pack(_MAGIC, len(meta), len(self.dates)), meta]
+        for name in _COLUMNS:
+            dtype = DATE_DTYPE if name == "dates" else PRICE_DTYPE
+            parts.append(np.ascontiguousarray(getattr(self, name), dtype).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TickerSnapshot":
+        """Decodes a snapshot; the arrays are read-only views into data."""
+        magic, meta_len, n = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a ticker snapshot")
+        offset = _HEADER.size
+        meta = json.loads(data[offset:offset + meta_len])
+        offset += meta_len
+        arrays = {}
+        for name in _COLUMNS:
+            dtype = DATE_DTYPE if name == "dates" else PRICE_DTYPE
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=n, offset=offset)
+            offset += n * dtype.itemsize
+        return cls(meta["ticker"], meta["info"], meta["fast_info"], meta["news"], **arrays,
+                   indicators=meta.get("indicators", {}))
+
+    def to_prompt(self) -> str:
+        """
+        Context handed to the model: ticker, the market trends fields of info
+        and the precomputed indicator table, within the market trends token
+        budget. The raw bars are only for charts.
+        """
+        builder = ContextBuilder("market_trends")
+        builder.add("ticker", self.ticker, priority=2)
+        builder.add("info", info_table(self.info, "market_trends"))
+        if self.indicators:
+            builder.add("technical_indicators", format_rows([self.indicators]), priority=1, header=1)
+        return builder.build()
+
+    def history_dict(self) -> dict:
+        """The bars in the legacy dict-of-lists format."""
+        return columns_to_wire(self.dates, {
+            "Open": self.open, "High": self.high, "Low": self.low, "Close": self.close, "Volume": self.volume,
+        })
+
+
+def benchmark_serialization(n_bars: int = 120, iterations: int = 2000):
+    """
+    Compares the old dict-of-lists JSON round trip against TickerSnapshot bytes,
+    reporting time per encode+decode and the memory held per snapshot.
+    """
+    import sys
+    import time
+    import tracemalloc
+
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    info = {f"field_{i}": float(i) for i in range(150)}
+    snap = TickerSnapshot(
+        "BENCH", info, {"lastPrice": float(close[-1])}, [{"title": "t", "url": "u"}] * 10,
+        np.arange(20000, 20000 + n_bars, dtype=DATE_DTYPE),
+        close * 0.99, close * 1.01, close * 0.98, close, rng.integers(1e5, 1e7, n_bars).astype(PRICE_DTYPE),
+    )
+    legacy = {"ticker": snap.ticker, "info": snap.info, "fast_info": snap.fast_info,
+              "history_6m": snap.history_dict(), "news": snap.news}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        json.loads(json.dumps(legacy, default=str))
+    legacy_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        TickerSnapshot.from_bytes(snap.to_bytes())
+    compact_us = (time.perf_counter() - start) / iterations * 1e6
+
+    legacy_wire = json.dumps(legacy, default=str)
+    compact_wire = snap.to_bytes()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [json.loads(legacy_wire) for _ in range(100)]
+    legacy_mem = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")) / 100
+    del kept
+    before = tracemalloc.take_snapshot()
+    kept = [TickerSnapshot.from_bytes(bytes(bytearray(compact_wire))) for _ in range(100)]
+    compact_mem = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")) / 100
+    del kept
+    tracemalloc.stop()
+
+    print(f"bars={n_bars} ({sys.version.split()[0]})")
+    print(f"{'format':<10}{'round trip (us)':>18}{'wire bytes':>14}{'decoded mem (bytes)':>22}")
+    print(f"{'json':<10}{legacy_us:>18.1f}{len(legacy_wire):>14}{legacy_mem:>22.0f}")
+    print(f"{'compact':<10}{compact_us:>18.1f}{len(compact_wire):>14}{compact_mem:>22.0f}")
+
+
+if __name__ == "__main__":
+    for bars in (120, 1260, 5040):
+        benchmark_serialization(bars, iterations=500)
+        print()
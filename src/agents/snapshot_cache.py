@@ -0,0 +1,84 @@
+import threading
+from cachetools import TTLCache
+from single_flight import SingleFlight
+
+# Seconds each kind of yfinance payload stays cached in process
+SNAPSHOT_TTLS = {
+    "info": 300,
+    "fast_info": 60,
+    "quote": 60,
+}
+
+
+class SnapshotCache:
+    """
+    In-process cache of yfinance payloads keyed by (ticker, data kind, params).
+
+    Concurrent misses for the same key are coalesced so only one upstream
+    fetch is made; the other callers wait for and share its result.
+    """
+
+    def __init__(self, maxsize: int = 512, ttls: dict = SNAPSHOT_TTLS):
+        self._caches = {kind: TTLCache(maxsize=maxsize, ttl=ttl) for kind, ttl in ttls.items()}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticker: str, kind: str, loader, *params):
+        """
+        Returns the cached payload for (ticker, kind, *params), calling loader() on a miss.
+        Args:
+            ticker: The stock ticker symbol.
+            kind: Payload kind, one of the keys of SNAPSHOT_TTLS.
+            loader: Zero-argument callable that fetches the payload.
+            params: Extra key parts such as period and interval.
+        """
+        key = (ticker.upper(), kind, *params)
+        cache = self._caches[kind]
+        with self._lock:
+            if key in cache:
+                self.hits += 1
+                return cache[key]
+
+        def load():
+            with self._lock:
+                # filled by a call that finished between our check and now
+                if key in cache:
+                    return cache[key]
+            value = loader()
+            with self._lock:
+                cache[key] = value
+            return value
+
+        value, shared = self._flight.do(key, load)
+        if not shared:
+            with self._lock:
+                self.misses += 1
+        return value
+
+    def peek(self, ticker: str, kind: str, *params):
+        """Returns the cached payload for (ticker, kind, *params), or None without loading."""
+        key = (ticker.upper(), kind, *params)
+        with self._lock:
+            value = self._caches[kind].get(key)
+            if value is not None:
+                self.hits += 1
+            return value
+
+    def put(self, ticker: str, kind: str, value, *params):
+        """Caches a payload fetched outside get(), e.g. one entry of a bulk response."""
+        key = (ticker.upper(), kind, *params)
+        with self._lock:
+            self._caches[kind][key] = value
+            self.misses += 1
+
+    def stats(self) -> dict:
+        """Returns hit, miss and coalesced counters plus the number of cached entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self._flight.coalesced,
+                "size": sum(len(c) for c in self._caches.values()),
+            }
@@ -0,0 +1,71 @@
+from langchain_core.messages import AIMessageChunk
+
+# Streaming helpers for compiled LangGraph graphs. A run is consumed with
+# stream_mode=["messages", "custom"]: "messages" carries LLM tokens as the
+# chat models inside the nodes produce them, and "custom" carries progress
+# events that nodes emit through langgraph's get_stream_writer().
+#
+# Both helpers yield (kind, value) pairs:
+#   ("token", str)      a piece of answer text
+#   ("progress", dict)  {"node": ..., "message": ...} while tools fetch data
+#
+# A model may write some text and then call a tool in the same turn; that text
+# is not part of the answer. Tokens are therefore held per model turn and only
+# released when the turn ends without tool calls, so answer text arrives one
+# turn at a time rather than token by token.
+
+STREAM_MODES = ["messages", "custom"]
+
+
+class _TurnFilter:
+    """Buffers the text of the current model turn and drops it if the turn calls tools."""
+
+    def __init__(self):
+        self._id = None
+        self._text = []
+        self._calls_tools = False
+
+    def flush(self) -> list:
+        """Ends the current turn, returning its text as a token event unless it called tools."""
+        text = "" if self._calls_tools else "".join(self._text)
+        self._id, self._text, self._calls_tools = None, [], False
+        return [("token", text)] if text else []
+
+    def feed(self, mode: str, chunk) -> list:
+        """Returns the events ready to yield after one item of the graph stream."""
+        if mode == "custom":
+            # progress comes from nodes that run after the model's turn
+            return self.flush() + [("progress", chunk)]
+        message, _metadata = chunk
+        if not isinstance(message, AIMessageChunk):
+            # whole messages (tool results, node outputs) mean the turn is over
+            return self.flush()
+        # every chunk of one model call carries the same message id
+        events = self.flush() if message.id != self._id else []
+        self._id = message.id
+        if message.tool_call_chunks:
+            self._calls_tools = True
+        if message.text:
+            self._text.append(message.text)
+        if message.chunk_position == "last":
+            events += self.flush()
+        return events
+
+
+def stream_graph(app, inputs: dict, config: dict):
+    """Runs a graph, yielding answer text and progress events as they happen."""
+    turns = _TurnFilter()
+    for mode, chunk in app.stream(inputs, config, stream_mode=STREAM_MODES):
+        yield from turns.feed(mode, chunk)
+    yield from turns.flush()
+
+
+async def astream_graph(app, inputs: dict, config: dict):
+    """Async version of stream_graph, for graphs built with create_workflow(async_mode=True)."""
+    turns = _TurnFilter()
+    async for mode, chunk in app.astream(inputs, config, stream_mode=STREAM_MODES):
+        for event in turns.feed(mode, chunk):
+            yield event
+    for event in turns.flush():
+        yield event
+
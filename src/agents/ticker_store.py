@@ -0,0 +1,238 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from market_data import get_provider, provider_data_path
+
+# On-disk store for yfinance ticker metadata that survives restarts and is
+# shared by every worker process on the node. Each field of Ticker.info is
+# kept with the time it was fetched and is considered fresh according to the
+# tier it belongs to. Full info dicts are judged field by field too: when only
+# the price fields have gone stale, they are refreshed with the provider's
+# cheap quote call instead of refetching the whole dict.
+
+TICKER_STORE_PATH = os.getenv(
+    "TICKER_STORE_PATH",
+    provider_data_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ticker_metadata.sqlite3")),
+)
+
+STATIC_TTL = 7 * 24 * 3600      # classification, names, descriptions
+FUNDAMENTAL_TTL = 6 * 3600      # valuation, margins, balance sheet
+QUOTE_TTL = 5 * 60              # prices, volumes and anything else
+
+STATIC_FIELDS = {
+    "longName", "shortName", "displayName", "symbol", "quoteType",
+    "sector", "sectorKey", "sectorDisp", "industry", "industryKey", "industryDisp",
+    "exchange", "fullExchangeName", "exchangeTimezoneName", "market", "currency",
+    "financialCurrency", "country", "city", "state", "address1", "zip", "phone",
+    "website", "irWebsite", "longBusinessSummary", "fullTimeEmployees", "companyOfficers",
+    "category", "fundFamily", "legalType", "fundInceptionDate", "firstTradeDateMilliseconds",
+}
+
+FUNDAMENTAL_FIELDS = {
+    "marketCap", "enterpriseValue", "sharesOutstanding", "floatShares",
+    "trailingPE", "forwardPE", "priceToBook", "priceToSalesTrailing12Months",
+    "enterpriseToRevenue", "enterpriseToEbitda", "pegRatio", "trailingPegRatio",
+    "bookValue", "trailingEps", "forwardEps", "epsTrailingTwelveMonths", "epsForward",
+    "totalRevenue", "revenuePerShare", "ebitda", "grossProfits", "netIncomeToCommon",
+    "revenueGrowth", "earningsGrowth", "earningsQuarterlyGrowth",
+    "grossMargins", "operatingMargins", "profitMargins", "ebitdaMargins",
+    "returnOnAssets", "returnOnEquity", "debtToEquity", "currentRatio", "quickRatio",
+    "totalCash", "totalCashPerShare", "totalDebt", "freeCashflow", "operatingCashflow",
+    "dividendRate", "dividendYield", "payoutRatio", "lastDividendValue", "lastDividendDate",
+    "exDividendDate", "trailingAnnualDividendRate", "trailingAnnualDividendYield",
+    "fiveYearAvgDividendYield", "beta", "beta3Year", "netExpenseRatio", "totalAssets",
+    "yield", "ytdReturn", "threeYearAverageReturn", "fiveYearAverageReturn",
+    "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "52WeekChange", "SandP52WeekChange",
+    "allTimeHigh", "allTimeLow", "fiftyDayAverage", "twoHundredDayAverage",
+    "averageVolume", "averageVolume10days", "averageDailyVolume10Day", "averageDailyVolume3Month",
+    "targetHighPrice", "targetLowPrice", "targetMeanPrice", "targetMedianPrice",
+    "recommendationKey", "recommendationMean", "numberOfAnalystOpinions",
+    "mostRecentQuarter", "lastFiscalYearEnd", "nextFiscalYearEnd",
+}
+
+# Info fields kept current from MarketDataProvider.quotes() between full fetches
+QUOTE_INFO_FIELDS = {
+    "currentPrice": "lastPrice",
+    "regularMarketPrice": "lastPrice",
+    "previousClose": "previousClose",
+    "regularMarketPreviousClose": "previousClose",
+}
+
+
+def field_ttl(field: str) -> int:
+    """Returns how many seconds a stored value of the given info field stays fresh."""
+    if field in STATIC_FIELDS:
+        return STATIC_TTL
+    if field in FUNDAMENTAL_FIELDS:
+        return FUNDAMENTAL_TTL
+    return QUOTE_TTL
+
+
+def fetch_info(ticker: str) -> dict:
+    """Fetches the full info dict for a ticker from the market data provider."""
+    return get_provider().info(ticker)
+
+
+class TickerMetadataStore:
+    """
+    SQLite-backed read-through store for yfinance info dicts.
+
+    A request for a set of fields is answered from disk when each field is
+    within its tier's TTL. A field that yfinance does not provide for a ticker
+    (e.g. sector for an ETF) counts as fresh while the last full fetch is.
+    """
+
+    def __init__(self, path: str = TICKER_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS ticker_fields (
+                    ticker TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (ticker, field)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS ticker_fetches (
+                    ticker TEXT PRIMARY KEY,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+
+    def _read(self, ticker: str, fields=None):
+        """
+        Returns (fresh fields, names of stale fields) stored for a ticker, or None
+        when it was never fetched. Requested fields yfinance did not provide are
+        stale once the last full fetch is past their TTL.
+        """
+        ticker = ticker.upper()
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM ticker_fetches WHERE ticker = ?", (ticker,)
+            ).fetchone()
+            if row is None:
+                return None
+            last_fetch = row[0]
+            if fields is None:
+                rows = self._conn.execute(
+                    "SELECT field, value, fetched_at FROM ticker_fields WHERE ticker = ?", (ticker,)
+                ).fetchall()
+            else:
+                fields = list(fields)
+                placeholders = ",".join("?" * len(fields))
+                rows = self._conn.execute(
+                    f"SELECT field, value, fetched_at FROM ticker_fields WHERE ticker = ? AND field IN ({placeholders})",
+                    (ticker, *fields),
+                ).fetchall()
+
+        info = {}
+        stale = set()
+        for field, value, fetched_at in rows:
+            if now - fetched_at >= field_ttl(field):
+                stale.add(field)
+            else:
+                info[field] = json.loads(value)
+        for field in fields or []:
+            if field not in info and field not in stale and now - last_fetch >= field_ttl(field):
+                stale.add(field)
+        return info, stale
+
+    def get_fresh(self, ticker: str, fields=None):
+        """
+        Returns the stored info for a ticker if every requested field is fresh, else None.
+        Args:
+            ticker: The stock ticker symbol.
+            fields: Info fields needed by the caller, or None for the full info dict.
+        """
+        read = self._read(ticker, fields)
+        if read is None or read[1]:
+            return None
+        return read[0]
+
+    def put(self, ticker: str, info: dict):
+        """Replaces the stored info for a ticker with a freshly fetched info dict."""
+        ticker = ticker.upper()
+        now = time.time()
+        rows = [(ticker, k, json.dumps(v, default=str), now) for k, v in info.items()]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ticker_fields WHERE ticker = ?", (ticker,))
+            self._conn.executemany(
+                "INSERT INTO ticker_fields (ticker, field, value, fetched_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ticker_fetches (ticker, fetched_at) VALUES (?, ?)", (ticker, now)
+            )
+
+    def refresh(self, ticker: str, fields=None) -> dict:
+        """Fetches a ticker's info upstream, stores it, and returns the requested fields."""
+        info = fetch_info(ticker)
+        self.put(ticker, info)
+        if fields is None:
+            return info
+        return {k: info[k] for k in fields if k in info}
+
+    def refresh_quotes(self, ticker: str, info: dict, fields) -> dict:
+        """
+        Updates the given QUOTE_INFO_FIELDS of a stored ticker from the provider's
+        quote call, stamping them with the refresh time, and returns info with
+        them filled in. Raises ValueError when the quote lacks any of them.
+        """
+        ticker = ticker.upper()
+        quote = get_provider().quotes([ticker]).get(ticker)
+        if not quote:
+            raise ValueError(f"No quote returned for {ticker}")
+        now = time.time()
+        prices = {field: quote[key] for field, key in QUOTE_INFO_FIELDS.items()
+                  if field in fields and quote.get(key) is not None}
+        if prices.keys() != set(fields):
+            raise ValueError(f"Quote for {ticker} is missing {sorted(set(fields) - prices.keys())}")
+        rows = [(ticker, k, json.dumps(v), now) for k, v in prices.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ticker_fields (ticker, field, value, fetched_at) VALUES (?, ?, ?, ?)", rows
+            )
+        return {**info, **prices}
+
+    def get_info(self, ticker: str, fields=None) -> dict:
+        """
+        Returns info for a ticker, reading from disk when fresh and upstream otherwise.
+        For the full info dict, when every stale field is one of QUOTE_INFO_FIELDS
+        they are refreshed with refresh_quotes instead of refetching everything.
+        Args:
+            ticker: The stock ticker symbol.
+            fields: Info fields needed by the caller, or None for the full info dict.
+        """
+        read = self._read(ticker, fields)
+        if read is not None:
+            info, stale = read
+            if not stale:
+                return info
+            # only the price fields can be refreshed without the full info dict
+            if fields is None and stale <= QUOTE_INFO_FIELDS.keys():
+                try:
+                    return self.refresh_quotes(ticker, info, stale)
+                except Exception as e:
+                    print(f"Quote refresh failed for {ticker}, fetching full info: {e}")
+        return self.refresh(ticker, fields)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_metadata_store() -> TickerMetadataStore:
+    """Returns the process-wide metadata store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TickerMetadataStore()
+    return _store
@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from langchain.agents.middleware import ToolCallRequest
+from langchain_core.messages import ToolMessage
+from cache_keys import canonicalize
+
+# Execution policy for the tool calls that graph nodes run themselves (through
+# run_tool / arun_tool, or call_tool for direct calls from code). Each call:
+#   - is served from a per-tool TTL cache keyed by the tool name and its
+#     normalized arguments, when the tool has a ttl
+#   - runs on a worker thread and fails after the tool's timeout
+#   - is retried with jittered exponential backoff when it fails with a
+#     transient error (rate limits, connection resets, overloaded embedding API)
+#   - has its text output capped before it is returned to the model
+# A call that still fails comes back as a ToolMessage with status="error".
+# Tools that report failures in their output ({"error": ...} JSON) are never cached.
+
+TOOL_POLICIES = {
+    # ttl: seconds a result is reused (0 disables caching)
+    # timeout: seconds before the call is abandoned
+    # retries: extra attempts after a transient error
+    # max_chars: output cap, None for outputs parsed by code rather than read by a model
+    "get_ticker_info": {"ttl": 300, "timeout": 15, "retries": 2, "max_chars": 8000},
+    "yf_snapshot": {"ttl": 60, "timeout": 30, "retries": 2, "max_chars": 12000},
+    "retrieve_documents": {"ttl": 3600, "timeout": 20, "retries": 2, "max_chars": 12000},
+    "enhance_portfolio_data": {"ttl": 60, "timeout": 60, "retries": 1, "max_chars": None},
+}
+DEFAULT_TOOL_POLICY = {"ttl": 0, "timeout": 30, "retries": 1, "max_chars": 8000}
+
+TOOL_CACHE_SIZE = 512           # entries per tool
+TOOL_MAX_WORKERS = 16
+RETRY_BASE_DELAY = 0.5          # seconds, doubled per attempt
+RETRY_MAX_DELAY = 8.0
+
+# Exception class names (anywhere in the MRO) treated as transient: yfinance rate
+# limits, requests/curl connection errors, and google-api errors from the
+# embeddings behind the vector store
+TRANSIENT_ERROR_TYPES = {
+    "YFRateLimitError", "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout",
+    "ServiceUnavailable", "ResourceExhausted", "DeadlineExceeded", "InternalServerError", "TooManyRequests",
+}
+TRANSIENT_ERROR_MARKERS = ("rate limit", "too many requests", "429", "503", "temporarily", "database is locked")
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors worth retrying: rate limits, dropped connections, overloaded services."""
+    if isinstance(error, TimeoutError):
+        # the timed-out call still holds its worker; retrying would only pile up more
+        return False
+    if any(cls.__name__ in TRANSIENT_ERROR_TYPES for cls in type(error).__mro__):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in TRANSIENT_ERROR_MARKERS)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base * 2**attempt], capped."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _normalize_args(args: dict) -> str:
+    normalized = {}
+    for name, value in (args or {}).items():
+        if isinstance(value, str):
+            # JSON documents passed as strings key by their content, not their formatting
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = value.upper() if name == "ticker" else value
+        normalized[name] = canonicalize(value)
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def is_error_payload(message: ToolMessage) -> bool:
+    """True when a tool reported a failure in its output as {"error": ...} JSON."""
+    content = message.content
+    if not isinstance(content, str) or not content.startswith('{"error"'):
+        return False
+    try:
+        return "error" in json.loads(content)
+    except ValueError:
+        return False
+
+
+def cap_output(message: ToolMessage, max_chars: int) -> ToolMessage:
+    """Returns message with its text content cut to max_chars."""
+    if max_chars is None or not isinstance(message.content, str) or len(message.content) <= max_chars:
+        return message
+    content = message.content[:max_chars] + f"\n... [output truncated, {len(message.content) - max_chars} characters omitted]"
+    return message.model_copy(update={"content": content})
+
+
+class ToolRunner:
+    """Runs tool calls under TOOL_POLICIES and counts what happened to them."""
+
+    def __init__(self, policies: dict = TOOL_POLICIES, max_workers: int = TOOL_MAX_WORKERS):
+        self.policies = policies
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._metrics = {}
+
+    def policy(self, name: str) -> dict:
+        return {**DEFAULT_TOOL_POLICY, **self.policies.get(name, {})}
+
+    def _count(self, name: str, counter: str):
+        with self._lock:
+            counters = self._metrics.setdefault(name, {
+                "calls": 0, "cache_hits": 0, "retries": 0, "timeouts": 0, "errors": 0, "truncated": 0,
+            })
+            counters[counter] += 1
+
+    def _cache(self, name: str, ttl: int) -> TTLCache:
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                cache = self._caches[name] = TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=ttl)
+            return cache
+
+    def _call_with_timeout(self, request, handler, timeout: float):
+        # the copied context keeps callbacks and the graph's stream writer working in the worker
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, handler, request)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"{request.tool_call['name']} timed out after {timeout}s")
+
+    def execute(self, request, handler) -> ToolMessage:
+        """
+        Runs one tool call.
+        Args:
+            request: ToolCallRequest for the call.
+            handler: Callable running the request and returning a ToolMessage.
+        """
+        tool_call = request.tool_call
+        name = tool_call["name"]
+        policy = self.policy(name)
+        self._count(name, "calls")
+
+        cache = key = None
+        if policy["ttl"] > 0:
+            cache = self._cache(name, policy["ttl"])
+            key = _normalize_args(tool_call.get("args"))
+            with self._lock:
+                cached = cache.get(key)
+            if cached is not None:
+                self._count(name, "cache_hits")
+                return cached.model_copy(update={"tool_call_id": tool_call["id"]})
+
+        attempt = 0
+        while True:
+            try:
+                result = self._call_with_timeout(request, handler, policy["timeout"])
+                break
+            except Exception as e:
+                if attempt < policy["retries"] and is_transient(e):
+                    delay = backoff_delay(attempt)
+                    print(f"Tool {name} failed ({e}), retrying in {delay:.2f}s")
+                    self._count(name, "retries")
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                self._count(name, "timeouts" if isinstance(e, TimeoutError) else "errors")
+                print(f"Tool {name} failed: {e}")
+                return ToolMessage(content=f"Tool error: {e}", name=name, tool_call_id=tool_call["id"], status="error")
+
+        if not isinstance(result, ToolMessage):
+            # a Command or other graph-level result; pass it through untouched
+            return result
+        capped = cap_output(result, policy["max_chars"])
+        if capped is not result:
+            self._count(name, "truncated")
+        if cache is not None and capped.status != "error" and not is_error_payload(result):
+            with self._lock:
+                cache[key] = capped
+        return capped
+
+    def stats(self) -> dict:
+        """Returns counters per tool."""
+        with self._lock:
+            return {name: dict(c) for name, c in self._metrics.items()}
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_tool_runner() -> ToolRunner:
+    """Returns the process-wide tool runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = ToolRunner()
+    return _runner
+
+
+def _invoke(request):
+    return request.tool.invoke(request.tool_call)
+
+
+def run_tool(tool, tool_call: dict) -> ToolMessage:
+    """Runs a model-issued tool call through the tool runner, for nodes that execute tools themselves."""
+    request = ToolCallRequest(tool_call=tool_call, tool=tool, state=None, runtime=None)
+    return get_tool_runner().execute(request, _invoke)
+
+
+async def arun_tool(tool, tool_call: dict) -> ToolMessage:
+    """Async version of run_tool; the call runs off the event loop."""
+    return await asyncio.to_thread(run_tool, tool, tool_call)
+
+
+def call_tool(tool, **args) -> str:
+    """
+    Runs a tool directly from code, through the tool runner, and returns its
+    content. Raises RuntimeError when the call fails.
+    """
+    message = run_tool(tool, {"name": tool.name, "args": args, "id": f"call_{uuid.uuid4().hex}", "type": "tool_call"})
+    if message.status == "error":
+        raise RuntimeError(message.content)
+    return message.content
@@ -1,17 +1,26 @@
 from typing import TypedDict, Annotated, List, Optional
 import operator
 from langchain_core.messages import BaseMessage
-from fin_tools import get_ticker_info, enhance_portfolio_data, yf_snapshot
-from retrieval_tool import retrieve_documents
-from qa_agent_test import get_qa_agent
+from fin_tools import enhance_portfolio_data, yf_snapshot
 from portfolio_insights import get_portfolio_insights_agent
-from market_trends import get_market_trends_agent
+from market_trends import get_market_trends_agent, get_market_trends_prefetch_agent
 from goal_planning import get_goal_planning_agent
 import json
+import os
+import time
+import asyncio
+import functools
+import threading
+import weakref
 from model import GoalPlanResult
+from cache_keys import portfolio_key, portfolio_run_key, market_trends_key, goal_plan_key
+from tool_middleware import run_tool, arun_tool, call_tool
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import InMemorySaver
-from cachetools import TTLCache
+from langgraph.types import Send
+from langgraph.config import get_stream_writer
+from checkpointer import get_checkpointer
+from result_cache import get_result_cache
+from single_flight import SingleFlight, AsyncSingleFlight
 from IPython.display import Image
 import io
 from PIL import Image as PILImage # Alias to avoid name collision
@@ -19,16 +28,35 @@ from PIL import Image as PILImage # Alias to avoid name collision
 class MarketTrendsState(TypedDict):
     """State schema for market trends agent"""
 
-    ticker_6mo_price_history: Optional[dict]
+    # TickerSnapshot.to_bytes() of the fetched data, used for the price chart
+    snapshot: Optional[bytes]
 
     news: Optional[list]
 
 
+# Newest messages kept in a workflow thread. No agent reads the workflow's history
+# back (each builds its prompt from the turn's inputs), so without a bound every
+# checkpoint of a long session would carry all of its messages.
+WORKFLOW_MAX_MESSAGES = 20
+
+
+def add_recent_messages(left: list, right: list) -> list:
+    """Reducer appending messages and keeping only the newest WORKFLOW_MAX_MESSAGES."""
+    return (left + right)[-WORKFLOW_MAX_MESSAGES:]
+
+
+def merge_holding_trends(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer for per-holding results written in parallel; None clears it."""
+    if right is None:
+        return {}
+    return {**(left or {}), **right}
+
+
 class AssistantState(TypedDict):
     """Simple state schema for multiagent system"""
 
-    # Conversation history - persisted with checkpoint memory
-    messages: Annotated[List[BaseMessage], operator.add]
+    # Recent messages - persisted with checkpoint memory
+    messages: Annotated[List[BaseMessage], add_recent_messages]
 
     context: str
 
@@ -48,94 +76,164 @@ class AssistantState(TypedDict):
 
     goal_planning_output: Optional[GoalPlanResult]
 
+    # Key of the current portfolio run in the "portfolio_run" result cache
+    portfolio_run_key: Optional[str]
+
+    # Full review: market trends per holding, filled by parallel branches
+    holding_trends: Annotated[dict, merge_holding_trends]
+
+    # Full review: every branch's result, assembled by the merge node
+    full_review: Optional[dict]
+
 portfolio_agent = get_portfolio_insights_agent()
 
 market_trends_agent = get_market_trends_agent()
 
+market_trends_prefetch_agent = get_market_trends_prefetch_agent()
+
+# "prefetch": the node fetches the snapshot and the model is called once with it.
+# "tools": the model is asked to call yf_snapshot first, then called again with its output.
+MARKET_TRENDS_MODE = os.getenv("MARKET_TRENDS_MODE", "prefetch")
+
 goal_planning_agent = get_goal_planning_agent()
 
-goal_planning_agent_cache = TTLCache(maxsize=100, ttl=3600) 
-
-def get_key_for_goal_plan_inputs(inputs: dict) -> str:
-    s = "|".join([
-        str(inputs.get("goal_type", "")),
-        str(inputs.get("goal_target_amount", "")),
-        str(inputs.get("goal_target_horizon", "")),
-        str(inputs.get("current_net_worth", "")),
-        str(inputs.get("risk_tolerance", "")),
-        str(inputs.get("current_age", "")),
-        str(inputs.get("annual_income", "")),
-        str(inputs.get("monthly_expenses", "")),
-        str(inputs.get("monthly_savings", ""))
-    ])
-    print("Generated hash for goal planning inputs:", hash(s))
-    return str(hash(s))
 
+# The node caches are only filled once an agent run finishes, so identical
+# requests arriving while it runs would all miss. Runs of a node for the same
+# cache key are coalesced instead: the first runs the agent, the rest wait for
+# its result.
+node_flight = SingleFlight()
+async_node_flight = AsyncSingleFlight()
+
+def coalesced(key_fn):
+    """Decorator for agent nodes (sync or async) coalescing runs with the same key_fn(state)"""
+    def decorate(node):
+        if asyncio.iscoroutinefunction(node):
+            @functools.wraps(node)
+            async def async_wrapper(state):
+                key = key_fn(state)
+                ret, shared = await async_node_flight.do(key, lambda: node(state))
+                if shared:
+                    print("Shared in-flight result for key:", key)
+                return ret
+            return async_wrapper
+
+        @functools.wraps(node)
+        def wrapper(state):
+            key = key_fn(state)
+            ret, shared = node_flight.do(key, lambda: node(state))
+            if shared:
+                print("Shared in-flight result for key:", key)
+            return ret
+        return wrapper
+    return decorate
+
+def coalesced_requests() -> int:
+    """Number of agent node runs served by waiting on an identical run in flight"""
+    return node_flight.coalesced + async_node_flight.coalesced
+
+@coalesced(lambda state: goal_plan_key(state["goal_plan_inputs"]))
 def goal_planning_agent_node(state: AssistantState):
     """Goal planning agent node"""
     print("Invoking goal planning agent...")
     # print("goal_plan_inputs:", state["goal_plan_inputs"])
 
-    key = get_key_for_goal_plan_inputs(state["goal_plan_inputs"])
+    key = goal_plan_key(state["goal_plan_inputs"])
     print("Generated key for goal planning inputs:", key)
 
-    if key in goal_planning_agent_cache:
+    cached = get_result_cache().get("goal_plan", key)
+    if cached is not None:
         print("Using cached goal planning for key:", key)
-        return goal_planning_agent_cache[key]
+        return cached
 
     response = goal_planning_agent.invoke({
             **state["goal_plan_inputs"],
         })
     # print(response)
     ret = {"goal_planning_output": response}
-    goal_planning_agent_cache[key] = ret
+    get_result_cache().set("goal_plan", key, ret)
     return ret
-    """QA agent node"""
-    print("Invoking QA agent...")
-    messages = state["messages"]
-    response = qa_agent.invoke({"messages": messages})
 
-    print("QA agent response:", response)
+@coalesced(lambda state: goal_plan_key(state["goal_plan_inputs"]))
+async def agoal_planning_agent_node(state: AssistantState):
+    """Goal planning agent node, async"""
+    print("Invoking goal planning agent...")
 
-    # Handle tool calls if present
-    if hasattr(response, 'tool_calls') and response.tool_calls:
-        tool_messages = []
-        tool_map = {
-            "get_ticker_info": get_ticker_info,
-            "retrieve_documents": retrieve_documents,
-        }
-        for tool_call in response.tool_calls:
-            if tool_call['name'] in tool_map.keys():
-                try:
-                    tool_result = tool_map[tool_call['name']].invoke(tool_call)
-                except Exception as e:
-                    tool_result = f"Search failed: {str(e)}"
-                finally:
-                    tool_messages.append(tool_result)
+    key = goal_plan_key(state["goal_plan_inputs"])
+    print("Generated key for goal planning inputs:", key)
 
-        if tool_messages:
-            all_messages = messages + [response] + tool_messages
-            final_response = qa_agent.invoke({"messages": all_messages})
-            print("*"*40)
-            print("Final response after tool calls:", final_response)
-            print("*"*40)
-            return {"messages": [response] + tool_messages + [final_response]}
+    # the shared cache tier does blocking disk or network I/O
+    cached = await asyncio.to_thread(get_result_cache().get, "goal_plan", key)
+    if cached is not None:
+        print("Using cached goal planning for key:", key)
+        return cached
 
-    return {"messages": [response]}
+    response = await goal_planning_agent.ainvoke({
+            **state["goal_plan_inputs"],
+        })
+    ret = {"goal_planning_output": response}
+    await asyncio.to_thread(get_result_cache().set, "goal_plan", key, ret)
+    return ret
 
-market_trends_agent_cache = TTLCache(maxsize=100, ttl=3600) 
+market_trends_tool_map = {
+    "yf_snapshot": yf_snapshot,
+}
+
+def snapshot_tool_call(ticker: str) -> dict:
+    """The yf_snapshot call prefetch mode makes on the model's behalf"""
+    return {"name": "yf_snapshot", "args": {"ticker": ticker}, "id": f"prefetch_{ticker}", "type": "tool_call"}
+
+def extract_market_trends_outputs(tool_call, tool_result, outputs: dict):
+    """Copies the chart snapshot and news from a yf_snapshot result into outputs."""
+    if tool_call['name'] == "yf_snapshot" and tool_result.status != "error" and tool_result.artifact is not None:
+        # the tool content is already trimmed for the model; the
+        # TickerSnapshot artifact carries the bars and news for the UI
+        print("Extracted ticker:", tool_result.artifact.ticker)
+        outputs["snapshot"] = tool_result.artifact.to_bytes()
+        outputs["news"] = tool_result.artifact.news
+        print("Extracted news articles:", outputs["news"])
 
 # Agent node functions
+@coalesced(lambda state: market_trends_key(state["market_trends_ticker"]))
 def market_trends_agent_node(state: AssistantState):
     """Market trends agent node"""
     print("Invoking market trends agent...")
     ticker = state["market_trends_ticker"]
     print("market_trends_ticker:", ticker)
-    messages = []
-    if ticker in market_trends_agent_cache:
+    # progress events for stream_mode="custom"; a no-op when not streaming
+    writer = get_stream_writer()
+    key = market_trends_key(ticker)
+    cached = get_result_cache().get("market_trends", key)
+    if cached is not None:
         print("Using cached messages for ticker:", ticker)
-        return market_trends_agent_cache[ticker]
-    
+        writer({"node": "market_trends_agent", "message": f"Using cached analysis for {ticker}"})
+        return cached
+
+    if MARKET_TRENDS_MODE == "prefetch":
+        ret = prefetch_market_trends(ticker, writer)
+    else:
+        ret = tool_loop_market_trends(ticker, writer)
+
+    print("Caching market trends messages for ticker, response  :", ret)
+    get_result_cache().set("market_trends", key, ret)
+    return ret
+
+def prefetch_market_trends(ticker: str, writer) -> dict:
+    """Market trends in prefetch mode: fetch the snapshot here, then one model call"""
+    writer({"node": "market_trends_agent", "message": f"Fetching market data, indicators and news for {ticker}"})
+    tool_call = snapshot_tool_call(ticker)
+    tool_result = run_tool(yf_snapshot, tool_call)
+    outputs = {"snapshot": None, "news": []}
+    extract_market_trends_outputs(tool_call, tool_result, outputs)
+
+    writer({"node": "market_trends_agent", "message": f"Writing the analysis for {ticker}"})
+    response = market_trends_prefetch_agent.invoke({"ticker": ticker, "snapshot": tool_result.content})
+    print("Market trends prefetch response:", response)
+    return {"messages": [response], "market_trends_agent_tools_out": MarketTrendsState(**outputs)}
+
+def tool_loop_market_trends(ticker: str, writer) -> dict:
+    """Market trends in tools mode: the model requests yf_snapshot, then writes the analysis"""
+    messages = []
     response = market_trends_agent.invoke({
             "messages": messages,
             "ticker": ticker,
@@ -143,109 +241,208 @@ def market_trends_agent_node(state: AssistantState):
 
     print("Market trends agent response initial:", response)
 
+    ret = {"messages": [response]}
     # Handle tool calls if present
     if hasattr(response, 'tool_calls') and response.tool_calls:
         print("Market trends agent tool calls detected:", response.tool_calls)
+        writer({"node": "market_trends_agent", "message": f"Fetching market data, indicators and news for {ticker}"})
 
         tool_messages = []
-        tool_map = {
-            "yf_snapshot": yf_snapshot,
-        }
-        ticker_6mo_price_history = {}
-        news = []
+        outputs = {"snapshot": None, "news": []}
         for tool_call in response.tool_calls:
-            if tool_call['name'] in tool_map.keys():
-                try:
-                    tool_result = tool_map[tool_call['name']].invoke(tool_call)
-                    print(tool_result)
-                    if tool_call['name'] == "yf_snapshot" and tool_result:
-                        # Extracting relevant info from yf_snapshot tool result for use in UI
-                        content_json = json.loads(tool_result.content)
-                        print("Extracted ticker:", content_json.get('ticker'))
-                        ticker_6mo_price_history = content_json.get("history_6m", {})
-                        news = content_json.get("news", [])
-                        print("Extracted news articles:", news)
-
-                        # add only relevant info to tool_result content to avoid exploding the context
-                        tool_result.content = json.dumps(
-                            {
-                                "ticker": content_json.get('ticker'),
-                                "info": content_json.get("info", {}),
-                            }
-                        )
-                except Exception as e:
-                    tool_result = f"Search failed: {str(e)}"
-                finally:
-                    tool_messages.append(tool_result)
+            if tool_call['name'] in market_trends_tool_map.keys():
+                # cached, time-limited and retried by the tool middleware
+                tool_result = run_tool(market_trends_tool_map[tool_call['name']], tool_call)
+                print(tool_result)
+                extract_market_trends_outputs(tool_call, tool_result, outputs)
+                tool_messages.append(tool_result)
 
         if tool_messages:
+            writer({"node": "market_trends_agent", "message": f"Writing the analysis for {ticker}"})
             all_messages = messages + [response] + tool_messages
             final_response = market_trends_agent.invoke({"messages": all_messages, "ticker": ticker})
             print("*"*40)
             print("Final response after tool calls:", final_response)
             print("*"*40)
             ret = {"messages": [response] + tool_messages + [final_response],
-                   "market_trends_agent_tools_out": MarketTrendsState(
-                       ticker_6mo_price_history=ticker_6mo_price_history,
-                       news=news
-                   )
+                   "market_trends_agent_tools_out": MarketTrendsState(**outputs)
                }
+    return ret
+
+@coalesced(lambda state: market_trends_key(state["market_trends_ticker"]))
+async def amarket_trends_agent_node(state: AssistantState):
+    """Market trends agent node, async"""
+    print("Invoking market trends agent...")
+    ticker = state["market_trends_ticker"]
+    print("market_trends_ticker:", ticker)
+    writer = get_stream_writer()
+    key = market_trends_key(ticker)
+    cached = await asyncio.to_thread(get_result_cache().get, "market_trends", key)
+    if cached is not None:
+        print("Using cached messages for ticker:", ticker)
+        writer({"node": "market_trends_agent", "message": f"Using cached analysis for {ticker}"})
+        return cached
+
+    if MARKET_TRENDS_MODE == "prefetch":
+        ret = await aprefetch_market_trends(ticker, writer)
     else:
-        ret = {"messages": [response]}
+        ret = await atool_loop_market_trends(ticker, writer)
 
-    print("Caching market trends messages for ticker, response  :", ret)
-    market_trends_agent_cache[ticker] = ret
+    await asyncio.to_thread(get_result_cache().set, "market_trends", key, ret)
     return ret
 
-def get_key(portfolio_json: dict, user_goal: str) -> str:
-    """Generate a cache key based on portfolio and user goal"""
-    currency = portfolio_json.get("base_currency", "")
-    holdings = portfolio_json.get("holdings", [])
-    user_goal = user_goal or ""
+async def aprefetch_market_trends(ticker: str, writer) -> dict:
+    """Market trends in prefetch mode, async"""
+    writer({"node": "market_trends_agent", "message": f"Fetching market data, indicators and news for {ticker}"})
+    tool_call = snapshot_tool_call(ticker)
+    tool_result = await arun_tool(yf_snapshot, tool_call)
+    outputs = {"snapshot": None, "news": []}
+    extract_market_trends_outputs(tool_call, tool_result, outputs)
+
+    writer({"node": "market_trends_agent", "message": f"Writing the analysis for {ticker}"})
+    response = await market_trends_prefetch_agent.ainvoke({"ticker": ticker, "snapshot": tool_result.content})
+    print("Market trends prefetch response:", response)
+    return {"messages": [response], "market_trends_agent_tools_out": MarketTrendsState(**outputs)}
+
+async def atool_loop_market_trends(ticker: str, writer) -> dict:
+    """Market trends in tools mode, async"""
+    messages = []
+    response = await market_trends_agent.ainvoke({
+            "messages": messages,
+            "ticker": ticker,
+    })
 
-    holdings.sort(key=lambda x: x.get("ticker", ""))
+    print("Market trends agent response initial:", response)
 
-    portfolio_str = f"{currency}-" + "-".join(
-        [f"{item.get('ticker','')}_{item.get('current_value',0)}" for item in holdings]
-    )
+    ret = {"messages": [response]}
+    if hasattr(response, 'tool_calls') and response.tool_calls:
+        print("Market trends agent tool calls detected:", response.tool_calls)
+        writer({"node": "market_trends_agent", "message": f"Fetching market data, indicators and news for {ticker}"})
 
-    print("Generated portfolio string for key:", portfolio_str)
-    return f"{portfolio_str}|{user_goal}"
+        outputs = {"snapshot": None, "news": []}
 
+        async def run_tool(tool_call):
+            # runs off the event loop, so data fetches for several tool calls overlap
+            tool_result = await arun_tool(market_trends_tool_map[tool_call['name']], tool_call)
+            extract_market_trends_outputs(tool_call, tool_result, outputs)
+            return tool_result
 
-portfolio_agent_cache = TTLCache(maxsize=100, ttl=3600) 
+        tool_messages = await asyncio.gather(*(
+            run_tool(tool_call) for tool_call in response.tool_calls
+            if tool_call['name'] in market_trends_tool_map.keys()
+        ))
 
+        if tool_messages:
+            writer({"node": "market_trends_agent", "message": f"Writing the analysis for {ticker}"})
+            all_messages = messages + [response] + list(tool_messages)
+            final_response = await market_trends_agent.ainvoke({"messages": all_messages, "ticker": ticker})
+            print("Final response after tool calls:", final_response)
+            ret = {"messages": [response] + list(tool_messages) + [final_response],
+                   "market_trends_agent_tools_out": MarketTrendsState(**outputs)
+               }
+    return ret
+
+@coalesced(lambda state: portfolio_key(state["portfolio_json"], state["user_goal"]))
 def portfolio_agent_node(state: AssistantState):
     """Portfolio analysis agent node"""
     print("Invoking portfolio agent...")
     # print("portfolio_json:", state["portfolio_json"])
     # print("user_goal:", state["user_goal"])
 
-    key = get_key(state["portfolio_json"], state["user_goal"])
+    key = portfolio_key(state["portfolio_json"], state["user_goal"])
 
-    if key in portfolio_agent_cache:
+    cached = get_result_cache().get("portfolio", key)
+    if cached is not None:
         print("Using cached portfolio analysis for key:", key)
-        return portfolio_agent_cache[key]
+        return cached
 
     response = portfolio_agent.invoke({
             "portfolio_json": state["portfolio_json"],
             "user_goal": state["user_goal"],
         })
     # print(response)
-    portfolio_agent_cache[key] = {"messages": [response]}
+    get_result_cache().set("portfolio", key, {"messages": [response]})
+    return {"messages": [response]}
+
+@coalesced(lambda state: portfolio_key(state["portfolio_json"], state["user_goal"]))
+async def aportfolio_agent_node(state: AssistantState):
+    """Portfolio analysis agent node, async"""
+    print("Invoking portfolio agent...")
+
+    key = portfolio_key(state["portfolio_json"], state["user_goal"])
+
+    cached = await asyncio.to_thread(get_result_cache().get, "portfolio", key)
+    if cached is not None:
+        print("Using cached portfolio analysis for key:", key)
+        return cached
+
+    response = await portfolio_agent.ainvoke({
+            "portfolio_json": state["portfolio_json"],
+            "user_goal": state["user_goal"],
+        })
+    await asyncio.to_thread(get_result_cache().set, "portfolio", key, {"messages": [response]})
     return {"messages": [response]}
 
+def portfolio_cache_node(state: AssistantState):
+    """
+    Front cache for the portfolio route: a hit on the raw portfolio and goal
+    returns the enriched portfolio and the analysis without enriching again.
+    """
+    key = portfolio_run_key(state["portfolio_json"], state["user_goal"])
+    cached = get_result_cache().get("portfolio_run", key)
+    if cached is not None:
+        print("Using cached portfolio run for key:", key)
+        return {**cached, "next_agent": "done", "portfolio_run_key": key}
+    return {"next_agent": "portfolio_enhance", "portfolio_run_key": key}
+
+async def aportfolio_cache_node(state: AssistantState):
+    """Portfolio front cache node, async"""
+    key = portfolio_run_key(state["portfolio_json"], state["user_goal"])
+    cached = await asyncio.to_thread(get_result_cache().get, "portfolio_run", key)
+    if cached is not None:
+        print("Using cached portfolio run for key:", key)
+        return {**cached, "next_agent": "done", "portfolio_run_key": key}
+    return {"next_agent": "portfolio_enhance", "portfolio_run_key": key}
+
+def portfolio_run_entry(state: AssistantState) -> dict:
+    return {"portfolio_json": state["portfolio_json"], "messages": [state["messages"][-1]]}
+
+def portfolio_cache_store_node(state: AssistantState):
+    """Stores the finished portfolio run under the key computed by portfolio_cache_node"""
+    get_result_cache().set("portfolio_run", state["portfolio_run_key"], portfolio_run_entry(state))
+    return {}
+
+async def aportfolio_cache_store_node(state: AssistantState):
+    """Portfolio front cache store node, async"""
+    await asyncio.to_thread(get_result_cache().set, "portfolio_run", state["portfolio_run_key"], portfolio_run_entry(state))
+    return {}
+
+def route_portfolio_cache(state: AssistantState):
+    """Conditional edge after the front cache: END on a hit, enrichment otherwise"""
+    return END if state.get("next_agent") == "done" else "portfolio_enhance"
+
 def portfolio_enhance_node(state: AssistantState):
     """Portfolio enhancement node"""
     print("Enhancing portfolio data...")
     portfolio_json = state["portfolio_json"]
-    enhanced_portfolio_str = enhance_portfolio_data.invoke(json.dumps(portfolio_json, default=str))
+    enhanced_portfolio_str = call_tool(enhance_portfolio_data, portfolio_json=json.dumps(portfolio_json, default=str))
     enhanced_portfolio = json.loads(enhanced_portfolio_str)
     # print("enhanced_portfolio:", enhanced_portfolio)
     return {
         "portfolio_json": enhanced_portfolio
     }
 
+async def aportfolio_enhance_node(state: AssistantState):
+    """Portfolio enhancement node, async"""
+    print("Enhancing portfolio data...")
+    portfolio_json = state["portfolio_json"]
+    # the tool fans out over its own thread pool; to_thread keeps it off the event loop
+    enhanced_portfolio_str = await asyncio.to_thread(
+        call_tool, enhance_portfolio_data, portfolio_json=json.dumps(portfolio_json, default=str))
+    return {
+        "portfolio_json": json.loads(enhanced_portfolio_str)
+    }
+
 
 def router_node(state: AssistantState):
     """Router node - determines which agent should handle the query"""
@@ -255,29 +452,122 @@ def router_node(state: AssistantState):
     if context == "market_trends":
         next_agent = "market_trends_agent"
     elif context == "portfolio":
-        next_agent = "portfolio_enhance"
+        next_agent = "portfolio_cache"
     elif context == "goals_planning":
         next_agent = "goals_planning_agent"
+    elif context == "full_review":
+        # drop per-holding results left in the thread by an earlier review
+        return {"next_agent": "full_review", "holding_trends": None}
 
     return {
         "next_agent": next_agent
     }
 
+async def arouter_node(state: AssistantState):
+    """Router node, async"""
+    return router_node(state)
+
 def route_to_agent(state: AssistantState):
     """Conditional edge function - routes to appropriate agent based on router decision"""
 
     next_agent = state.get("next_agent")
 
-    if next_agent == "portfolio_enhance":
-        return "portfolio_enhance"
+    if next_agent == "portfolio_cache":
+        return "portfolio_cache"
     elif next_agent == "market_trends_agent":
         return "market_trends_agent"
     elif next_agent == "goals_planning_agent":
         return "goals_planning_agent"
+    elif next_agent == "full_review":
+        return full_review_sends(state)
     else:
         # Default fallback
         return "error"
 
+# Number of largest holdings that get a market trends analysis in a full review
+FULL_REVIEW_MAX_HOLDINGS = 10
+# Market trends analyses allowed to run at once within a full review
+FULL_REVIEW_MAX_CONCURRENT_TRENDS = 4
+
+def review_tickers(portfolio_json: dict) -> list:
+    """Tickers of the largest holdings, by current value, for a full review."""
+    holdings = sorted(
+        (h for h in (portfolio_json or {}).get("holdings", []) if h.get("ticker")),
+        key=lambda h: h.get("current_value", 0) or 0, reverse=True,
+    )
+    return list(dict.fromkeys(h["ticker"].strip().upper() for h in holdings))[:FULL_REVIEW_MAX_HOLDINGS]
+
+def full_review_sends(state: AssistantState) -> list:
+    """
+    Fans a full review out with Send: the portfolio analysis, one market trends
+    analysis per holding and, when goal inputs are present, the goal plan all
+    run in the same step, so the review takes about as long as its slowest branch.
+    """
+    sends = [Send("review_portfolio", state)]
+    for ticker in review_tickers(state.get("portfolio_json")):
+        sends.append(Send("review_holding", {"market_trends_ticker": ticker}))
+    if state.get("goal_plan_inputs"):
+        sends.append(Send("review_goal_plan", state))
+    return sends
+
+def review_portfolio_node(state: AssistantState):
+    """Full review branch: the portfolio route (front cache, enhance, analyze) in one step"""
+    update = portfolio_cache_node(state)
+    if update["next_agent"] == "done":
+        return {"portfolio_json": update["portfolio_json"], "messages": update["messages"]}
+    state = {**state, **portfolio_enhance_node(state)}
+    state = {**state, "messages": portfolio_agent_node(state)["messages"]}
+    portfolio_cache_store_node({**state, "portfolio_run_key": update["portfolio_run_key"]})
+    return {"portfolio_json": state["portfolio_json"], "messages": state["messages"][-1:]}
+
+async def areview_portfolio_node(state: AssistantState):
+    """Full review portfolio branch, async"""
+    update = await aportfolio_cache_node(state)
+    if update["next_agent"] == "done":
+        return {"portfolio_json": update["portfolio_json"], "messages": update["messages"]}
+    state = {**state, **await aportfolio_enhance_node(state)}
+    state = {**state, "messages": (await aportfolio_agent_node(state))["messages"]}
+    await aportfolio_cache_store_node({**state, "portfolio_run_key": update["portfolio_run_key"]})
+    return {"portfolio_json": state["portfolio_json"], "messages": state["messages"][-1:]}
+
+def holding_trends_update(ticker: str, ret: dict) -> dict:
+    """Reduces a market trends node result to this holding's entry in holding_trends."""
+    tools_out = ret.get("market_trends_agent_tools_out") or {}
+    return {"holding_trends": {ticker.upper(): {
+        "analysis": ret["messages"][-1].content,
+        "news": tools_out.get("news") or [],
+    }}}
+
+full_review_trend_slots = threading.BoundedSemaphore(FULL_REVIEW_MAX_CONCURRENT_TRENDS)
+full_review_async_trend_slots = weakref.WeakKeyDictionary()
+
+def review_holding_node(state: dict):
+    """Full review branch: market trends for one holding"""
+    with full_review_trend_slots:
+        ret = market_trends_agent_node(state)
+    return holding_trends_update(state["market_trends_ticker"], ret)
+
+async def areview_holding_node(state: dict):
+    """Full review holding branch, async"""
+    # asyncio semaphores belong to one event loop
+    loop = asyncio.get_running_loop()
+    slots = full_review_async_trend_slots.setdefault(loop, asyncio.Semaphore(FULL_REVIEW_MAX_CONCURRENT_TRENDS))
+    async with slots:
+        ret = await amarket_trends_agent_node(state)
+    return holding_trends_update(state["market_trends_ticker"], ret)
+
+def full_review_merge_node(state: AssistantState):
+    """Merges the full review branches into one result"""
+    trends = state.get("holding_trends") or {}
+    tickers = review_tickers(state.get("portfolio_json"))
+    full_review = {
+        "portfolio_insights": state["messages"][-1] if state.get("messages") else None,
+        "market_trends": {t: trends[t] for t in tickers if t in trends},
+        "goal_plan": state.get("goal_planning_output") if state.get("goal_plan_inputs") else None,
+    }
+    print(f"Full review merged: {len(full_review['market_trends'])} holdings analyzed")
+    return {"full_review": full_review}
+
 def save_ipython_image(img_display: Image, filename: str):
     """Saves an IPython display Image to a file using Pillow."""
     # Assume 'img_display' is an IPython.core.display.Image object
@@ -286,16 +576,52 @@ def save_ipython_image(img_display: Image, filename: str):
     pimg.save(filename)
 
 
-def create_workflow(save_graph: bool = False):
-    checkpointer = InMemorySaver()
+# Node implementations for the sync graph (app.invoke) and the async graph
+# (await app.ainvoke); both graphs have the same shape
+NODES = {
+    "router": router_node,
+    "portfolio_cache": portfolio_cache_node,
+    "portfolio_cache_store": portfolio_cache_store_node,
+    "portfolio_agent": portfolio_agent_node,
+    "portfolio_enhance": portfolio_enhance_node,
+    "market_trends_agent": market_trends_agent_node,
+    "goals_planning_agent": goal_planning_agent_node,
+    "review_portfolio": review_portfolio_node,
+    "review_holding": review_holding_node,
+    "review_goal_plan": goal_planning_agent_node,
+    "full_review_merge": full_review_merge_node,
+}
+
+ASYNC_NODES = {
+    "router": arouter_node,
+    "portfolio_cache": aportfolio_cache_node,
+    "portfolio_cache_store": aportfolio_cache_store_node,
+    "portfolio_agent": aportfolio_agent_node,
+    "portfolio_enhance": aportfolio_enhance_node,
+    "market_trends_agent": amarket_trends_agent_node,
+    "goals_planning_agent": agoal_planning_agent_node,
+    "review_portfolio": areview_portfolio_node,
+    "review_holding": areview_holding_node,
+    "review_goal_plan": agoal_planning_agent_node,
+    "full_review_merge": full_review_merge_node,
+}
+
+def create_workflow(save_graph: bool = False, async_mode: bool = False, checkpointer=None):
+    """
+    Builds and compiles the assistant graph.
+    Args:
+        save_graph: Also write the graph diagram to workflow_graph.png.
+        async_mode: Use the async node implementations; run the result with
+            ainvoke/astream so one event loop can serve many sessions.
+        checkpointer: Saver for graph state, defaults to the process-wide
+            bounded SQLite checkpointer.
+    """
+    checkpointer = checkpointer or get_checkpointer()
 
     workflow = StateGraph(AssistantState)
 
-    workflow.add_node("router", router_node)
-    workflow.add_node("portfolio_agent", portfolio_agent_node)
-    workflow.add_node("portfolio_enhance", portfolio_enhance_node)
-    workflow.add_node("market_trends_agent", market_trends_agent_node)
-    workflow.add_node("goals_planning_agent", goal_planning_agent_node)
+    for name, node in (ASYNC_NODES if async_mode else NODES).items():
+        workflow.add_node(name, node)
 
     workflow.set_entry_point("router")
 
@@ -303,16 +629,34 @@ def create_workflow(save_graph: bool = False):
         "router",
         route_to_agent,
         {
-            "portfolio_enhance": "portfolio_enhance",
+            "portfolio_cache": "portfolio_cache",
             "market_trends_agent": "market_trends_agent",
-            "goals_planning_agent": "goals_planning_agent"
+            "goals_planning_agent": "goals_planning_agent",
+            # targets of the full review fan-out
+            "review_portfolio": "review_portfolio",
+            "review_holding": "review_holding",
+            "review_goal_plan": "review_goal_plan",
         }
     )
 
+    workflow.add_conditional_edges(
+        "portfolio_cache",
+        route_portfolio_cache,
+        {
+            "portfolio_enhance": "portfolio_enhance",
+            END: END,
+        }
+    )
     workflow.add_edge("portfolio_enhance", "portfolio_agent")
     workflow.add_edge("market_trends_agent", END)
     workflow.add_edge("goals_planning_agent", END)
-    workflow.add_edge("portfolio_agent", END)
+    workflow.add_edge("portfolio_agent", "portfolio_cache_store")
+    workflow.add_edge("portfolio_cache_store", END)
+    # every branch runs in the same step, so the merge runs once after all of them
+    workflow.add_edge("review_portfolio", "full_review_merge")
+    workflow.add_edge("review_holding", "full_review_merge")
+    workflow.add_edge("review_goal_plan", "full_review_merge")
+    workflow.add_edge("full_review_merge", END)
 
     app = workflow.compile(checkpointer=checkpointer)
 
@@ -321,3 +665,35 @@ def create_workflow(save_graph: bool = False):
 
     return app
 
+
+def benchmark_market_trends_modes(tickers=("AAPL", "MSFT", "NVDA"), runs: int = 2):
+    """
+    Times an uncached market trends request end to end in tools mode and in
+    prefetch mode, with model calls and input tokens per request. The snapshot
+    tool cache is warmed first, so both modes pay the same for market data.
+    """
+    from langchain_core.messages import AIMessage
+
+    def no_progress(_):
+        pass
+
+    for ticker in tickers:
+        run_tool(yf_snapshot, snapshot_tool_call(ticker))
+
+    print(f"{'mode':>10}{'latency (s)':>14}{'model calls':>14}{'input tokens':>15}")
+    for mode, run in (("tools", tool_loop_market_trends), ("prefetch", prefetch_market_trends)):
+        latencies, calls, input_tokens = [], 0, 0
+        for _ in range(runs):
+            for ticker in tickers:
+                start = time.perf_counter()
+                ret = run(ticker, no_progress)
+                latencies.append(time.perf_counter() - start)
+                responses = [m for m in ret["messages"] if isinstance(m, AIMessage)]
+                calls += len(responses)
+                input_tokens += sum((m.usage_metadata or {}).get("input_tokens", 0) for m in responses)
+        n = len(latencies)
+        print(f"{mode:>10}{sum(latencies) / n:>14.2f}{calls / n:>14.1f}{input_tokens / n:>15.0f}")
+
+
+if __name__ == "__main__":
+    benchmark_market_trends_modes()
@@ -1,4 +1,5 @@
 # for yfinance usage examples and utilities
+# run from src as a module so the agents package resolves: python -m utils.yfinance_use
 
 import yfinance as yf
 import pprint
@@ -7,6 +8,9 @@ import matplotlib.dates as mdates
 from datetime import datetime
 from typing import Any, Dict
 
+from agents.market_data import get_provider
+from agents.history_codec import frame_to_wire
+
 def test_yfinance():
     dat = yf.Ticker("MSFT")
     # hist = dat.history(period="1y")
@@ -23,9 +27,8 @@ def get_ticker_info(ticker: str) -> Dict[str, Any]:
     Fetches basic information about a stock ticker using yfinance.
     """
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        print
+        provider = get_provider()
+        info = provider.info(ticker)
         return {
             "ticker": ticker,
             "longName": info.get("longName", "N/A"),
@@ -37,7 +40,7 @@ def get_ticker_info(ticker: str) -> Dict[str, Any]:
             "open": info.get("open", "N/A"),
             "dayHigh": info.get("dayHigh", "N/A"),
             "dayLow": info.get("dayLow", "N/A"),
-            "news": stock.news
+            "news": provider.news(ticker)
         }
     except Exception as e:
         return {"error": str(e)}
@@ -56,11 +59,7 @@ def test_market_info():
 def yf_snapshot(ticker: str) -> dict:
     """Return a combined yfinance snapshot for a given ticker."""
     print("Fetching yf_snapshot for ticker:", ticker)
-    t = yf.Ticker(ticker)
-    info = t.get_info() if hasattr(t, "get_info") else t.info
-    history = t.history(period="6mo", interval="1d").tail(120).reset_index().to_dict(orient="list")
-    history_formatted = prepare_history_data(history)
-    fast = getattr(t, "fast_info", {})
+    history_formatted = frame_to_wire(get_provider().history(ticker, period="6mo", interval="1d").tail(120))
     out = {
         # "ticker": ticker.upper(),
         # "info": info,
@@ -70,18 +69,6 @@ def yf_snapshot(ticker: str) -> dict:
     print("yf_snapshot output:", out)
     return out
 
-def prepare_history_data(history):
-    history_formatted = {}
-    for key, value in history.items():
-        if key != "Date":
-            history_formatted[key] = value
-        else:
-            print(type(value))
-            print([v.date().strftime("%Y-%m-%d") for v in value])
-            new_value = [v.date().strftime("%Y-%m-%d") if hasattr(v, 'date') else v for v in value]
-            history_formatted[key] = new_value
-    return history_formatted
-
 def plot_price_history(history_data: dict, ticker: str = "Stock", show_volume: bool = True):
     """
     Creates a matplotlib chart from 6-month history data.
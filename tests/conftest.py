@@ -0,0 +1,42 @@
+import os
+
+# Never reach live services or the app's data directory from tests; set before
+# any agents module reads its configuration at import time.
+os.environ.setdefault("MARKET_DATA_PROVIDER", "synthetic")
+os.environ.setdefault("RESULT_CACHE_BACKEND", "memory")
+os.environ.setdefault("CHECKPOINT_DB_PATH", ":memory:")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import time
+
+import pytest
+
+import market_data
+
+
+class Clock:
+    """Replaces time.time with a clock that only moves when advanced."""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(time.time())
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """A fresh SyntheticProvider installed as the process-wide provider."""
+    provider = market_data.SyntheticProvider()
+    monkeypatch.setattr(market_data, "_provider", provider)
+    return provider
@@ -0,0 +1,53 @@
+from context_builder import ContextBuilder, count_tokens, format_value, info_table
+
+INFO_LINES = "\n".join(f"field{i}|{i}.00" for i in range(30))
+TABLE_HEADER = "|".join(f"col{i}" for i in range(20))
+TABLE_ROW = "|".join(["1234.56"] * 20)
+
+
+def build(budget: int) -> ContextBuilder:
+    builder = ContextBuilder("market_trends", budget)
+    builder.add("ticker", "AAPL", priority=2)
+    builder.add("info", INFO_LINES)
+    builder.add("technical_indicators", TABLE_HEADER + "\n" + TABLE_ROW, priority=1, header=1)
+    return builder
+
+
+def test_everything_is_kept_within_budget():
+    builder = build(1000)
+    text = builder.build()
+    assert builder.report["trimmed_lines"] == {}
+    assert text.startswith("## ticker\nAAPL\n\n## info\nfield0|0.00")
+    assert builder.report["total"] == count_tokens(text)
+
+
+def test_lowest_priority_section_is_trimmed_first_from_the_end():
+    builder = build(120)
+    text = builder.build()
+    assert builder.report["total"] <= 120
+    assert set(builder.report["trimmed_lines"]) == {"info"}
+    assert "field0|0.00" in text and "field29|29.00" not in text
+    assert TABLE_ROW in text
+
+
+def test_table_header_is_never_left_without_rows():
+    builder = build(40)
+    text = builder.build()
+    assert builder.report["total"] <= 40
+    assert builder.report["trimmed_lines"]["technical_indicators"] == 2
+    assert "technical_indicators" not in text
+    assert "col0" not in text
+    assert "## ticker\nAAPL" in text
+
+
+def test_empty_sections_are_skipped():
+    builder = ContextBuilder("qa", 100).add("info", "").add("ticker", "MSFT")
+    assert builder.build() == "## ticker\nMSFT"
+
+
+def test_values_are_rendered_compactly():
+    assert format_value("marketCap", 2_345_000_000_000) == "2.35T"
+    assert format_value("lastDividendDate", 1_700_000_000) == "2023-11-14"
+    assert format_value("beta", 1.2345) == "1.23"
+    assert format_value("longBusinessSummary", "word " * 200).endswith("...")
+    assert info_table({"sector": "Technology", "website": "", "unused": 1}, "qa") == "sector|Technology"
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+import history_store
+from history_store import HistoryStore, fetch_daily_bars
+
+
+@pytest.fixture
+def fetches(provider, monkeypatch):
+    """Records the keyword arguments of every single-ticker history request."""
+    calls = []
+    history = provider.history
+
+    def spy(ticker, **kwargs):
+        calls.append(kwargs)
+        return history(ticker, **kwargs)
+
+    monkeypatch.setattr(provider, "history", spy)
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history"))
+
+
+def seed(store, ticker, drop_last: int):
+    """Stores a ticker's full history except its newest drop_last bars."""
+    dates, columns = fetch_daily_bars(ticker)
+    store._rewrite(ticker, dates[:-drop_last], {c: v[:-drop_last] for c, v in columns.items()})
+    return dates, columns
+
+
+def test_first_update_backfills_then_nothing_is_refetched(store, fetches):
+    written = store.update("AAA")
+    assert written == len(store.load("AAA")) > 0
+    assert fetches == [{"interval": "1d", "period": history_store.INITIAL_HISTORY_PERIOD}]
+    assert store.update("AAA") == 0
+    assert len(fetches) == 1
+
+
+def test_update_appends_only_missing_days(store, fetches):
+    dates, columns = seed(store, "AAA", drop_last=5)
+    fetches.clear()
+
+    assert store.update("AAA") == 5
+    assert len(fetches) == 1 and "start" in fetches[0]
+    stored = store.load("AAA")
+    np.testing.assert_array_equal(stored.dates, dates)
+    np.testing.assert_allclose(stored.close, columns["Close"])
+
+
+def test_adjustment_rescales_stored_bars_from_a_bounded_fetch(store, provider, fetches):
+    seed(store, "AAA", drop_last=5)
+    # a dividend goes ex after the last stored bar: upstream scales every
+    # earlier price by the same factor and leaves volume alone
+    bars = provider.history("AAA", period="max")
+    adjusted = bars.copy()
+    before = adjusted.index < adjusted.index[-5]
+    adjusted.loc[before, ["Open", "High", "Low", "Close"]] *= 0.98
+    provider._cache["AAA"] = adjusted
+    fetches.clear()
+
+    store.update("AAA")
+
+    # one incremental fetch plus one overlap window, never the full period
+    assert len(fetches) == 2
+    assert all("period" not in call for call in fetches)
+    stored = store.load("AAA")
+    expected = adjusted.tail(len(stored))
+    np.testing.assert_allclose(stored.close, expected["Close"].to_numpy())
+    np.testing.assert_allclose(stored.open, expected["Open"].to_numpy())
+    np.testing.assert_allclose(stored.volume, expected["Volume"].to_numpy())
+
+
+def test_inconsistent_overlap_refetches_full_history(store, provider, fetches):
+    seed(store, "AAA", drop_last=5)
+    provider._cache["AAA"] = provider.history("BBB", period="max")
+    fetches.clear()
+
+    store.update("AAA")
+
+    assert fetches[-1] == {"interval": "1d", "period": history_store.INITIAL_HISTORY_PERIOD}
+    expected, _ = fetch_daily_bars("BBB")
+    np.testing.assert_array_equal(store.load("AAA").dates, expected)
+
+
+def test_close_within_tolerance_is_not_an_adjustment(store, provider, fetches):
+    seed(store, "AAA", drop_last=5)
+    bars = provider.history("AAA", period="max").copy()
+    bars["Close"] *= 1 + history_store.ADJUSTMENT_TOLERANCE / 10
+    provider._cache["AAA"] = bars
+    fetches.clear()
+
+    assert store.update("AAA") == 5
+    assert len(fetches) == 1
+
+
+def test_window_is_a_slice_of_the_stored_bars(store, provider):
+    window = store.window("AAA", "1mo")
+    stored = store.load("AAA")
+    assert 15 <= len(window) <= 23
+    assert window.dates[-1] == stored.dates[-1]
+    assert window.dates[-1] - window.dates[0] < history_store.PERIOD_DAYS["1mo"]
+
+
+def test_update_many_matches_single_updates(tmp_path, provider):
+    tickers = ["AAA", "BBB", "CCC"]
+    bulk = HistoryStore(str(tmp_path / "bulk"))
+    single = HistoryStore(str(tmp_path / "single"))
+    seed(bulk, "BBB", drop_last=3)
+
+    written = bulk.update_many(tickers + ["aaa"])
+
+    assert written["BBB"] == 3
+    for ticker in tickers:
+        single.update(ticker)
+        np.testing.assert_array_equal(bulk.load(ticker).dates, single.load(ticker).dates)
+        np.testing.assert_allclose(bulk.load(ticker).close, single.load(ticker).close)
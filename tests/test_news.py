@@ -0,0 +1,95 @@
+import pytest
+
+import market_data
+from news import NewsCache, NewsMatcher, match_news
+
+
+class FeedProvider:
+    """Serves a settable news feed per ticker."""
+
+    def __init__(self):
+        self.feeds = {}
+        self.fetches = 0
+
+    def news(self, ticker):
+        self.fetches += 1
+        return self.feeds.get(ticker, [])
+
+
+def item(url, title, published=None):
+    content = {"title": title, "canonicalUrl": {"url": url}, "provider": {"displayName": "Wire"}}
+    if published is not None:
+        content["providerPublishTime"] = published
+    return {"content": content}
+
+
+@pytest.fixture
+def feeds(monkeypatch):
+    provider = FeedProvider()
+    monkeypatch.setattr(market_data, "_provider", provider)
+    return provider
+
+
+def test_refresh_merges_unseen_articles_including_older_and_undated(feeds, clock):
+    cache = NewsCache(refresh_interval=60)
+    feeds.feeds["AAPL"] = [item("u1", "Apple ships", clock.now - 60)]
+    assert [a["url"] for a in cache.get("AAPL")] == ["u1"]
+
+    clock.advance(61)
+    feeds.feeds["AAPL"] = [
+        item("u1", "Apple ships", clock.now - 120),
+        item("u2", "Late-indexed Apple story", clock.now - 3600),
+        item("u3", "Undated Apple story"),
+    ]
+    articles = cache.get("AAPL")
+    assert [a["url"] for a in articles] == ["u1", "u2", "u3"]
+    assert cache.stats()["duplicates"] == 1
+
+
+def test_feed_is_only_refetched_when_due(feeds, clock):
+    cache = NewsCache(refresh_interval=60)
+    cache.get("AAPL")
+    cache.get("aapl")
+    assert feeds.fetches == 1
+    clock.advance(60)
+    cache.get("AAPL")
+    assert feeds.fetches == 2
+
+
+def test_feed_keeps_the_newest_articles_within_max_age(feeds, clock):
+    cache = NewsCache(max_articles=2, max_age=3600)
+    feeds.feeds["AAPL"] = [
+        item("old", "Too old", clock.now - 7200),
+        item("a", "Newest", clock.now - 10),
+        item("b", "Middle", clock.now - 20),
+        item("c", "Oldest kept?", clock.now - 30),
+    ]
+    assert [a["url"] for a in cache.get("AAPL")] == ["a", "b"]
+
+
+def test_stale_feed_is_served_when_refresh_fails(feeds, clock, monkeypatch):
+    cache = NewsCache(refresh_interval=60)
+    feeds.feeds["AAPL"] = [item("u1", "Apple ships", clock.now)]
+    cache.get("AAPL")
+    clock.advance(61)
+    monkeypatch.setattr(feeds, "news", lambda ticker: 1 / 0)
+    assert [a["url"] for a in cache.get("AAPL")] == ["u1"]
+
+
+def test_articles_shared_by_feeds_are_kept_once_and_matched_to_each_ticker(feeds, clock):
+    shared = item("s", "Apple and Microsoft team up", clock.now)
+    feeds.feeds["AAPL"] = [shared, item("a", "Apple Inc. beats estimates", clock.now - 10)]
+    feeds.feeds["MSFT"] = [shared]
+    infos = {"AAPL": {"longName": "Apple Inc."}, "MSFT": {"shortName": "Microsoft Corporation"}}
+
+    matched = match_news(["AAPL", "MSFT"], infos, cache=NewsCache())
+
+    assert [a["url"] for a in matched["AAPL"]] == ["s", "a"]
+    assert [a["url"] for a in matched["MSFT"]] == ["s"]
+
+
+def test_short_symbols_only_match_as_cashtags():
+    matcher = NewsMatcher({"A": [], "IT": [], "NVDA": ["NVIDIA Corp"]})
+    assert matcher.match("What IT teams want from a cloud") == set()
+    assert matcher.match("$A and $IT rally") == {"A", "IT"}
+    assert matcher.match("nvidia corp and NVDA") == {"NVDA"}
@@ -0,0 +1,105 @@
+import pickle
+import zlib
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import model
+from result_cache import MemoryTier, ResultCache, SqliteTier, decode, encode
+
+TTLS = {"portfolio": 60, "goal_plan": 60}
+
+
+def test_encode_round_trips_result_models_and_messages():
+    value = {
+        "insights": model.Overview(
+            companyName="Example Corp", sector="Technology", industry=None,
+            currentPrice=101.5, oneYearChange=0.12, compareToSP500=None, summary="Steady large cap",
+        ),
+        "messages": [AIMessage(content="done")],
+        "numbers": [1, 2.5, None],
+    }
+    decoded = decode(encode(value))
+    assert decoded["insights"] == value["insights"]
+    assert isinstance(decoded["insights"], model.Overview)
+    assert decoded["messages"][0].content == "done"
+    assert decoded["numbers"] == [1, 2.5, None]
+
+
+def test_decode_rejects_pickles():
+    with pytest.raises(ValueError):
+        decode(zlib.compress(pickle.dumps({"a": 1})))
+
+
+def test_get_returns_what_set_stored():
+    cache = ResultCache(ttls=TTLS)
+    cache.set("portfolio", "portfolio:v1:abc", {"score": 7})
+    assert cache.get("portfolio", "portfolio:v1:abc") == {"score": 7}
+    assert cache.get("portfolio", "portfolio:v1:missing") is None
+    counters = cache.stats()["namespaces"]["portfolio"]
+    assert counters["memory_hits"] == 1
+    assert counters["misses"] == 1
+
+
+def test_entries_expire_after_the_namespace_ttl(clock):
+    cache = ResultCache(ttls=TTLS)
+    cache.set("portfolio", "k", "value")
+    clock.advance(59)
+    assert cache.get("portfolio", "k") == "value"
+    clock.advance(2)
+    assert cache.get("portfolio", "k") is None
+    assert len(cache.memory) == 0
+
+
+def test_memory_tier_evicts_least_recently_used_to_stay_in_budget():
+    tier = MemoryTier(max_bytes=400)
+    for key in "abc":
+        assert tier.set(key, "portfolio", b"x" * 100, float("inf")) == []
+    tier.get("a")  # a is now the most recently used
+    evicted = tier.set("d", "goal_plan", b"x" * 100, float("inf")) + tier.set("e", "goal_plan", b"x" * 100, float("inf"))
+    assert evicted == ["portfolio"]
+    assert tier.get("b") is None
+    assert tier.get("a") is not None
+    assert tier.bytes <= tier.max_bytes
+
+
+def test_memory_tier_leaves_oversized_values_to_the_shared_tier():
+    tier = MemoryTier(max_bytes=400)
+    tier.set("big", "portfolio", b"x" * 101, float("inf"))
+    assert tier.get("big") is None
+    assert tier.bytes == 0
+
+
+def test_shared_tier_hit_is_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    ResultCache(SqliteTier(path), ttls=TTLS).set("portfolio", "k", [1, 2, 3])
+
+    other_worker = ResultCache(SqliteTier(path), ttls=TTLS)
+    assert other_worker.get("portfolio", "k") == [1, 2, 3]
+    assert other_worker.get("portfolio", "k") == [1, 2, 3]
+    counters = other_worker.stats()["namespaces"]["portfolio"]
+    assert counters["shared_hits"] == 1
+    assert counters["memory_hits"] == 1
+
+
+def test_foreign_blob_in_shared_tier_is_a_miss(tmp_path):
+    shared = SqliteTier(str(tmp_path / "results.sqlite3"))
+    shared.set("k", "portfolio", zlib.compress(pickle.dumps("payload")), float("inf"))
+    cache = ResultCache(shared, ttls=TTLS)
+    assert cache.get("portfolio", "k") is None
+    assert cache.stats()["namespaces"]["portfolio"]["misses"] == 1
+
+
+def test_sqlite_tier_prunes_expired_then_least_recently_used(tmp_path, clock):
+    tier = SqliteTier(str(tmp_path / "results.sqlite3"), max_bytes=250)
+    tier.set("expiring", "goal_plan", b"x" * 100, clock.now + 10)
+    clock.advance(1)
+    tier.set("old", "portfolio", b"x" * 100, clock.now + 100)
+    clock.advance(20)
+    # "expiring" is past its expiry; "old" fits the budget alongside "new"
+    assert tier.set("new", "portfolio", b"x" * 100, clock.now + 100) == ["goal_plan"]
+    clock.advance(1)
+    assert tier.set("newest", "portfolio", b"x" * 100, clock.now + 100) == ["portfolio"]
+    assert tier.get("old") is None
+    assert tier.get("new") is not None
+    assert tier.get("newest") is not None
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_for_a_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("AAPL", fetch))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    # wait until every follower is queued behind the leader
+    deadline = time.monotonic() + 5
+    while flight.coalesced < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 4
+    assert flight.coalesced == 4
+
+
+def test_error_reaches_every_caller_and_the_key_is_freed():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("AAPL", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.coalesced < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert flight.do("AAPL", lambda: "recovered") == ("recovered", False)
+
+
+def test_async_calls_for_a_key_are_coalesced():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("AAPL", fetch) for _ in range(3)))
+
+    assert asyncio.run(main()) == [("result", False), ("result", True), ("result", True)]
+    assert len(runs) == 1
+
+
+def test_async_waiters_survive_the_leader_being_cancelled():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("AAPL", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("AAPL", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == ("result", True)
+    assert len(runs) == 1
+
+
+def test_async_key_is_freed_after_an_error():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        raise ValueError("upstream down")
+
+    async def succeed():
+        return "recovered"
+
+    async def main():
+        with pytest.raises(ValueError):
+            await flight.do("AAPL", fail)
+        return await flight.do("AAPL", succeed)
+
+    assert asyncio.run(main()) == ("recovered", False)
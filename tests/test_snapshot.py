@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from history_store import HistoryStore
+from snapshot import TickerSnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path, provider):
+    history = HistoryStore(str(tmp_path / "history")).window("AAA", "6mo")
+    return TickerSnapshot.from_history(
+        "aaa", provider.info("AAA"), provider.fast_info("AAA"),
+        [{"title": "AAA rises", "url": "https://example.com/a", "published": 1.0, "publisher": None}],
+        history, indicators={"ticker": "AAA", "trend": "up"},
+    )
+
+
+def test_round_trip_keeps_metadata_and_bars(snapshot):
+    decoded = TickerSnapshot.from_bytes(snapshot.to_bytes())
+    assert decoded.ticker == "AAA"
+    assert decoded.info == snapshot.info
+    assert decoded.fast_info == snapshot.fast_info
+    assert decoded.news == snapshot.news
+    assert decoded.indicators == snapshot.indicators
+    for name in ("dates", "open", "high", "low", "close", "volume"):
+        np.testing.assert_array_equal(getattr(decoded, name), getattr(snapshot, name))
+        assert getattr(decoded, name).dtype == getattr(snapshot, name).dtype
+
+
+def test_decoded_arrays_are_read_only_views(snapshot):
+    data = snapshot.to_bytes()
+    decoded = TickerSnapshot.from_bytes(data)
+    assert not decoded.close.flags.writeable
+    assert np.shares_memory(decoded.close, np.frombuffer(data, dtype=np.uint8))
+
+
+def test_empty_snapshot_round_trips():
+    decoded = TickerSnapshot.from_bytes(TickerSnapshot("AAA").to_bytes())
+    assert decoded.ticker == "AAA"
+    assert len(decoded.dates) == 0
+
+
+def test_from_bytes_rejects_other_data():
+    with pytest.raises(ValueError):
+        TickerSnapshot.from_bytes(b"JSON" + bytes(8))
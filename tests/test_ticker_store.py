@@ -0,0 +1,106 @@
+import pytest
+
+import ticker_store
+from ticker_store import FUNDAMENTAL_TTL, QUOTE_TTL, STATIC_TTL, TickerMetadataStore, field_ttl
+
+INFO = {
+    "symbol": "AAPL", "longName": "Apple Inc.", "sector": "Technology",
+    "trailingPE": 30.1, "marketCap": 3e12,
+    "currentPrice": 190.0, "previousClose": 188.0,
+}
+
+
+class InfoProvider:
+    """Counts info and quote requests."""
+
+    def __init__(self, info):
+        self.info_dict = dict(info)
+        self.calls = []
+
+    def info(self, ticker):
+        self.calls.append("info")
+        return dict(self.info_dict)
+
+    def quotes(self, tickers):
+        self.calls.append("quotes")
+        return {t: {"lastPrice": 191.0, "previousClose": 190.0} for t in tickers}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    provider = InfoProvider(INFO)
+    monkeypatch.setattr(ticker_store, "get_provider", lambda: provider)
+    return provider
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TickerMetadataStore(str(tmp_path / "metadata.sqlite3"))
+
+
+def test_fields_are_tiered():
+    assert field_ttl("sector") == STATIC_TTL
+    assert field_ttl("trailingPE") == FUNDAMENTAL_TTL
+    assert field_ttl("currentPrice") == QUOTE_TTL
+    assert field_ttl("someNewField") == QUOTE_TTL
+
+
+def test_requested_fields_are_served_until_their_own_ttl(store, upstream, clock):
+    store.get_info("AAPL")
+    clock.advance(QUOTE_TTL + 1)
+    # static fields are still fresh though the quote fields are not
+    assert store.get_info("AAPL", ["longName", "sector"]) == {"longName": "Apple Inc.", "sector": "Technology"}
+    assert store.get_fresh("AAPL", ["currentPrice"]) is None
+    assert upstream.calls == ["info"]
+
+    clock.advance(FUNDAMENTAL_TTL)
+    assert store.get_fresh("AAPL", ["sector"]) is not None
+    assert store.get_fresh("AAPL", ["trailingPE"]) is None
+
+
+def test_missing_field_is_fresh_while_the_last_full_fetch_is(store, upstream, clock):
+    store.get_info("AAPL")
+    assert store.get_fresh("AAPL", ["industry"]) == {}
+    clock.advance(STATIC_TTL)
+    assert store.get_fresh("AAPL", ["industry"]) is None
+
+
+def test_full_info_refreshes_only_prices_when_only_prices_are_stale(store, upstream, clock):
+    store.get_info("AAPL")
+    clock.advance(QUOTE_TTL + 1)
+
+    info = store.get_info("AAPL")
+
+    assert upstream.calls == ["info", "quotes"]
+    assert info["currentPrice"] == 191.0
+    assert info["previousClose"] == 190.0
+    assert info["sector"] == "Technology"
+    # the refreshed prices were stored with the refresh time
+    assert store.get_fresh("AAPL") == info
+
+
+def test_full_info_is_refetched_when_other_quote_fields_are_stale(store, upstream, clock):
+    upstream.info_dict["dayHigh"] = 192.0
+    store.get_info("AAPL")
+    clock.advance(QUOTE_TTL + 1)
+
+    info = store.get_info("AAPL")
+
+    assert upstream.calls == ["info", "info"]
+    assert info["dayHigh"] == 192.0
+
+
+def test_failed_quote_refresh_falls_back_to_full_info(store, upstream, clock, monkeypatch):
+    store.get_info("AAPL")
+    clock.advance(QUOTE_TTL + 1)
+    monkeypatch.setattr(upstream, "quotes", lambda tickers: {})
+
+    assert store.get_info("AAPL")["currentPrice"] == 190.0
+    assert upstream.calls == ["info", "info"]
+
+
+def test_store_is_shared_across_instances(tmp_path, upstream):
+    path = str(tmp_path / "metadata.sqlite3")
+    TickerMetadataStore(path).get_info("aapl")
+    assert TickerMetadataStore(path).get_info("AAPL", ["longName"]) == {"longName": "Apple Inc."}
+    assert upstream.calls == ["info"]